@@ -0,0 +1,121 @@
+import os  # Import os for the policy settings
+import time  # Import time for cooldowns and digests
+import collections  # Import collections for the bounded set of reported trackers
+import cv2  # Import OpenCV for testing which zone a detection is in
+
+
+class AlertPolicy:
+    """
+    Decides when an incident starts and ends and which detections are worth an
+    alert, so that flickering detections do not cause a storm of recordings
+    and messages.
+
+    - Hysteresis: an incident starts after start_frames consecutive frames with
+      detections and ends after stop_frames consecutive frames without.
+    - Deduplication: a tracker ID is reported at most once.
+    - Cooldown: after an alert for a class in a zone, new objects of that class
+      in that zone are not reported again for cooldown seconds.
+    - Digest: the first alert is sent at once; alerts raised within the next
+      digest_interval seconds are batched into one message.
+    """
+
+    def __init__(
+        self,
+        start_frames=None,
+        stop_frames=None,
+        cooldown=None,
+        digest_interval=None,
+        zones=None,
+        max_reported=10000,
+    ):
+        self.start_frames = start_frames or int(
+            os.getenv("ALERT_START_FRAMES", "3")
+        )  # Frames with detections before an incident starts
+        self.stop_frames = stop_frames or int(
+            os.getenv("ALERT_STOP_FRAMES", "10")
+        )  # Frames without detections before it ends
+        self.cooldown = (
+            cooldown
+            if cooldown is not None
+            else float(os.getenv("ALERT_COOLDOWN", "60"))
+        )  # Seconds between alerts for the same class and zone
+        self.digest_interval = (
+            digest_interval
+            if digest_interval is not None
+            else float(os.getenv("ALERT_DIGEST_SECONDS", "30"))
+        )  # Seconds over which further alerts are batched
+        self.zones = list(zones or [])  # Polygons; detections outside all of them are zone -1
+        self.max_reported = max_reported  # Tracker IDs remembered for deduplication
+        self.active = False  # Whether an incident is in progress
+        self.hit_frames = 0  # Consecutive frames with detections
+        self.miss_frames = 0  # Consecutive frames without detections
+        self.reported = collections.OrderedDict()  # Tracker IDs already considered
+        self.last_alert = {}  # (class_id, zone) -> time of its last alert
+        self.pending = []  # (class_id, zone, tracker_id) waiting for the digest
+        self.last_digest = float("-inf")  # Time the last digest was sent
+
+    def zone_of(self, box):
+        """
+        Returns:
+        - zone (int): The index of the first zone containing the box's centre,
+          -1 if there is none, or 0 without zones.
+        """
+        if not self.zones:
+            return 0
+        center = (float(box[0] + box[2]) / 2, float(box[1] + box[3]) / 2)
+        for index, zone in enumerate(self.zones):
+            if cv2.pointPolygonTest(zone, center, False) >= 0:
+                return index
+        return -1
+
+    def update(self, detections, now=None):
+        """
+        Feeds the detections of one frame to the policy.
+
+        Parameters:
+        - detections (sv.Detections): The tracked detections of the frame.
+        - now (float): The monotonic time of the frame.
+
+        Returns:
+        - active (bool): Whether an incident is in progress.
+        - digest (list): (class_id, zone, tracker_id) tuples to alert about now,
+          or None.
+        """
+        now = time.monotonic() if now is None else now
+        if len(detections) > 0:
+            self.hit_frames += 1
+            self.miss_frames = 0
+        else:
+            self.miss_frames += 1
+            self.hit_frames = 0
+        if not self.active and self.hit_frames >= self.start_frames:
+            self.active = True
+        elif self.active and self.miss_frames >= self.stop_frames:
+            self.active = False
+
+        if self.active and len(detections) > 0:
+            tracker_ids = (
+                detections.tracker_id
+                if detections.tracker_id is not None
+                else [None] * len(detections)
+            )
+            for tracker_id, class_id, box in zip(
+                tracker_ids, detections.class_id, detections.xyxy
+            ):
+                if tracker_id is not None:
+                    if tracker_id in self.reported:
+                        continue  # Never alert about the same object twice
+                    self.reported[tracker_id] = True
+                    if len(self.reported) > self.max_reported:
+                        self.reported.popitem(last=False)
+                key = (int(class_id), self.zone_of(box))
+                if now - self.last_alert.get(key, float("-inf")) < self.cooldown:
+                    continue  # Reported recently
+                self.last_alert[key] = now
+                self.pending.append((key[0], key[1], tracker_id))
+
+        digest = None
+        if self.pending and now - self.last_digest >= self.digest_interval:
+            digest, self.pending = self.pending, []
+            self.last_digest = now
+        return self.active, digest
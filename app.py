@@ -1,14 +1,30 @@
 from flask import (
     Flask,
+    Response,
     render_template,
     jsonify,
     request,
+    send_file,
+    send_from_directory,
+    stream_with_context,
+    url_for,
 )  # Import necessary Flask modules
+from werkzeug.security import safe_join  # Keep requested file names inside the video directory
 import os  # Import os module for interacting with the operating system
 import json  # Import json module for handling JSON data
 import threading  # Import threading module to handle concurrent execution
+import queue  # Import queue module for the per-client event queues
+import time  # Import time module for the index watcher interval
+import sqlite3  # Import sqlite3 module for errors of the index watcher
+import hashlib  # Import hashlib module for response validators
+import datetime  # Import datetime module for Last-Modified headers
+import atexit  # Import atexit module for stopping the camera workers
+import cv2  # Import OpenCV for encoding the live view of camera workers
 from flaskwebgui import FlaskUI  # Import FlaskUI from flaskwebgui
 from dotenv import load_dotenv  # for enviromental variables
+from incident_index import IncidentIndex  # SQLite index of finished recordings
+from thumbnails import ThumbnailCache, thumbnail_source  # Posters and previews for the gallery
+from supervisor import Supervisor  # Camera worker processes for multi-camera servers
 
 try:
     from main import (
@@ -24,6 +40,19 @@ app = Flask(__name__)  # Create a Flask application instance
 
 # Enable template auto-reloading
 app.config["TEMPLATES_AUTO_RELOAD"] = True
+# Let a fronting nginx/Apache send recordings with sendfile (X-Sendfile header)
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"
+
+incident_index = None  # Index of finished recordings used by the gallery, opened on first use
+incident_index_lock = threading.Lock()  # Opens the index only once
+thumbnail_cache = ThumbnailCache()  # Posters and previews shown instead of loading every video
+VIDEOS_PER_PAGE = 20  # Recordings shown per gallery page
+PLAYBACK_BLOCK_SIZE = 256 * 1024  # Bytes read per send when streaming recordings
+PLAYBACK_TYPES = {
+    ".webm": "video/webm",  # Incident recordings and re-encoded segments
+    ".mp4": "video/mp4",  # Stream-copied segments
+    ".mkv": "video/x-matroska",  # Stream-copied segments of older versions
+}  # Containers served by /videos and their MIME types
 
 
 def get_video_files():
@@ -42,37 +71,394 @@ def get_video_files():
     return video_directory, video_files  # Return the video directory and files
 
 
+def get_incident_index():
+    """
+    Opens the incident index (INCIDENT_INDEX) on first use, so that importing
+    the app does not create a database.
+    """
+    global incident_index
+    with incident_index_lock:
+        if incident_index is None:
+            incident_index = IncidentIndex()
+        return incident_index
+
+
+class VideoListCache:
+    """
+    Keeps the list of indexed recordings and its serialised /check-videos
+    response in memory. The list is only read again when the incident index
+    version changes, which covers segment-mode incidents without a video
+    file and recordings indexed by other processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Guards the cached state
+        self.version = None  # Index version of the cached list
+        self.video_files = []  # Cached list of finished recordings
+        self.body = b"[]"  # Cached JSON response body
+        self.etag = None  # Validator of the cached list
+        self.last_modified = None  # When the cached list last changed
+
+    def invalidate(self):
+        with self.lock:
+            self.version = None
+
+    def get(self):
+        """
+        Returns:
+        - (video_files, body, etag, last_modified) (tuple): The current list of
+          recordings, its JSON body and validators.
+        """
+        index = get_incident_index()
+        if not index.imported():  # Index recordings made before the index existed
+            video_directory, _ = get_video_files()
+            index.rebuild(video_directory)
+        version = index.version()
+        with self.lock:
+            if version != self.version:
+                self.video_files = index.file_names()
+                self.body = json.dumps(self.video_files).encode("utf-8")
+                etag = hashlib.sha1(
+                    f"{version}:".encode("utf-8") + self.body
+                ).hexdigest()  # Changes with the index, even when a name is reused
+                if etag != self.etag or self.last_modified is None:
+                    self.last_modified = datetime.datetime.now(datetime.timezone.utc)
+                self.etag = etag
+                self.version = version
+            return self.video_files, self.body, self.etag, self.last_modified
+
+
+def conditional_response(etag, last_modified, build):
+    """
+    Answers with 304 Not Modified when the client already has this version,
+    otherwise builds the response and attaches the validators.
+
+    Parameters:
+    - etag (str): The validator of the current version.
+    - last_modified (datetime.datetime): When the current version was created.
+    - build (callable): Creates the full response; only called when needed.
+    """
+    if request.if_none_match.contains(etag) or (
+        not request.if_none_match
+        and request.if_modified_since is not None
+        and last_modified.replace(microsecond=0) <= request.if_modified_since
+    ):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # Always revalidate, usually as a 304
+    return response
+
+
+def format_sse(event, data):
+    """
+    Formats one Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBroker:
+    """
+    Fans recording events out to every connected dashboard. Each client has a
+    small queue of its own; a client that stops reading loses events instead of
+    holding up the recorder or the other clients.
+    """
+
+    def __init__(self, client_queue_size=100, max_subscribers=None):
+        """
+        Parameters:
+        - client_queue_size (int): Events buffered per client.
+        - max_subscribers (int): Clients streamed at once (env MAX_EVENT_STREAMS,
+          default a quarter of WAITRESS_THREADS), since each holds a server thread.
+        """
+        self.client_queue_size = client_queue_size  # Events buffered per client
+        self.max_subscribers = max_subscribers or int(
+            os.getenv(
+                "MAX_EVENT_STREAMS",
+                str(max(1, int(os.getenv("WAITRESS_THREADS", "8")) // 4)),
+            )
+        )
+        self.lock = threading.Lock()  # Guards the subscriber list
+        self.subscribers = []  # One queue per connected client
+
+    def subscribe(self):
+        """
+        Returns:
+        - subscriber (queue.Queue): The client's events, or None if too many
+          clients are connected; they poll /check-videos instead.
+        """
+        subscriber = queue.Queue(maxsize=self.client_queue_size)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def publish(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                pass  # Slow client, it will resynchronise from /check-videos
+
+
+class IndexWatcher:
+    """
+    Polls the incident index and publishes added and deleted recordings, so that
+    recordings indexed by another process (main.py or a camera worker),
+    including segment incidents that have no video file, also reach the
+    dashboards. The recordings are only listed when the index version changes.
+    """
+
+    def __init__(self, broker, interval=2.0):
+        self.broker = broker  # Where the changes are published
+        self.interval = interval  # Seconds between checks
+        self.thread = None  # Started with the first client
+        self.last_version = None  # Index version at the last listing
+        self.known_videos = set()  # Recordings seen at the last listing
+
+    def start(self):
+        if self.thread is None:
+            index = get_incident_index()
+            self.last_version = index.version()
+            self.known_videos = set(index.file_names())
+            self.thread = threading.Thread(target=self._watch, daemon=True)
+            self.thread.start()
+
+    def check(self):
+        index = get_incident_index()
+        version = index.version()  # One query per tick; listing only follows a change
+        if version == self.last_version:
+            return  # Nothing was added or removed
+        self.last_version = version
+        videos = set(index.file_names())
+        for video_file in sorted(videos - self.known_videos):
+            self.broker.publish("video_added", {"file_name": video_file})
+        for video_file in sorted(self.known_videos - videos):
+            self.broker.publish("video_deleted", {"file_name": video_file})
+        self.known_videos = videos
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except sqlite3.Error as e:
+                print(f"Error watching recordings: {e}")
+
+
+events = EventBroker()  # Recording events for the connected dashboards
+index_watcher = IndexWatcher(events)  # Publishes recordings indexed by other processes
+video_cache = VideoListCache()  # Video list shared by the gallery and /check-videos
+
+
+def publish_recording_event(event, data):
+    video_cache.invalidate()  # A recording changed, read the index again
+    events.publish(event, data)
+
+
 @app.route("/")  # Define route for the root URL
 def video_gallery():
-    video_directory, video_files = get_video_files()  # Get the list of video files
-
-    video_metadata = []  # Initialize an empty list to store video metadata
-    for video_file in video_files:  # Iterate over each video file
-        metadata_file = os.path.join(
-            video_directory, f"{video_file}.json"
-        )  # Define the path to the metadata file
-        if os.path.exists(metadata_file):  # Check if the metadata file exists
-            with open(metadata_file, "r") as f:  # Open the metadata file
-                metadata = json.load(f)  # Load the metadata from the file
-            video_metadata.append(
-                {"file_name": video_file, "metadata": metadata}
-            )  # Append the video file and its metadata to the list
-        else:
-            video_metadata.append(
-                {"file_name": video_file, "metadata": None}
-            )  # Append the video file with no metadata
-    # reverse operation on the video_metadata list to display the most recent videos first
-    video_metadata = video_metadata[::-1]
-    return render_template(
-        "video_gallery.html", videos=video_metadata
-    )  # Render the video gallery template with the video metadata
+    page = request.args.get("page", 1, type=int)  # Requested page
+    date = request.args.get("date") or None  # Only recordings of this day (YYYY-MM-DD)
+    class_name = request.args.get("class") or None  # Only recordings with this class
+
+    def build():
+        index = get_incident_index()
+        video_metadata, total = index.query(
+            page=page, per_page=VIDEOS_PER_PAGE, date=date, class_name=class_name
+        )  # Most recent videos first
+        pages = max(1, -(-total // VIDEOS_PER_PAGE))  # Number of pages, rounded up
+        return app.make_response(
+            render_template(
+                "video_gallery.html",
+                videos=video_metadata,
+                page=page,
+                pages=pages,
+                total=total,
+                date=date or "",
+                class_name=class_name or "",
+                class_names=index.class_names(),
+            )
+        )  # Render the video gallery template with the video metadata
+
+    _, _, list_etag, last_modified = video_cache.get()  # Also indexes old recordings
+    etag = hashlib.sha1(
+        f"{list_etag}:{request.query_string.decode()}".encode("utf-8")
+    ).hexdigest()  # The page changes with the recordings and the filters
+    return conditional_response(etag, last_modified, build)
 
 
 @app.route("/check-videos")  # Define route for checking available videos
 def check_videos():
-    _, video_files = get_video_files()  # Get the list of video files
+    _, body, etag, last_modified = video_cache.get()  # Get the cached list of video files
+
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: Response(body, mimetype="application/json"),
+    )  # Return the list of video files as JSON, or 304 when it is unchanged
+
+
+@app.template_filter("video_type")
+def video_type(file_name):
+    """
+    Returns:
+    - mimetype (str): The MIME type of a playable recording, or None.
+    """
+    return PLAYBACK_TYPES.get(os.path.splitext(file_name)[1].lower())
+
+
+@app.template_filter("segment_playlist")
+def segment_playlist(segments):
+    """
+    Lists the spans of a segment recording for the gallery's player.
+
+    Parameters:
+    - segments (list): The incident's {"file", "start", "end"} entries.
+
+    Returns:
+    - playlist (list): {"src", "type", "start", "end"} entries, in playing order.
+    """
+    return [
+        {
+            "src": url_for("play_video", file_name=segment["file"]),
+            "type": video_type(segment["file"]),
+            "start": segment["start"],
+            "end": segment["end"],
+        }
+        for segment in segments
+    ]
+
+
+@app.route("/videos/<path:file_name>")  # Define route for playing recorded videos
+def play_video(file_name):
+    """
+    Serves a recording with HTTP Range support, so that the browser can seek
+    without downloading the whole file.
+
+    Full responses are handed to the server's wsgi.file_wrapper by Werkzeug.
+    Partial (206) responses would otherwise be streamed chunk by chunk through
+    a worker thread, so they are handed to the file wrapper as well, positioned
+    at the start of the range; waitress then sends them from its I/O loop and
+    frees the worker immediately.
+    """
+    mimetype = video_type(file_name)
+    if mimetype is None:
+        return jsonify({"error": "Video file not found"}), 404
+    video_directory = os.path.join(app.static_folder, "recorded_videos")
+    response = send_from_directory(
+        video_directory, file_name, mimetype=mimetype, conditional=True
+    )  # Adds Accept-Ranges, ETag and Last-Modified; answers 206, 304 and 416
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if response.status_code == 206 and file_wrapper is not None:
+        start = int(
+            response.headers["Content-Range"].split()[1].split("-")[0]
+        )  # "bytes <start>-<end>/<size>"
+        response.response.close()  # Werkzeug's range iterator
+        video = open(os.path.join(video_directory, file_name), "rb")
+        video.seek(start)
+        response.response = file_wrapper(video, PLAYBACK_BLOCK_SIZE)  # Sends Content-Length bytes
+    return response
+
+
+@app.route("/thumbnails/<path:file_name>/<any(poster, preview):kind>")
+def video_thumbnail(file_name, kind):
+    """
+    Serves the poster JPEG or animated WebM preview of a recording, creating
+    them on the first request if the recorder has not done so already.
+    """
+    video_directory = os.path.join(app.static_folder, "recorded_videos")
+    metadata_path = safe_join(video_directory, f"{file_name}.json")
+    if metadata_path is None or not os.path.exists(metadata_path):
+        return jsonify({"error": "Video file not found"}), 404
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    source, start, end = thumbnail_source(video_directory, file_name, metadata)
+    poster, preview = thumbnail_cache.get(file_name, source, start, end)
+    if poster is None:
+        return jsonify({"error": "Thumbnail not available"}), 404
+    return send_file(
+        poster if kind == "poster" else preview, conditional=True, max_age=3600
+    )
+
+
+@app.route("/events")  # Define route for pushing recording events to the dashboard
+def recording_events():
+    index_watcher.start()  # Watch the index once a client is listening
+    subscriber = events.subscribe()
+    if subscriber is None:
+        return (
+            jsonify({"error": "Too many event streams, poll /check-videos instead"}),
+            503,
+            {"Retry-After": "60"},
+        )  # Every stream holds a server thread; the rest must stay free
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"  # Reconnect delay for the browser
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # Keeps proxies from closing the stream
+                    continue
+                yield format_sse(event, data)
+        finally:
+            events.unsubscribe(subscriber)  # The client went away
+
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(
+        lambda: events.unsubscribe(subscriber)
+    )  # Also frees the slot of a stream that was never started
+    return response
+
+
+def mjpeg_part(jpeg):
+    return (
+        b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+        + str(len(jpeg)).encode("ascii")
+        + b"\r\n\r\n"
+        + jpeg
+        + b"\r\n"
+    )
+
+
+@app.route("/live")  # Define route for watching the running system live
+def live_view():
+    system = live_system
+    if system is None:
+        return (
+            jsonify({"error": "The surveillance system is not running"}),
+            404,
+        )  # Nothing to show before the system is started
+
+    def stream():
+        sequence = 0  # Last frame sent to this viewer
+        with system.live_stream.viewing():  # Boxes are drawn while somebody watches
+            while live_system is system:
+                sequence, jpeg = system.live_stream.wait(sequence, timeout=5)
+                if jpeg is not None:
+                    yield mjpeg_part(jpeg)  # Frames published meanwhile are skipped
 
-    return jsonify(video_files)  # Return the list of video files as JSON
+    return Response(
+        stream(),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route(
@@ -94,11 +480,24 @@ def delete_video():
     metadata_path = os.path.join(
         app.static_folder, "recorded_videos", f"{video_file}.json"
     )  # Define the path to the metadata file
-
-    if os.path.exists(video_path):  # Check if the video file exists
-        os.remove(video_path)  # Remove the video file
+    tracks_paths = [
+        os.path.join(app.static_folder, "recorded_videos", f"{video_file}{suffix}")
+        for suffix in (".tracks.jsonl", ".tracks.npz")
+    ]  # Define the paths to the detection tracks of the recording
+
+    if os.path.exists(video_path) or os.path.exists(
+        metadata_path
+    ):  # Check if the video exists (segment incidents only have metadata)
+        if os.path.exists(video_path):
+            os.remove(video_path)  # Remove the video file
+        get_incident_index().remove(video_file)  # Remove it from the gallery index
+        publish_recording_event("video_deleted", {"file_name": video_file})
         if os.path.exists(metadata_path):  # Check if the metadata file exists
             os.remove(metadata_path)  # Remove the metadata file
+        for tracks_path in tracks_paths:
+            if os.path.exists(tracks_path):  # Check if a detection track exists
+                os.remove(tracks_path)  # Remove the detection track
+        thumbnail_cache.remove(video_file)  # Remove the poster and preview
         return jsonify(
             {"success": f"{video_file} deleted successfully"}
         )  # Return success message
@@ -112,11 +511,12 @@ def delete_video():
 # Global variable to track if the script is running
 is_running = False
 lock = threading.Lock()  # Lock to ensure thread-safe access to the is_running variable
+live_system = None  # The system started from the dashboard, served by /live
 
 
 @app.route("/run-main", methods=["POST"])  # Define route to run main.py
 def run_main():
-    global is_running
+    global is_running, live_system
     with lock:
         if is_running:
             return jsonify(
@@ -131,16 +531,27 @@ def run_main():
         group_id = data.get("groupId")
 
         # Create an instance of the SurveillanceSystem class
-        system = SurveillanceSystem(bot_token=telegram_token, chat_id=group_id)
+        system = SurveillanceSystem(
+            bot_token=telegram_token, chat_id=group_id, thumbnails=thumbnail_cache
+        )
+        system.event_listeners.append(
+            publish_recording_event
+        )  # Push recordings to the dashboards
+
+        live_system = system  # Serve its frames on /live
 
         # Function to run the surveillance system and capture output
         def run_system():
+            global live_system
             try:
                 system.run()
             except Exception as e:
                 print(
                     f"The system can't run on web. Starting the surveillance system requires running the software executable.Error: {e}"
                 )
+            finally:
+                if live_system is system:
+                    live_system = None  # Ends the live streams of this system
 
         # Run the surveillance system in a separate thread
         thread = threading.Thread(target=run_system)
@@ -161,18 +572,133 @@ def run_main():
             is_running = False  # Reset the running state
 
 
+supervisor = None  # Camera worker processes, created on first use
+supervisor_lock = threading.Lock()  # Creates the supervisor only once
+LIVE_POLL_INTERVAL = 0.02  # Seconds between checks of a worker's frame bus
+
+
+def get_supervisor():
+    global supervisor
+    with supervisor_lock:
+        if supervisor is None:
+            supervisor = Supervisor.from_env()  # Workers from CAMERA_WORKERS
+            atexit.register(supervisor.close)  # Stop the workers with the server
+        return supervisor
+
+
+def control_workers(action, name=None):
+    try:
+        names = action(name)
+    except KeyError:
+        return jsonify({"error": f"Unknown worker {name}"}), 404
+    return jsonify({"workers": names, "status": get_supervisor().status(name)})
+
+
+@app.route("/workers")  # Define route for the state of the camera workers
+def worker_status():
+    return jsonify(get_supervisor().status())
+
+
+@app.route("/workers/start", methods=["POST"])
+@app.route("/workers/<name>/start", methods=["POST"])
+def start_worker(name=None):
+    return control_workers(get_supervisor().start, name)
+
+
+@app.route("/workers/stop", methods=["POST"])
+@app.route("/workers/<name>/stop", methods=["POST"])
+def stop_worker(name=None):
+    return control_workers(get_supervisor().stop, name)
+
+
+class BusLiveView:
+    """
+    Encodes the newest frame on a worker camera's FrameBus once, however many
+    dashboards watch it.
+    """
+
+    def __init__(self, bus, quality=80):
+        self.bus = bus
+        self.quality = quality  # JPEG quality of the live view
+        self.lock = threading.Lock()  # One encode per frame
+        self.sequence = 0  # Sequence of the encoded frame
+        self.jpeg = None  # The encoded frame
+
+    def wait(self, last_sequence, timeout=5.0):
+        """
+        Returns:
+        - sequence (int): The sequence of the newest frame.
+        - jpeg (bytes): The newest frame, or None if there was no newer frame
+          than last_sequence within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self.bus.touch()  # Tell the worker that its frames are watched
+            latest = self.bus.latest_sequence()
+            if latest > last_sequence:
+                with self.lock:
+                    if self.sequence < latest:
+                        view = self.bus.read(latest)
+                        if view is not None:
+                            ok, encoded = cv2.imencode(
+                                ".jpg",
+                                view.frame,
+                                [cv2.IMWRITE_JPEG_QUALITY, self.quality],
+                            )  # Encoded straight from shared memory
+                            if ok and self.bus.valid(view):  # Not overwritten meanwhile
+                                self.sequence, self.jpeg = latest, encoded.tobytes()
+                            del view  # Release the shared memory
+                    if self.sequence > last_sequence:
+                        return self.sequence, self.jpeg
+            if time.monotonic() >= deadline:
+                return last_sequence, None
+            time.sleep(LIVE_POLL_INTERVAL)
+
+
+bus_live_views = {}  # Camera name -> BusLiveView shared by its viewers
+
+
+@app.route("/live/<camera>")  # Define route for watching a worker's camera live
+def worker_live_view(camera):
+    bus = get_supervisor().buses.get(camera)
+    if bus is None:
+        return jsonify({"error": f"Unknown camera {camera}"}), 404
+    with supervisor_lock:
+        view = bus_live_views.get(camera)
+        if view is None or view.bus is not bus:
+            view = bus_live_views[camera] = BusLiveView(bus)
+
+    def stream():
+        sequence = 0  # Last frame sent to this viewer
+        while True:
+            sequence, jpeg = view.wait(sequence, timeout=10)
+            if jpeg is None:
+                break  # The worker stopped
+            yield mjpeg_part(jpeg)  # Frames published meanwhile are skipped
+
+    return Response(
+        stream(),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Used code from https://pypi.org/project/flaskwebgui/ (Advanced Usage)
 def start_flask(**server_kwargs):
 
     app = server_kwargs.pop("app", None)
     server_kwargs.pop("debug", None)
 
+    server_kwargs.setdefault(
+        "threads", int(os.getenv("WAITRESS_THREADS", "8"))
+    )  # Each live view or event stream holds one thread; playback does not
     try:
         import waitress
 
         waitress.serve(app, **server_kwargs)
     except Exception as e:
         print(f"Error occurred: {e}")
+        server_kwargs.pop("threads", None)  # Only understood by waitress
         app.run(**server_kwargs)
 
 
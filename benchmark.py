@@ -0,0 +1,182 @@
+import argparse  # Import argparse for the command line options
+import time  # Import time for measuring latency
+import multiprocessing  # Import multiprocessing for the camera writer processes
+import queue  # Import queue for draining the pickling baseline
+import numpy as np  # Import NumPy for the synthetic test frame
+from main import INFERENCE_BACKENDS, load_model  # Import the backend loader
+from framebus import FrameBus  # Import the frame bus for the throughput benchmark
+
+
+def benchmark_backend(backend, weights="yolov8n.pt", runs=50, imgsz=640):
+    """
+    Measures the CPU inference latency of one backend.
+
+    Parameters:
+    - backend (str): One of INFERENCE_BACKENDS.
+    - weights (str): The PyTorch weights to load or export from.
+    - runs (int): The number of timed inferences.
+    - imgsz (int): The size of the square test frame.
+
+    Returns:
+    - stats (dict): Load time and latency percentiles in milliseconds.
+    """
+    started = time.perf_counter()
+    model = load_model(weights, backend, warm_up=True, imgsz=imgsz)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    frame = np.random.randint(0, 255, (imgsz, imgsz, 3), dtype=np.uint8)
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model(frame, verbose=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": backend,
+        "load_ms": load_ms,
+        "mean_ms": float(np.mean(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def publish_frames(bus_name, seconds, width, height):
+    """
+    Writer process of the frame bus benchmark: publishes as fast as it can.
+    """
+    bus = FrameBus(bus_name)
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        bus.publish(frame)
+    bus.close()
+
+
+def queue_frames(frames, seconds, width, height):
+    """
+    Writer process of the pickling baseline: sends frames through a queue.
+    """
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            frames.put(frame, timeout=0.1)
+        except queue.Full:
+            pass
+    frames.put(None)
+
+
+def benchmark_frame_bus(cameras=4, seconds=5.0, width=1920, height=1080, transport="bus"):
+    """
+    Measures how many frames per second N camera processes can hand to one
+    reader, the web server's role.
+
+    Parameters:
+    - cameras (int): The number of writer processes.
+    - seconds (float): How long each writer publishes.
+    - width, height (int): The frame size.
+    - transport (str): "bus" for the FrameBus, "queue" for pickled frames
+      through a multiprocessing.Queue.
+
+    Returns:
+    - stats (dict): Frames per second published and read, in total and per camera.
+    """
+    context = multiprocessing.get_context("spawn")
+    buses = []
+    if transport == "bus":
+        buses = [FrameBus(create=True, width=width, height=height) for _ in range(cameras)]
+        processes = [
+            context.Process(target=publish_frames, args=(bus.name, seconds, width, height))
+            for bus in buses
+        ]
+    else:
+        frames = context.Queue(maxsize=2 * cameras)
+        processes = [
+            context.Process(target=queue_frames, args=(frames, seconds, width, height))
+            for _ in range(cameras)
+        ]
+    for process in processes:
+        process.start()
+
+    read = 0
+    checksum = 0  # Touch every frame read, as an encoder would
+    if transport == "bus":
+        last_sequences = [0] * cameras
+        while any(process.is_alive() for process in processes):
+            for index, bus in enumerate(buses):
+                view = bus.latest()
+                if view is not None and view.sequence != last_sequences[index]:
+                    checksum += int(view.frame[::64, ::64].sum())
+                    if bus.valid(view):
+                        last_sequences[index] = view.sequence
+                        read += 1
+                del view
+        published = sum(bus.latest_sequence() for bus in buses)
+    else:
+        finished = 0
+        while finished < cameras:
+            frame = frames.get()
+            if frame is None:
+                finished += 1
+                continue
+            checksum += int(frame[::64, ::64].sum())
+            read += 1
+        published = read
+
+    for process in processes:
+        process.join()
+    for bus in buses:
+        bus.close()
+    return {
+        "transport": transport,
+        "cameras": cameras,
+        "published_fps": published / seconds,
+        "read_fps": read / seconds,
+        "read_fps_per_camera": read / seconds / cameras,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends on CPU.")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument(
+        "--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=list(INFERENCE_BACKENDS)
+    )
+    parser.add_argument(
+        "--frame-bus",
+        type=int,
+        metavar="CAMERAS",
+        help="Measure frame bus throughput with this many cameras instead.",
+    )
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--resolution", default="1920x1080")
+    args = parser.parse_args()
+
+    if args.frame_bus:
+        width, height = map(int, args.resolution.split("x"))
+        print(f"{'transport':<10}{'cameras':>8}{'published':>12}{'read':>10}{'per camera':>12}")
+        for transport in ("bus", "queue"):
+            stats = benchmark_frame_bus(args.frame_bus, args.seconds, width, height, transport)
+            print(
+                f"{stats['transport']:<10}{stats['cameras']:>8}{stats['published_fps']:>12.1f}"
+                f"{stats['read_fps']:>10.1f}{stats['read_fps_per_camera']:>12.1f}"
+            )
+        return
+
+    print(f"{'backend':<10}{'load ms':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for backend in args.backends:
+        try:
+            stats = benchmark_backend(backend, args.weights, args.runs, args.imgsz)
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")  # e.g. onnxruntime not installed
+            continue
+        print(
+            f"{stats['backend']:<10}{stats['load_ms']:>10.1f}{stats['mean_ms']:>10.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os  # Import os for the bus settings
+import time  # Import time for frame timestamps and polling
+import struct  # Import struct for the bus and slot headers
+import collections  # Import collections for the FrameView tuple
+from multiprocessing import shared_memory  # Import shared_memory for the frame slots
+import numpy as np  # Import NumPy for zero-copy views of the slots
+
+DETECTION = np.dtype(
+    [
+        ("xyxy", "<f4", (4,)),
+        ("confidence", "<f4"),
+        ("class_id", "<i4"),
+        ("tracker_id", "<i4"),
+    ]
+)  # One detection in a slot header; tracker_id is -1 for untracked boxes
+
+FrameView = collections.namedtuple(
+    "FrameView", ["sequence", "timestamp", "frame", "detections"]
+)  # A published frame; frame and detections are views into shared memory
+
+
+def align(size, boundary=64):
+    return (size + boundary - 1) // boundary * boundary
+
+
+class FrameBus:
+    """
+    Passes the frames of one camera from its worker process to the web server,
+    recorders and notifiers through shared memory, without pickling or copying.
+
+    The segment holds a ring of fixed-size slots. Each slot has a header with
+    its sequence number, timestamp, frame size and the frame's detections,
+    followed by the BGR frame. There is one writer; readers get read-only
+    NumPy views of the newest slot. The writer does not reuse a slot until
+    slots - 1 newer frames have been published, and its state is odd while
+    it is being written, so readers check valid() after using a view and
+    drop frames that were overwritten meanwhile.
+    """
+
+    HEADER = struct.Struct(
+        "<QIIIId"
+    )  # latest sequence, slots, height, width, max detections, last viewed time
+    VIEWED_OFFSET = 24  # Offset of the last viewed time in the header
+    SLOT_HEADER = struct.Struct("<QdIII4x")  # state, timestamp, height, width, detections
+
+    def __init__(
+        self,
+        name=None,
+        create=False,
+        slots=None,
+        width=None,
+        height=None,
+        max_detections=64,
+    ):
+        """
+        Parameters:
+        - name (str): The shared memory name; a new one is chosen when creating.
+        - create (bool): Create the bus instead of attaching to an existing one.
+        - slots (int): Frames kept in the ring (env FRAME_BUS_SLOTS, default 4).
+        - width, height (int): Largest frame size (env FRAME_BUS_RESOLUTION,
+          default 1920x1080). Larger frames are not published.
+        - max_detections (int): Detections kept per frame.
+        """
+        if create:
+            default_width, default_height = map(
+                int, os.getenv("FRAME_BUS_RESOLUTION", "1920x1080").split("x")
+            )
+            self.slots = slots or int(os.getenv("FRAME_BUS_SLOTS", "4"))
+            self.width = width or default_width
+            self.height = height or default_height
+            self.max_detections = max_detections
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.layout()
+            )
+            self.HEADER.pack_into(
+                self.shm.buf,
+                0,
+                0,
+                self.slots,
+                self.height,
+                self.width,
+                max_detections,
+                0.0,
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            _, self.slots, self.height, self.width, self.max_detections, _ = (
+                self.HEADER.unpack_from(self.shm.buf, 0)
+            )  # The creator's geometry
+            self.layout()
+        self.name = self.shm.name
+        self.owner = create  # Only the creator unlinks the segment
+        self.sequence = self.latest_sequence()  # Last frame published by this writer
+        self.skipped = 0  # Frames too large for the slots
+
+    def layout(self):
+        """
+        Computes the slot offsets.
+
+        Returns:
+        - size (int): The size of the shared memory segment.
+        """
+        self.detections_offset = self.SLOT_HEADER.size
+        self.frame_offset = align(
+            self.detections_offset + self.max_detections * DETECTION.itemsize
+        )
+        self.slot_size = align(self.frame_offset + self.height * self.width * 3)
+        self.first_slot = align(self.HEADER.size)
+        return self.first_slot + self.slots * self.slot_size
+
+    def slot(self, sequence):
+        return self.first_slot + sequence % self.slots * self.slot_size
+
+    def latest_sequence(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def publish(self, frame, detections=None, timestamp=None):
+        """
+        Copies a frame and its detections into the next slot.
+
+        Parameters:
+        - frame (np.ndarray): A BGR frame.
+        - detections (sv.Detections): The frame's detections, or None.
+        - timestamp (float): The capture time, time.time() by default.
+
+        Returns:
+        - sequence (int): The frame's sequence number, or None if it is too large.
+        """
+        height, width = frame.shape[:2]
+        if height > self.height or width > self.width or frame.shape[2:] != (3,):
+            self.skipped += 1
+            return None
+        sequence = self.sequence + 1
+        offset = self.slot(sequence)
+        self.SLOT_HEADER.pack_into(
+            self.shm.buf, offset, 2 * sequence - 1, 0.0, 0, 0, 0
+        )  # Odd while the slot is being written
+        np.copyto(
+            np.ndarray(
+                (height, width, 3), np.uint8, self.shm.buf, offset + self.frame_offset
+            ),
+            frame,
+        )
+        count = 0
+        if detections is not None and len(detections) > 0:
+            count = min(len(detections), self.max_detections)
+            slots = np.ndarray(
+                (count,), DETECTION, self.shm.buf, offset + self.detections_offset
+            )
+            slots["xyxy"] = detections.xyxy[:count]
+            slots["confidence"] = (
+                detections.confidence[:count]
+                if detections.confidence is not None
+                else 1.0
+            )
+            slots["class_id"] = (
+                detections.class_id[:count] if detections.class_id is not None else -1
+            )
+            slots["tracker_id"] = (
+                detections.tracker_id[:count]
+                if detections.tracker_id is not None
+                else -1
+            )
+            del slots  # Release the export of the shared buffer
+        self.SLOT_HEADER.pack_into(
+            self.shm.buf,
+            offset,
+            2 * sequence,
+            timestamp or time.time(),
+            height,
+            width,
+            count,
+        )
+        struct.pack_into("<Q", self.shm.buf, 0, sequence)
+        self.sequence = sequence
+        return sequence
+
+    def read(self, sequence):
+        """
+        Returns:
+        - view (FrameView): Views of the frame with the given sequence, or None
+          if it is being written or was already overwritten.
+        """
+        offset = self.slot(sequence)
+        state, timestamp, height, width, count = self.SLOT_HEADER.unpack_from(
+            self.shm.buf, offset
+        )
+        if state != 2 * sequence:
+            return None
+        frame = np.ndarray(
+            (height, width, 3), np.uint8, self.shm.buf, offset + self.frame_offset
+        )
+        detections = np.ndarray(
+            (count,), DETECTION, self.shm.buf, offset + self.detections_offset
+        )
+        frame.flags.writeable = False  # Readers must not change the writer's slots
+        detections.flags.writeable = False
+        view = FrameView(sequence, timestamp, frame, detections)
+        return view if self.valid(view) else None
+
+    def latest(self):
+        """
+        Returns:
+        - view (FrameView): The newest frame, or None if nothing was published.
+        """
+        sequence = self.latest_sequence()
+        return self.read(sequence) if sequence else None
+
+    def wait(self, last_sequence, timeout=5.0, interval=0.005):
+        """
+        Waits for a frame newer than last_sequence.
+
+        Returns:
+        - view (FrameView): The newest frame, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.latest_sequence() > last_sequence:
+                view = self.latest()
+                if view is not None:
+                    return view
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def valid(self, view):
+        """
+        Returns:
+        - valid (bool): Whether the view's slot still holds its frame; check it
+          after using a view, e.g. after encoding it.
+        """
+        state = struct.unpack_from("<Q", self.shm.buf, self.slot(view.sequence))[0]
+        return state == 2 * view.sequence
+
+    def touch(self):
+        """
+        Marks the bus as watched; live viewers call it while they are connected.
+        """
+        struct.pack_into("<d", self.shm.buf, self.VIEWED_OFFSET, time.time())
+
+    def watched(self, within=2.0):
+        """
+        Returns:
+        - watched (bool): Whether a live viewer touched the bus in the last
+          within seconds, so that the writer knows whether to draw its frames.
+        """
+        viewed = struct.unpack_from("<d", self.shm.buf, self.VIEWED_OFFSET)[0]
+        return time.time() - viewed < within
+
+    def close(self):
+        """
+        Detaches from the bus; views returned by read() must be released first.
+        """
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
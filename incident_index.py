@@ -0,0 +1,211 @@
+import os  # Import os for file paths and environment variables
+import json  # Import json for reading metadata files and storing class counts
+import sqlite3  # Import sqlite3 for the embedded index database
+import threading  # Import threading to serialise access to the shared connection
+
+# Default location of the index database, next to the application
+INDEX_FILE = os.getenv(
+    "INCIDENT_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "incidents.db"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    file_name TEXT PRIMARY KEY,
+    start_time TEXT,
+    end_time TEXT,
+    duration REAL,
+    tracker_count INTEGER,
+    class_counts TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_start_time ON recordings (start_time);
+CREATE TABLE IF NOT EXISTS recording_classes (
+    file_name TEXT REFERENCES recordings (file_name) ON DELETE CASCADE,
+    class_name TEXT,
+    count INTEGER,
+    PRIMARY KEY (file_name, class_name)
+);
+CREATE INDEX IF NOT EXISTS recording_classes_class_name ON recording_classes (class_name);
+CREATE TABLE IF NOT EXISTS index_version (version INTEGER NOT NULL);
+INSERT INTO index_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM index_version);
+CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class IncidentIndex:
+    """
+    SQLite index of finished recordings, so that the gallery can page and filter
+    recordings without listing the video directory and loading every metadata file.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path  # Location of the database file
+        self.lock = threading.Lock()  # One statement at a time on the shared connection
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute(
+                "PRAGMA journal_mode=WAL"
+            )  # Readers never block the recorder
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.connection.executescript(SCHEMA)
+
+    def add(self, metadata):
+        """
+        Adds or replaces a finished recording.
+
+        Parameters:
+        - metadata (dict): The recording metadata as written next to the video.
+        """
+        detections = metadata.get("detections") or {}
+        class_counts = {}
+        for detection in detections.values():
+            class_name = detection.get("class_name")
+            class_counts[class_name] = class_counts.get(class_name, 0) + 1
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    metadata["file_name"],
+                    metadata.get("start_time"),
+                    metadata.get("end_time"),
+                    metadata.get("total_duration"),
+                    len(detections),
+                    json.dumps(class_counts),
+                    json.dumps(metadata),
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM recording_classes WHERE file_name = ?",
+                (metadata["file_name"],),
+            )
+            self.connection.executemany(
+                "INSERT INTO recording_classes VALUES (?, ?, ?)",
+                [
+                    (metadata["file_name"], class_name, count)
+                    for class_name, count in class_counts.items()
+                ],
+            )
+            self.connection.execute("UPDATE index_version SET version = version + 1")
+
+    def remove(self, file_name):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM recordings WHERE file_name = ?", (file_name,)
+            )
+            self.connection.execute("UPDATE index_version SET version = version + 1")
+
+    def version(self):
+        """
+        Returns:
+        - version (int): A counter bumped by every add and remove, from any
+          process; 0 if nothing was ever indexed.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT version FROM index_version"
+            ).fetchone()[0]
+
+    def file_names(self):
+        """
+        Returns:
+        - file_names (list): Every indexed recording, oldest first.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT file_name FROM recordings ORDER BY start_time, file_name"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def imported(self):
+        """
+        Returns:
+        - imported (bool): Whether rebuild() already indexed the recordings made
+          before the index existed, whatever was recorded since.
+        """
+        with self.lock:
+            return (
+                self.connection.execute(
+                    "SELECT 1 FROM index_meta WHERE key = 'imported'"
+                ).fetchone()
+                is not None
+            )
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def query(self, page=1, per_page=20, date=None, class_name=None):
+        """
+        Lists recordings, most recent first.
+
+        Parameters:
+        - page (int): The 1-based page to return.
+        - per_page (int): The number of recordings per page.
+        - date (str): Only recordings started on this day (YYYY-MM-DD).
+        - class_name (str): Only recordings in which this class was detected.
+
+        Returns:
+        - recordings (list): {"file_name", "metadata"} dicts for the page.
+        - total (int): The number of matching recordings on all pages.
+        """
+        conditions, parameters = [], []
+        if date:
+            conditions.append("start_time LIKE ?")
+            parameters.append(f"{date}%")
+        if class_name:
+            conditions.append(
+                "file_name IN (SELECT file_name FROM recording_classes WHERE class_name = ?)"
+            )
+            parameters.append(class_name)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            total = self.connection.execute(
+                f"SELECT COUNT(*) FROM recordings {where}", parameters
+            ).fetchone()[0]
+            rows = self.connection.execute(
+                f"SELECT file_name, metadata FROM recordings {where} "
+                "ORDER BY start_time DESC, file_name DESC LIMIT ? OFFSET ?",
+                parameters + [per_page, (max(page, 1) - 1) * per_page],
+            ).fetchall()
+        recordings = [
+            {"file_name": row["file_name"], "metadata": json.loads(row["metadata"])}
+            for row in rows
+        ]
+        return recordings, total
+
+    def class_names(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT class_name FROM recording_classes ORDER BY class_name"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def rebuild(self, video_directory):
+        """
+        Indexes every recording in a directory from its metadata file. Only needed
+        once for recordings made before the index existed.
+
+        Returns:
+        - indexed (int): The number of recordings added.
+        """
+        indexed = 0
+        for name in os.listdir(video_directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(video_directory, name)) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(metadata, dict) or metadata.get("file_name") != name[: -len(".json")]:
+                continue  # Not the metadata file of a recording
+            self.add(metadata)
+            indexed += 1
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO index_meta VALUES ('imported', ?)",
+                (video_directory,),
+            )  # Not repeated by later imported() checks
+        return indexed
@@ -1,4 +1,3 @@
-import mimetypes
 import cv2  # Import the OpenCV library for computer vision tasks
 import numpy as np  # Import the NumPy library for numerical operations
 import supervision as sv  # Import the supervision library for tracking and annotation
@@ -7,19 +6,987 @@ import os  # Import the os module for interacting with the operating system
 import datetime  # Import the datetime module for date and time operations
 import json  # Import the json module for handling JSON data
 import threading  # to handle concurrent execution
+import queue  # bounded queues linking the pipeline stages
+import time  # monotonic clock for polling camera readers and timing inference
+import math  # rounding the frame-skip interval
+import collections  # deque for the pre-event ring buffer
+import shutil  # locating ffmpeg for stream-copy recording
+import subprocess  # running ffmpeg for stream-copy recording
+import contextlib  # counting live viewers
+try:
+    import fcntl  # locking the metadata of recordings in progress
+except ImportError:  # Windows
+    fcntl = None
 from dotenv import load_dotenv  # for enviromental variables
-import http.client
-import concurrent.futures
+from incident_index import IncidentIndex  # SQLite index of finished recordings
+from thumbnails import ThumbnailCache  # poster and preview cache for the gallery
+from notifier import NotificationDispatcher  # queued Telegram alerts over one connection
+from alert_policy import AlertPolicy  # incident hysteresis, alert cooldowns and digests
 
 # Load environment variables from .env file
 load_dotenv()
 
 
+def put_latest(stage_queue, item):
+    """
+    Puts an item on a bounded queue, discarding the oldest queued items when it is full.
+
+    Parameters:
+    - stage_queue (queue.Queue): The bounded queue linking two pipeline stages.
+    - item: The item to enqueue.
+
+    Returns:
+    - dropped (int): The number of stale items that were discarded to make room.
+    """
+    dropped = 0
+    while True:
+        try:
+            stage_queue.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                stage_queue.get_nowait()  # Drop the stalest item
+                dropped += 1
+            except queue.Empty:
+                pass  # A consumer emptied the queue in the meantime
+
+
+INFERENCE_BACKENDS = {
+    "torch": None,  # Native PyTorch weights, no export needed
+    "onnx": "{stem}.onnx",  # ONNX Runtime
+    "openvino": "{stem}_openvino_model",  # Intel OpenVINO
+}  # Supported backends and the file each one is exported to
+
+
+def load_model(weights="yolov8n.pt", backend="torch", warm_up=True, imgsz=640):
+    """
+    Loads the detector for an inference backend, exporting the weights once and
+    reusing the exported model on later starts.
+
+    Parameters:
+    - weights (str): The PyTorch weights to load or export from.
+    - backend (str): One of INFERENCE_BACKENDS.
+    - warm_up (bool): Run one inference so that the first real frame does not pay
+      for lazy initialisation and memory allocation.
+    - imgsz (int): The input size used for export and warm-up.
+
+    Returns:
+    - model (YOLO): The loaded model.
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend {backend!r}, expected one of {', '.join(INFERENCE_BACKENDS)}."
+        )
+    model = YOLO(weights)  # Load the YOLO model with the specified weights
+    if INFERENCE_BACKENDS[backend] is not None:
+        stem = os.path.splitext(weights)[0]
+        exported = INFERENCE_BACKENDS[backend].format(stem=stem)
+        if not os.path.exists(exported):
+            exported = model.export(format=backend, imgsz=imgsz)  # Export once and cache
+        model = YOLO(exported, task="detect")
+    if warm_up:
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+    return model
+
+
+def parse_source(source):
+    """
+    Converts a camera source from configuration into what cv2.VideoCapture expects.
+
+    Parameters:
+    - source (int | str): A device index, file path or RTSP/MJPEG URL.
+
+    Returns:
+    - source (int | str): Device indexes as int, everything else unchanged.
+    """
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source.strip())  # "0" -> device index 0
+    return source
+
+
+class LatestFrameReader:
+    """
+    Reads a camera on a background thread and keeps only its most recent frame,
+    so that a slow consumer always sees the current scene instead of a backlog.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera  # The cv2.VideoCapture to read from
+        self.lock = threading.Lock()  # Guards frame and sequence
+        self.frame = None  # Most recent frame
+        self.sequence = 0  # Incremented for every new frame
+        self.finished = False  # Set once the camera stops delivering frames
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.finished = True
+        self.thread.join(timeout=1.0)
+
+    def _read_loop(self):
+        while not self.finished:
+            ret, frame = self.camera.read()  # Read a frame from the camera
+            if not ret:
+                break
+            with self.lock:
+                self.frame = frame
+                self.sequence += 1
+        self.finished = True
+
+    def latest(self):
+        """
+        Returns:
+        - (sequence, frame) (tuple): The newest frame and its sequence number.
+        """
+        with self.lock:
+            return self.sequence, self.frame
+
+
+class MotionGate:
+    """
+    Cheap motion pre-filter run on a small grayscale copy of the frame, so that
+    the full detector can be skipped while nothing in the scene changes.
+    """
+
+    def __init__(self, width=160, threshold=0.005, history=500):
+        self.width = width  # Width the frame is downscaled to before analysis
+        self.threshold = threshold  # Fraction of changed pixels that counts as motion
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=history, detectShadows=False
+        )  # Background model of the (downscaled) empty scene
+
+    def has_motion(self, frame: np.ndarray) -> bool:
+        """
+        Updates the background model with a frame and reports whether it moved.
+
+        Parameters:
+        - frame (np.ndarray): The full-size BGR frame.
+
+        Returns:
+        - motion (bool): True if enough pixels differ from the background.
+        """
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        mask = self.subtractor.apply(gray)  # Foreground pixels are 255
+        return cv2.countNonZero(mask) > self.threshold * mask.size
+
+
+def empty_detections() -> sv.Detections:
+    detections = sv.Detections.empty()  # No objects in the frame
+    detections.tracker_id = np.array([], dtype=int)  # Match the tracker output
+    return detections
+
+
+class FrameSkipScheduler:
+    """
+    Runs the detector on every k-th frame only, choosing k from the measured
+    inference time so that the whole loop keeps up with a target frame rate.
+    On skipped frames the last tracked boxes are moved forward linearly.
+    """
+
+    def __init__(self, target_fps, max_skip=10, smoothing=0.2):
+        self.target_fps = target_fps  # Frame rate the loop should sustain
+        self.max_skip = max_skip  # Upper bound on k so boxes never go stale for long
+        self.smoothing = smoothing  # Weight of the newest measurement in the average
+        self.inference_time = 0.0  # Exponential moving average of inference seconds
+        self.skip_interval = 1  # Current k: run the detector on every k-th frame
+        self.frames_since_inference = 0  # Frames carried forward since the last detection
+        self.last_detections = None  # Tracked detections of the last inference
+        self.velocity = None  # Per-box xyxy change per frame
+
+    def record_inference_time(self, seconds):
+        if self.inference_time == 0.0:
+            self.inference_time = seconds
+        else:
+            self.inference_time += self.smoothing * (seconds - self.inference_time)
+        self.skip_interval = min(
+            self.max_skip, max(1, math.ceil(self.inference_time * self.target_fps))
+        )
+
+    def should_infer(self) -> bool:
+        if self.last_detections is None or (
+            self.frames_since_inference + 1 >= self.skip_interval
+        ):
+            return True
+        self.frames_since_inference += 1
+        return False
+
+    def update(self, detections: sv.Detections):
+        """
+        Stores fresh tracked detections and estimates each box's velocity from the
+        previous inference of the same tracker ID.
+        """
+        velocity = np.zeros_like(detections.xyxy, dtype=np.float32)
+        previous = self.last_detections
+        if previous is not None and len(previous) and len(detections):
+            frame_gap = self.frames_since_inference + 1
+            previous_rows = {
+                int(tracker_id): row for row, tracker_id in enumerate(previous.tracker_id)
+            }
+            for row, tracker_id in enumerate(detections.tracker_id):
+                previous_row = previous_rows.get(int(tracker_id))
+                if previous_row is not None:
+                    velocity[row] = (
+                        detections.xyxy[row] - previous.xyxy[previous_row]
+                    ) / frame_gap
+        self.last_detections = detections
+        self.velocity = velocity
+        self.frames_since_inference = 0
+
+    def carry_forward(self) -> sv.Detections:
+        """
+        Returns:
+        - detections (sv.Detections): The last detections moved along their velocity.
+        """
+        if self.last_detections is None or len(self.last_detections) == 0:
+            return empty_detections()
+        predicted = self.last_detections[np.arange(len(self.last_detections))]
+        predicted.xyxy = (
+            self.last_detections.xyxy + self.velocity * self.frames_since_inference
+        )
+        return predicted
+
+
+def tile_windows(width, height, tile_size, overlap):
+    """
+    Splits a width x height area into overlapping square tiles (SAHI-style slicing).
+
+    Returns:
+    - windows (list): (x1, y1, x2, y2) tuples covering the whole area.
+    """
+    if tile_size is None or (width <= tile_size and height <= tile_size):
+        return [(0, 0, width, height)]
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        return positions + [length - tile_size]  # Last tile is flush with the edge
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+class VideoWriterWorker:
+    """
+    Encodes video on a dedicated thread so that recording never stalls detection.
+
+    Frames are copied into a ring of preallocated slots; when every slot is still
+    waiting to be encoded the new frame is dropped and counted instead of
+    blocking the caller.
+
+    One worker can encode many files in turn: open() and close() are queued with
+    the frames and run on the encoder thread, so the codec is initialised off
+    the detection thread and the ring and thread are reused by every recording.
+    """
+
+    def __init__(self, path, fourcc, frame_rate, frame_size, slots=32):
+        self.fourcc = fourcc  # Codec of the files
+        self.frame_rate = frame_rate  # Frame rate of the files
+        self.frame_size = frame_size  # Frame size of the files
+        self.writer = None  # cv2.VideoWriter of the open file, owned by the thread
+        self.slot_count = slots  # Capacity of the ring buffer in frames
+        self.slots = None  # Preallocated frame slots, sized by the first frame
+        self.free_slots = queue.Queue()  # Slots that can be filled
+        self.filled_slots = queue.Queue()  # Slots and commands waiting to be run, in order
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.written = 0  # Frames of the current file encoded so far
+        self.dropped = 0  # Frames of the current file dropped because the encoder fell behind
+        self.thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.thread.start()
+        if path is not None:
+            self.open(path)
+
+    @property
+    def backlog(self):
+        return self.filled_slots.qsize()  # Frames waiting to be encoded
+
+    def open(self, path, frame_size=None):
+        """
+        Starts a new file; frames written from now on go into it.
+        """
+        self.dropped = 0
+        self.filled_slots.put(("open", (path, frame_size or self.frame_size)))
+
+    def close(self):
+        """
+        Finishes the current file once its queued frames are encoded.
+
+        Returns:
+        - closed (threading.Event): Set when the file is complete.
+        """
+        closed = threading.Event()
+        self.filled_slots.put(("close", closed))
+        return closed
+
+    def write(self, frame: np.ndarray, block=False) -> bool:
+        """
+        Queues a frame for encoding, without blocking unless block is True.
+
+        Returns:
+        - queued (bool): False if the frame was dropped because the ring is full.
+        """
+        if self.slots is None:
+            self.slots = np.empty((self.slot_count,) + frame.shape, dtype=frame.dtype)
+        try:
+            slot = self.free_slots.get(block=block)  # Wait for the encoder if asked to
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        np.copyto(self.slots[slot], frame)  # The caller may reuse its frame buffer
+        self.filled_slots.put(slot)
+        return True
+
+    def _encode_loop(self):
+        while True:
+            item = self.filled_slots.get()
+            if item is None:  # Released
+                break
+            if isinstance(item, tuple):
+                command, argument = item
+                if self.writer is not None:
+                    self.writer.release()  # Finish the previous file
+                    self.writer = None
+                if command == "open":
+                    path, frame_size = argument
+                    self.writer = cv2.VideoWriter(
+                        path, self.fourcc, self.frame_rate, frame_size
+                    )
+                    self.written = 0
+                else:
+                    argument.set()  # The file is complete
+                continue
+            self.writer.write(self.slots[item])
+            self.written += 1
+            self.free_slots.put(item)
+
+    def release(self):
+        dropped = self.dropped
+        self.close()
+        self.filled_slots.put(None)  # Encode the backlog, then stop
+        self.thread.join()
+        if dropped:
+            print(
+                f"Video writer dropped {dropped} of {self.written + dropped} frames"
+            )
+
+
+class PreEventBuffer:
+    """
+    Keeps the last few seconds of frames as JPEG so that a recording can start
+    with the lead-up to the detection that triggered it.
+
+    Memory is bounded by both age and total compressed size; the oldest frames
+    are evicted first, which keeps the cost predictable on small devices.
+    """
+
+    def __init__(self, seconds=5.0, max_bytes=16 * 1024 * 1024, quality=80):
+        self.seconds = seconds  # How far back the buffer reaches
+        self.max_bytes = max_bytes  # Upper bound on the compressed frames held
+        self.quality = quality  # JPEG quality of the buffered frames
+        self.frames = collections.deque()  # (monotonic time, JPEG bytes), oldest first
+        self.size = 0  # Total bytes currently buffered
+
+    def push(self, frame: np.ndarray, now=None):
+        now = time.monotonic() if now is None else now
+        ok, encoded = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        )
+        if not ok:
+            return
+        data = encoded.tobytes()
+        self.frames.append((now, data))
+        self.size += len(data)
+        while self.frames and (
+            now - self.frames[0][0] > self.seconds or self.size > self.max_bytes
+        ):
+            _, evicted = self.frames.popleft()  # Evict the oldest frame
+            self.size -= len(evicted)
+
+    def drain(self):
+        """
+        Empties the buffer and decodes its frames one at a time, so that only
+        one decoded frame is held in memory.
+
+        Yields:
+        - frame (np.ndarray): The decoded frames, oldest first.
+        """
+        frames, self.frames = self.frames, collections.deque()  # Empty right away
+        self.size = 0
+        while frames:
+            _, data = frames.popleft()  # Free each JPEG once it is decoded
+            yield cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class LiveStream:
+    """
+    Latest annotated frame of a running system for live viewers.
+
+    Publishing only swaps a reference, so the pipeline never waits for viewers.
+    The frame is JPEG-encoded at most once, on the first request for it, and the
+    bytes are shared by every viewer; a viewer that falls behind simply skips to
+    the newest frame. Viewers are counted while connected, so that the system
+    only draws boxes on frames that somebody watches.
+    """
+
+    def __init__(self, quality=80):
+        self.quality = quality  # JPEG quality of the live frames
+        self.condition = threading.Condition()  # Wakes up waiting viewers
+        self.sequence = 0  # Number of frames published so far
+        self.frame = None  # Latest published frame, not yet encoded
+        self.encoded_sequence = 0  # Sequence number of the cached JPEG
+        self.encoded = None  # JPEG bytes of the latest encoded frame
+        self.encode_lock = threading.Lock()  # One viewer encodes, the others reuse it
+        self.viewers = 0  # Connected viewers
+
+    @contextlib.contextmanager
+    def viewing(self):
+        """
+        Counts a viewer for as long as the context is open.
+        """
+        with self.condition:
+            self.viewers += 1
+        try:
+            yield self
+        finally:
+            with self.condition:
+                self.viewers -= 1
+
+    def watched(self):
+        return self.viewers > 0
+
+    def publish(self, frame: np.ndarray):
+        with self.condition:
+            self.frame = frame
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def wait(self, last_sequence=0, timeout=None):
+        """
+        Waits for a frame newer than the one a viewer has already sent.
+
+        Parameters:
+        - last_sequence (int): The sequence number the viewer sent last.
+        - timeout (float): Seconds to wait at most.
+
+        Returns:
+        - (sequence, jpeg) (tuple): The newest frame, or (last_sequence, None) on timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.sequence > last_sequence, timeout
+            ):
+                return last_sequence, None
+            sequence, frame = self.sequence, self.frame
+        with self.encode_lock:
+            if self.encoded_sequence != sequence:
+                ok, encoded = cv2.imencode(
+                    ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+                )
+                if ok:
+                    self.encoded_sequence, self.encoded = sequence, encoded.tobytes()
+            return self.encoded_sequence, self.encoded
+
+
+class SegmentRecorder:
+    """
+    Records a camera continuously into fixed-length segment files using a cheap
+    codec, so that incidents only have to point into the segments instead of
+    opening and encoding their own videos.
+    """
+
+    def __init__(
+        self,
+        directory,
+        frame_rate,
+        segment_duration=60,
+        fourcc="VP80",
+        extension=".webm",
+        camera_name=None,
+    ):
+        self.directory = directory  # Where the segment files are written
+        self.frame_rate = frame_rate  # Frame rate of the segments
+        self.frames_per_segment = int(segment_duration * frame_rate)
+        self.frame_interval = 1 / frame_rate  # Seconds covered by one frame
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)  # VP8 is cheaper than VP9 and plays in browsers
+        self.extension = extension  # Container of the segment files
+        self.camera_name = camera_name  # Distinguishes segments of several cameras
+        self.writer = None  # VideoWriterWorker reused by every segment
+        self.current_file = None  # File name of the current segment
+        self.segment_frames = 0  # Frames written to the current segment
+        self.segment_index = 0  # Running number keeping segment names unique
+
+    def _roll(self, frame_shape):
+        name = f'segment_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+        if self.camera_name:
+            name += f"_{self.camera_name}"
+        self.current_file = f"{name}_{self.segment_index:05d}{self.extension}"
+        self.segment_index += 1
+        frame_size = (frame_shape[1], frame_shape[0])
+        if self.writer is None:
+            self.writer = VideoWriterWorker(
+                None, self.fourcc, self.frame_rate, frame_size
+            )  # Created once; its thread and ring are reused by every segment
+        else:
+            self.writer.close()  # The previous segment is finished on the encoder thread
+        self.writer.open(os.path.join(self.directory, self.current_file), frame_size)
+        self.segment_frames = 0
+
+    def write(self, frame: np.ndarray):
+        if self.writer is None or self.segment_frames >= self.frames_per_segment:
+            self._roll(frame.shape)  # Start the next segment
+        if self.writer.write(frame):
+            self.segment_frames += 1  # Dropped frames are not in the file, so offsets skip them
+
+    def position(self):
+        """
+        Returns:
+        - (file, offset) (tuple): The segment holding the last written frame and
+          that frame's offset into it in seconds.
+        """
+        return self.current_file, max(0, self.segment_frames - 1) / self.frame_rate
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class StreamCopySegmenter:
+    """
+    Segments a camera that already delivers H.264/MJPEG by letting ffmpeg copy
+    the stream into fixed-length files, without decoding or re-encoding it.
+    Offsets are derived from the wall clock, so they are accurate to about one
+    keyframe interval.
+    """
+
+    def __init__(self, source, directory, segment_duration=60, camera_name=None):
+        self.segment_duration = segment_duration  # Target length of each segment
+        self.frame_interval = 0.0  # Offsets are wall-clock based, not per frame
+        self.prefix = f'segment_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+        if camera_name:
+            self.prefix += f"_{camera_name}"
+        self.extension = ".mp4"  # Plays in browsers when the camera sends H.264
+        self.started = time.monotonic()  # When ffmpeg started writing
+        self.process = subprocess.Popen(
+            [
+                shutil.which("ffmpeg"),
+                "-loglevel", "error",
+                "-i", str(source),
+                "-map", "0:v",
+                "-c", "copy",
+                "-f", "segment",
+                "-segment_time", str(segment_duration),
+                "-segment_format", "mp4",
+                "-segment_format_options", "movflags=+faststart",
+                "-reset_timestamps", "1",
+                os.path.join(directory, f"{self.prefix}_%05d{self.extension}"),
+            ],
+            stdin=subprocess.DEVNULL,
+        )
+
+    def write(self, frame: np.ndarray):
+        pass  # ffmpeg reads the camera stream itself
+
+    def position(self):
+        elapsed = time.monotonic() - self.started
+        index = int(elapsed // self.segment_duration)
+        return (
+            f"{self.prefix}_{index:05d}{self.extension}",
+            elapsed - index * self.segment_duration,
+        )
+
+    def release(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class IncidentClip:
+    """
+    Stands in for the video writer of an incident in segment recording mode: it
+    does not encode anything and only records which parts of which segments
+    belong to the incident in metadata["segments"].
+    """
+
+    def __init__(self, recorder, metadata):
+        self.recorder = recorder  # SegmentRecorder or StreamCopySegmenter
+        self.metadata = metadata  # Metadata of the incident
+        self.metadata["segments"] = []  # {"file", "start", "end"} entries in seconds
+
+    def write(self, frame: np.ndarray):
+        segment, offset = self.recorder.position()
+        spans = self.metadata["segments"]
+        end = offset + self.recorder.frame_interval
+        if not spans or spans[-1]["file"] != segment:
+            spans.append({"file": segment, "start": offset, "end": end})
+        else:
+            spans[-1]["end"] = end
+
+    def release(self):
+        pass  # The segments stay open for the next incident
+
+
+class TrackStore:
+    """
+    Columnar store of every tracked box of a recording, kept in NumPy arrays
+    that grow in chunks instead of one Python dict per box and frame.
+    """
+
+    def __init__(self, chunk_size=4096):
+        self.chunk_size = chunk_size  # Rows added whenever the arrays are full
+        self.size = 0  # Rows in use
+        self.started = time.monotonic()  # Reference for the timestamps
+        self.columns = {
+            "frame_index": np.empty(chunk_size, dtype=np.int32),
+            "tracker_id": np.empty(chunk_size, dtype=np.int32),
+            "class_id": np.empty(chunk_size, dtype=np.int16),
+            "xyxy": np.empty((chunk_size, 4), dtype=np.float32),
+            "timestamp": np.empty(chunk_size, dtype=np.float64),  # Monotonic seconds
+            "displacement": np.empty((chunk_size, 2), dtype=np.float32),  # Centre shift in pixels
+            "velocity": np.empty((chunk_size, 2), dtype=np.float32),  # Pixels per second
+            "direction": np.empty(chunk_size, dtype=np.int8),  # -1 left, 0 stationary, 1 right
+        }
+        # Last known centre and time of every tracker ID, sorted by ID for searchsorted
+        self.known_ids = np.empty(0, dtype=np.int32)
+        self.known_centers = np.empty((0, 2), dtype=np.float32)
+        self.known_times = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, rows):
+        capacity = len(self.columns["frame_index"])
+        if self.size + rows <= capacity:
+            return
+        chunks = math.ceil((self.size + rows - capacity) / self.chunk_size)
+        for name, column in self.columns.items():
+            grown = np.empty(
+                (capacity + chunks * self.chunk_size,) + column.shape[1:],
+                dtype=column.dtype,
+            )
+            grown[: self.size] = column[: self.size]
+            self.columns[name] = grown
+
+    def append(self, frame_index, timestamp, tracker_id, class_id, xyxy):
+        """
+        Appends all boxes of one frame.
+
+        Parameters:
+        - frame_index (int): Index of the frame in the recording.
+        - timestamp (float): time.monotonic() of the frame.
+        - tracker_id, class_id (np.ndarray): One entry per box.
+        - xyxy (np.ndarray): Box coordinates, shape (boxes, 4).
+        """
+        rows = len(tracker_id)
+        if not rows:
+            return
+        tracker_id = np.asarray(tracker_id, dtype=np.int32)
+        displacement, velocity = self._motion(tracker_id, xyxy, timestamp)
+        self._reserve(rows)
+        end = self.size + rows
+        self.columns["frame_index"][self.size : end] = frame_index
+        self.columns["tracker_id"][self.size : end] = tracker_id
+        self.columns["class_id"][self.size : end] = class_id
+        self.columns["xyxy"][self.size : end] = xyxy
+        self.columns["timestamp"][self.size : end] = timestamp
+        self.columns["displacement"][self.size : end] = displacement
+        self.columns["velocity"][self.size : end] = velocity
+        self.columns["direction"][self.size : end] = np.sign(displacement[:, 0])
+        self.size = end
+
+    def _motion(self, tracker_id, xyxy, timestamp):
+        """
+        Compares the boxes of a frame with the last known position of the same
+        tracker IDs, for all boxes at once.
+
+        Returns:
+        - displacement (np.ndarray): Centre shift in pixels, zero for new IDs.
+        - velocity (np.ndarray): Centre shift per second, zero for new IDs.
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32)
+        centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+        positions = np.searchsorted(self.known_ids, tracker_id)
+        clipped = np.minimum(positions, max(len(self.known_ids) - 1, 0))
+        found = (positions < len(self.known_ids)) & (
+            self.known_ids[clipped] == tracker_id if len(self.known_ids) else False
+        )
+
+        displacement = np.zeros_like(centers)
+        velocity = np.zeros_like(centers)
+        known = positions[found]
+        displacement[found] = centers[found] - self.known_centers[known]
+        elapsed = timestamp - self.known_times[known]
+        moving = elapsed > 0
+        velocity[np.flatnonzero(found)[moving]] = (
+            displacement[found][moving] / elapsed[moving, None]
+        )
+
+        # Remember this frame's positions: update known IDs, then merge in new ones
+        self.known_centers[known] = centers[found]
+        self.known_times[known] = timestamp
+        if not found.all():
+            new = ~found
+            ids = np.concatenate([self.known_ids, tracker_id[new]])
+            order = np.argsort(ids, kind="stable")
+            self.known_ids = ids[order]
+            self.known_centers = np.concatenate([self.known_centers, centers[new]])[order]
+            self.known_times = np.concatenate(
+                [self.known_times, np.full(new.sum(), timestamp)]
+            )[order]
+        return displacement, velocity
+
+    def arrays(self):
+        """
+        Returns:
+        - arrays (dict): The used part of every column.
+        """
+        return {name: column[: self.size] for name, column in self.columns.items()}
+
+    def save(self, path):
+        arrays = self.arrays()
+        arrays["timestamp"] = arrays["timestamp"] - self.started  # Seconds into the recording
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)  # Uncompressed, so writing is a plain memory copy
+
+    def summary(self, class_names, start_time):
+        """
+        Builds the compact per-object view used by the gallery.
+
+        Parameters:
+        - class_names (dict): Class id to name, e.g. model.names.
+        - start_time (datetime.datetime): Wall-clock start of the recording.
+
+        Returns:
+        - detections (dict): Per tracker ID: class, first/last sighting and box,
+          number of frames and overall movement direction.
+        """
+        arrays = self.arrays()
+        if not self.size:
+            return {}
+        tracker_ids, first_rows, counts = np.unique(
+            arrays["tracker_id"], return_index=True, return_counts=True
+        )
+        _, reversed_rows = np.unique(arrays["tracker_id"][::-1], return_index=True)
+        last_rows = self.size - 1 - reversed_rows  # Last row of every tracker ID
+        x_shift = arrays["xyxy"][last_rows, 0] - arrays["xyxy"][first_rows, 0]
+        seconds = arrays["timestamp"] - self.started
+
+        def wall_clock(offset):
+            return (start_time + datetime.timedelta(seconds=float(offset))).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+
+        detections = {}
+        for index, tracker_id in enumerate(tracker_ids.tolist()):
+            first, last = first_rows[index], last_rows[index]
+            class_id = int(arrays["class_id"][first])
+            detections[tracker_id] = {
+                "class_id": class_id,
+                "class_name": class_names[class_id],
+                "first_seen": wall_clock(seconds[first]),
+                "last_seen": wall_clock(seconds[last]),
+                "frames": int(counts[index]),
+                "first_bbox": arrays["xyxy"][first].round(1).tolist(),
+                "last_bbox": arrays["xyxy"][last].round(1).tolist(),
+                "movement_direction": (
+                    "right"
+                    if x_shift[index] > 0
+                    else "left" if x_shift[index] < 0 else "stationary"
+                ),
+            }
+        return detections
+
+
+class MetadataWriter:
+    """
+    Appends the metadata of a recording to a JSON Lines file while it is being
+    recorded: a header line, one line per frame and a footer with the summary.
+
+    The detection thread only appends to the file's buffer. The finalizer
+    thread calls sync() every flush interval, so a crash loses at most about one
+    interval and fsync never stalls detection. The file is locked while it is
+    open, so that recover_metadata() in other processes leaves it alone.
+    """
+
+    def __init__(self, path, header, flush_interval=1.0):
+        self.file = open(path, "w")  # Append-only JSON Lines file
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)  # Released on close, or when the process dies
+        self.lock = threading.Lock()  # Guards the file between the detection and finalizer threads
+        self.flush_interval = flush_interval  # Seconds between flushes to disk
+        self.last_flush = time.monotonic()
+        self.write(dict(header, type="header"))
+        self.file.flush()  # Make the recording discoverable right away
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def due(self):
+        return time.monotonic() - self.last_flush >= self.flush_interval
+
+    def sync(self):
+        """
+        Writes the buffered lines to disk, so that they survive a crash or power loss.
+        """
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            fd = os.dup(self.file.fileno())  # Stays valid if the file is closed meanwhile
+        try:
+            os.fsync(fd)  # Without holding the lock, so writes do not wait for the disk
+        finally:
+            os.close(fd)
+        self.last_flush = time.monotonic()
+
+    def close(self, footer):
+        self.write(dict(footer, type="footer"))
+        self.sync()
+        with self.lock:
+            self.file.close()
+
+
+def in_use(path, stale_after):
+    """
+    Returns:
+    - in_use (bool): Whether a recorder, maybe in another process, still writes
+      the track file: it holds the file's lock, or, where files cannot be
+      locked, it changed the file within stale_after seconds.
+    """
+    if fcntl is None:
+        return time.time() - os.path.getmtime(path) < stale_after
+    with open(path) as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    return False
+
+
+def recover_metadata(
+    video_directory, incident_index=None, camera_name=None, stale_after=10.0
+):
+    """
+    Rebuilds the metadata file of recordings that were interrupted before their
+    metadata was written, from their JSON Lines track. Only the camera's own
+    recordings are recovered, and only once nobody writes them any more.
+
+    Parameters:
+    - video_directory (str): The directory holding the recordings.
+    - incident_index (IncidentIndex): Also index the recovered recordings.
+    - camera_name (str): The camera whose recordings are recovered.
+    - stale_after (float): Seconds without changes after which a track file
+      counts as abandoned, where files cannot be locked.
+
+    Returns:
+    - recovered (list): The file names of the recovered recordings.
+    """
+    recovered = []
+    for name in os.listdir(video_directory):
+        if not name.endswith(".tracks.jsonl"):
+            continue
+        video_file = name[: -len(".tracks.jsonl")]
+        metadata_file = os.path.join(video_directory, f"{video_file}.json")
+        tracks_file = os.path.join(video_directory, name)
+        if os.path.exists(metadata_file) or in_use(tracks_file, stale_after):
+            continue
+        records = []
+        with open(tracks_file) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Partially written last line
+        if not records or records[0].get("type") != "header":
+            continue
+        header = records[0]
+        if header.get("camera_name") != camera_name:
+            continue  # Another camera recovers its own recordings
+        metadata = {
+            key: value
+            for key, value in header.items()
+            if key not in ("type", "class_names", "camera_name")
+        }
+        if records[-1].get("type") == "footer":
+            metadata.update(records[-1])  # Only the metadata file itself was lost
+            metadata.pop("type")
+        else:
+            frames = [record for record in records if "t" in record]
+            start_time = datetime.datetime.strptime(
+                header["start_time"], "%Y-%m-%d %H:%M:%S"
+            )
+            duration = frames[-1]["t"] if frames else 0
+            store = TrackStore()
+            for index, frame in enumerate(frames):
+                boxes = np.array(frame["boxes"], dtype=np.float32).reshape(-1, 6)
+                store.append(
+                    index, store.started + frame["t"], boxes[:, 4], boxes[:, 5], boxes[:, :4]
+                )
+            class_names = {
+                int(class_id): class_name
+                for class_id, class_name in header["class_names"].items()
+            }
+            metadata["end_time"] = (
+                start_time + datetime.timedelta(seconds=duration)
+            ).strftime("%Y-%m-%d %H:%M:%S")
+            metadata["total_duration"] = duration
+            metadata["detections"] = store.summary(class_names, start_time)
+            metadata["recovered"] = True  # Written after an interruption
+        with open(metadata_file, "w") as f:
+            json.dump(metadata, f, indent=4)
+        if incident_index is not None:
+            incident_index.add(metadata)
+        recovered.append(video_file)
+    return recovered
+
+
 class SurveillanceSystem:
-    def __init__(self, bot_token=None, chat_id=None, environment="development"):
-        self.model = YOLO(
-            "yolov8n.pt"
-        )  # Load the YOLO model with the specified weights
+    def __init__(
+        self,
+        bot_token=None,
+        chat_id=None,
+        environment="development",
+        pipelined=None,
+        queue_size=2,
+        source=0,
+        model=None,
+        camera_name=None,
+        motion_gate=None,
+        heartbeat_interval=2.0,
+        target_fps=None,
+        roi_polygons=None,
+        tile_size=None,
+        tile_overlap=0.2,
+        backend=None,
+        async_writer=True,
+        pre_event_seconds=None,
+        pre_event_max_bytes=None,
+        recording_mode=None,
+        segment_duration=60,
+        record_raw=None,
+        incident_index=None,
+        headless=None,
+        thumbnails=None,
+        notifier=None,
+        alert_policy=None,
+        frame_bus=None,
+        video_directory=None,
+    ):
+        self.model = model or load_model(
+            "yolov8n.pt", backend or os.getenv("INFERENCE_BACKEND", "torch")
+        )  # Load the YOLO model with the specified weights, unless one is shared
         self.tracker = sv.ByteTrack()  # Initialize the ByteTrack tracker
         self.box_annotator = (
             sv.BoxAnnotator()
@@ -35,20 +1002,123 @@ class SurveillanceSystem:
         )  # Telegram bot token
         self.chat_id = chat_id or os.getenv("TELEGRAM_CHAT_ID")  # Telegram chat ID
         self.environment = environment or os.getenv("ENVIRONMENT")  # Environment
-        self.camera = cv2.VideoCapture(0)  # Open the default camera
+        self.camera_name = camera_name  # Distinguishes recordings of several cameras
+        self.camera = cv2.VideoCapture(
+            parse_source(source)
+        )  # Open the camera (the default camera unless a source is given)
         self.is_recording = False  # Initialize recording state
         self.start_time = 0  # Initialize start time
-        self.record_duration = 20  # Set recording duration to 20 seconds
+        self.record_duration = float(
+            os.getenv("MAX_RECORDING_SECONDS", "300")
+        )  # Longer incidents continue in a new file
+        self.recording_grace = float(
+            os.getenv("RECORDING_GRACE_SECONDS", "3")
+        )  # Keep recording this long after the policy ends the incident (after its stop_frames), in case it resumes
+        self.grace_frames = 0  # Frames recorded since the incident ended
+        self.last_recording_name = None  # Name of the last recording, without suffix
+        self.recording_suffix = 0  # Recordings started within the same second
         self.video_directory = (
-            "static/recorded_videos"  # Directory path for recorded videos
-        )
+            video_directory or "static/recorded_videos"
+        )  # Directory path for recorded videos
         self.fourcc = cv2.VideoWriter_fourcc(
             *"VP90"
         )  # Define the codec for WebM format
-        self.out = None  # Initialize the VideoWriter object
+        self.out = None  # Writer of the current recording
+        self.video_writer = None  # Encoder thread reused by every recording
+        self.finished_recordings = queue.Queue()  # Recordings waiting to be finalised
+        self.finalizer = None  # Thread finalising recordings one at a time
+        self.metadata_sync_interval = 1.0  # Seconds between fsyncs of the metadata being recorded
         self.metadata = {}  # Initialize metadata dictionary
+        self.track_store = TrackStore()  # Tracked boxes of the current recording
         self.frame_count = 0  # Initialize frame counter
         self.frame_rate = 20.0  # Frame rate of the video
+        self.async_writer = async_writer  # Encode on a writer thread instead of inline
+        pre_event_seconds = pre_event_seconds or float(
+            os.getenv("PRE_EVENT_SECONDS", "0")
+        )
+        pre_event_max_bytes = pre_event_max_bytes or int(
+            float(os.getenv("PRE_EVENT_MAX_MB", "16")) * 1024 * 1024
+        )
+        self.pre_event_buffer = (
+            PreEventBuffer(pre_event_seconds, pre_event_max_bytes)
+            if pre_event_seconds
+            else None
+        )  # Frames from before a detection, flushed into each new recording
+        self.recording_mode = recording_mode or os.getenv(
+            "RECORDING_MODE", "incident"
+        )  # "incident" encodes one video per incident, "segment" records continuously
+        self.segment_recorder = None  # Continuous recorder in segment mode
+        self.record_raw = (
+            record_raw
+            if record_raw is not None
+            else os.getenv("RECORD_RAW", "0") == "1"
+        )  # Record unannotated frames plus a detection track drawn by the gallery
+        self.metadata_writer = None  # Incremental metadata of the current recording
+        self.event_listeners = []  # Callables notified as listener(event, data)
+        self.headless = (
+            headless if headless is not None else os.getenv("HEADLESS", "0") == "1"
+        )  # Never open an OpenCV window, e.g. on servers without a display
+        self.live_stream = LiveStream()  # Latest processed frame for the web dashboard
+        self.thumbnails = thumbnails  # Poster and preview cache filled when a video is finished
+        self.stop_requested = threading.Event()  # Set by stop() to end run()
+        self.frame_bus = frame_bus  # Shares processed frames with other processes
+        if self.recording_mode == "segment":
+            if (
+                isinstance(source, str)
+                and "://" in source
+                and shutil.which("ffmpeg")
+            ):
+                self.segment_recorder = StreamCopySegmenter(
+                    source, self.video_directory, segment_duration, camera_name
+                )  # Copy the camera's own H.264/MJPEG stream
+            else:
+                self.segment_recorder = SegmentRecorder(
+                    self.video_directory,
+                    self.frame_rate,
+                    segment_duration,
+                    camera_name=camera_name,
+                )
+            self.pre_event_buffer = None  # The segments already hold the lead-up
+        self.pipelined = (
+            pipelined
+            if pipelined is not None
+            else os.getenv("PIPELINED", "0") == "1"
+        )  # Run capture, inference, encoding and display as separate stages
+        self.queue_size = queue_size  # Capacity of each queue between stages
+        self.dropped_captures = 0  # Captured frames never detected, pipelined mode (capture thread only)
+        self.dropped_displays = 0  # Processed frames never shown, pipelined mode (encode thread only)
+        if motion_gate is None:
+            motion_gate = os.getenv("MOTION_GATE", "0") == "1"
+        self.motion_gate = (
+            MotionGate() if motion_gate is True else motion_gate or None
+        )  # Skip detection while the scene is still (disabled by default)
+        self.heartbeat_interval = heartbeat_interval  # Seconds between detections while idle
+        self.last_inference_time = 0.0  # Monotonic time of the last model call
+        self.skipped_inferences = 0  # Frames on which the motion gate skipped detection
+        target_fps = target_fps or float(os.getenv("TARGET_FPS", "0"))
+        self.frame_skip = (
+            FrameSkipScheduler(target_fps) if target_fps else None
+        )  # Detect only every k-th frame when the host cannot keep up
+        self.poll_interval = 0.005  # Seconds to wait for a new frame from the frame reader
+        if roi_polygons is None and os.getenv("ROI_POLYGONS"):
+            roi_polygons = json.loads(
+                os.getenv("ROI_POLYGONS")
+            )  # e.g. [[[0, 200], [640, 200], [640, 480], [0, 480]]]
+        self.roi_polygons = [
+            np.asarray(polygon, dtype=np.int32) for polygon in roi_polygons or []
+        ]  # Regions of the frame that are watched (the whole frame if empty)
+        self.roi_mask = None  # Filled polygon mask, built for the first frame size
+        self.tile_size = tile_size or int(
+            os.getenv("TILE_SIZE", "0")
+        ) or None  # Slice large crops into tiles of this size before inference
+        self.tile_overlap = tile_overlap  # Fraction by which neighbouring tiles overlap
+        self.alert_policy = alert_policy or AlertPolicy(
+            zones=self.roi_polygons
+        )  # Decides when incidents start and stop and what is worth an alert
+        if self.frame_skip is not None:
+            self.camera.set(
+                cv2.CAP_PROP_BUFFERSIZE, 1
+            )  # Do not let the driver queue up stale frames
 
         # print(self.bot_token, self.chat_id)
 
@@ -56,25 +1126,130 @@ class SurveillanceSystem:
             os.makedirs(
                 self.video_directory
             )  # Create the directory if it doesn't exist
+        self.incident_index = (
+            incident_index or IncidentIndex()
+        )  # Finished recordings are listed here for the gallery
+        for video_file in recover_metadata(
+            self.video_directory, self.incident_index, self.camera_name
+        ):
+            print(f"Recovered metadata of interrupted recording {video_file}")
 
         if not self.bot_token or not self.chat_id:
             raise ValueError(
                 "Please set the TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID environment variables."
             )
+        self.notifier = notifier or NotificationDispatcher(
+            self.bot_token, self.chat_id
+        )  # Shared by all cameras of a MultiCameraSurveillanceSystem
 
-    def callback(self, frame: np.ndarray) -> tuple:
-        results = self.model(frame)[
-            0
-        ]  # Run the YOLO model on the frame and get the results
-        detections = sv.Detections.from_ultralytics(
-            results
-        )  # Convert results to Detections object
+    def should_run_inference(self, frame: np.ndarray) -> bool:
+        """
+        Decides whether the detector has to run on a frame.
+
+        Without a motion gate every frame is detected. With one, detection runs at
+        full rate while recording or while the scene moves, and otherwise only
+        once per heartbeat interval.
+        """
+        if self.motion_gate is None:
+            return True
+        motion = self.motion_gate.has_motion(frame)  # Keep the background model current
+        heartbeat_due = (
+            time.monotonic() - self.last_inference_time >= self.heartbeat_interval
+        )
+        if motion or self.is_recording or heartbeat_due:
+            return True
+        self.skipped_inferences += 1
+        return False
+
+    def cheap_detections(self, frame: np.ndarray):
+        """
+        Returns detections for a frame that does not need the detector, or None
+        when the detector has to run.
+        """
+        if not self.should_run_inference(frame):
+            return empty_detections()  # Nothing changed, skip the detector
+        if self.frame_skip is not None and not self.frame_skip.should_infer():
+            return self.frame_skip.carry_forward()  # Skipped frame, move boxes on
+        return None
+
+    def preprocess(self, frame: np.ndarray) -> tuple:
+        """
+        Cuts the model inputs out of a frame: the bounding crop of the regions of
+        interest, sliced into tiles when a tile size is configured.
+
+        Returns:
+        - images (list): The crops to run the model on.
+        - offsets (list): The (x, y) position of each crop in the full frame.
+        """
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = 0, 0, width, height
+        if self.roi_polygons:
+            x, y, w, h = cv2.boundingRect(np.concatenate(self.roi_polygons))
+            x1, y1 = max(0, x), max(0, y)
+            x2, y2 = min(width, x + w), min(height, y + h)
+        windows = tile_windows(x2 - x1, y2 - y1, self.tile_size, self.tile_overlap)
+        images = [
+            frame[y1 + top : y1 + bottom, x1 + left : x1 + right]
+            for left, top, right, bottom in windows
+        ]
+        offsets = [(x1 + left, y1 + top) for left, top, _, _ in windows]
+        return images, offsets
+
+    def merge_results(self, results, offsets, frame_shape) -> sv.Detections:
+        """
+        Maps the results of every crop back to full-frame coordinates, removes
+        duplicates from overlapping tiles and drops boxes outside the regions of
+        interest.
+        """
+        parts = []
+        for result, (offset_x, offset_y) in zip(results, offsets):
+            detections = sv.Detections.from_ultralytics(
+                result
+            )  # Convert results to Detections object
+            detections.xyxy = detections.xyxy + np.array(
+                [offset_x, offset_y, offset_x, offset_y], dtype=detections.xyxy.dtype
+            )  # Shift crop coordinates into the full frame
+            parts.append(detections)
+        detections = sv.Detections.merge(parts) if len(parts) > 1 else parts[0]
+        if len(parts) > 1 and len(detections):
+            detections = detections.with_nms(threshold=0.5)  # Objects seen by two tiles
+        if self.roi_polygons and len(detections):
+            if self.roi_mask is None or self.roi_mask.shape != frame_shape[:2]:
+                self.roi_mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+                cv2.fillPoly(self.roi_mask, self.roi_polygons, 1)
+            centers = detections.get_anchors_coordinates(sv.Position.CENTER).astype(int)
+            centers[:, 0] = centers[:, 0].clip(0, frame_shape[1] - 1)
+            centers[:, 1] = centers[:, 1].clip(0, frame_shape[0] - 1)
+            detections = detections[
+                self.roi_mask[centers[:, 1], centers[:, 0]].astype(bool)
+            ]  # Keep objects whose centre lies inside a region of interest
+        return detections
+
+    def detect(self, frame: np.ndarray) -> sv.Detections:
+        detections = self.cheap_detections(frame)
+        if detections is not None:
+            return detections
+        images, offsets = self.preprocess(frame)  # Crop to the regions of interest
+        started = time.monotonic()
+        results = self.model(
+            images
+        )  # Run the YOLO model on the crops and get the results
+        if self.frame_skip is not None:
+            self.frame_skip.record_inference_time(time.monotonic() - started)
+        return self.track(self.merge_results(results, offsets, frame.shape))
+
+    def track(self, detections: sv.Detections) -> sv.Detections:
+        self.last_inference_time = time.monotonic()
         detections = self.tracker.update_with_detections(
             detections
         )  # Update tracker with detections
+        if self.frame_skip is not None:
+            self.frame_skip.update(detections)  # Remember boxes for skipped frames
+        return detections
 
+    def annotate(self, frame: np.ndarray, detections: sv.Detections) -> np.ndarray:
         labels = [
-            f"#{tracker_id} {results.names[class_id]}"
+            f"#{tracker_id} {self.model.names[class_id]}"
             for class_id, tracker_id in zip(detections.class_id, detections.tracker_id)
         ]  # Create labels for each detection
 
@@ -84,23 +1259,16 @@ class SurveillanceSystem:
         annotated_frame = self.label_annotator.annotate(
             annotated_frame, detections=detections, labels=labels
         )  # Annotate frame with labels
+        return annotated_frame
+
+    def callback(self, frame: np.ndarray) -> tuple:
+        detections = self.detect(frame)  # Run detection and tracking
+        annotated_frame = self.annotate(frame, detections)  # Draw the detections
         return detections, annotated_frame  # Return detections and processed frame
 
     def send_telegram_message(self, message):
         try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
-            payload = {"chat_id": self.chat_id, "text": message}
-            headers = {"Content-Type": "application/json"}
-            conn = http.client.HTTPSConnection("api.telegram.org")
-            conn.request("POST", url, body=json.dumps(payload), headers=headers)
-            response = conn.getresponse()
-            response_data = response.read().decode("utf-8")
-            conn.close()
-
-            if response.status != 200:
-                raise ValueError(f"Failed to send message: {response.status}")
-
-            return json.loads(response_data)
+            return self.notifier.send_message(message)  # Reuses the open connection
         except Exception as e:
             print(f"Error sending message: {e}")
 
@@ -110,213 +1278,681 @@ class SurveillanceSystem:
 
         Parameters:
         - frame (np.ndarray): The processed frame to send.
-        - filename (str): The filename to save the frame as.
+        - filename (str): The filename shown in the chat.
 
         Returns:
         - response (dict): The response from the Telegram API.
         """
         try:
-            # Convert frame to image and save
-            cv2.imwrite(filename, frame)
-
-            # Prepare the multipart/form-data payload
-            boundary = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
-            payload = (
-                f"--{boundary}\r\n"
-                f'Content-Disposition: form-data; name="chat_id"\r\n\r\n{self.chat_id}\r\n'
-                f"--{boundary}\r\n"
-                f'Content-Disposition: form-data; name="photo"; filename="{filename}"\r\n'
-                f"Content-Type: {mimetypes.guess_type(filename)[0]}\r\n\r\n"
-            )
-
-            with open(filename, "rb") as f:
-                file_data = f.read()
-
-            payload += file_data.decode("latin1")
-            payload += f"\r\n--{boundary}--\r\n"
-
-            headers = {
-                "Content-Type": f"multipart/form-data; boundary={boundary}",
-                "Content-Length": str(len(payload)),
-            }
-
-            # Send the image to Telegram
-            conn = http.client.HTTPSConnection("api.telegram.org")
-            conn.request(
-                "POST", f"/bot{self.bot_token}/sendPhoto", body=payload, headers=headers
-            )
-            response = conn.getresponse()
-            response_data = response.read().decode("utf-8")
-            conn.close()
-
-            if response.status != 200:
-                raise ValueError(f"Failed to send frame: {response.status}")
-
-            return json.loads(response_data)
+            return self.notifier.send_photo(frame, filename)
         except Exception as e:
             print(f"Error sending frame: {e}")
 
     def run_telegram_tasks_in_thread(self, message, processed_frame):
-        def task():
-            self.send_telegram_message(message)
-            self.send_telegram_frame(processed_frame)
+        self.notifier.notify(message, processed_frame)  # Sent by the dispatcher thread
 
-        executor = concurrent.futures.ThreadPoolExecutor()
-        executor.submit(task)
-    def write_metadata_to_file(self):
+    def current_recording(self):
+        """
+        Returns:
+        - recording (dict): The state of the current recording, which is
+          finalised as a unit while a new recording may already be running.
+        """
+        return {
+            "out": self.out,
+            "metadata": self.metadata,
+            "track_store": self.track_store,
+            "metadata_writer": self.metadata_writer,
+            "frame_count": self.frame_count,
+            "start_time": self.start_time,
+            "dropped_frames": getattr(self.out, "dropped", 0),
+        }
+
+    def write_metadata_to_file(self, recording=None):
         """
         Writes metadata to a file.
+
+        Parameters:
+        - recording (dict): The recording to finish (the current one if None).
         """
-        self.metadata["end_time"] = datetime.datetime.now().strftime(
+        recording = recording or self.current_recording()
+        metadata = recording["metadata"]
+        metadata["end_time"] = datetime.datetime.now().strftime(
             "%Y-%m-%d %H:%M:%S"
         )
-        self.metadata["total_duration"] = min(
-            (self.frame_count / self.frame_rate), self.record_duration
+        metadata["total_duration"] = min(
+            (recording["frame_count"] / self.frame_rate), self.record_duration
         )
+        metadata["detections"] = recording["track_store"].summary(
+            self.model.names, recording["start_time"]
+        )  # Compact per-object view for the gallery
+        recording["track_store"].save(
+            os.path.join(self.video_directory, metadata["tracks_npz"])
+        )  # Full-resolution tracks in a binary file
         metadata_file = os.path.join(
-            self.video_directory, f'{self.metadata["file_name"]}.json'
+            self.video_directory, f'{metadata["file_name"]}.json'
         )
         with open(metadata_file, "w") as f:
-            json.dump(self.metadata, f, indent=4)
+            json.dump(metadata, f, indent=4)
+        if recording["metadata_writer"] is not None:
+            recording["metadata_writer"].close(
+                metadata
+            )  # Footer with the summary; unlocked only once the metadata file exists
+            if recording["metadata_writer"] is self.metadata_writer:
+                self.metadata_writer = None
+        try:
+            self.incident_index.add(metadata)  # Make it visible to the gallery
+        except Exception as e:
+            print(f"Error indexing recording: {e}")
+        self.emit("recording_finished", {"file_name": metadata["file_name"]})
 
-    def release_video(self):
-        self.out.release()  # Release the VideoWriter object
-        self.write_metadata_to_file()  # Write metadata to a file
+    def emit(self, event, data):
+        """
+        Notifies the event listeners (e.g. the web dashboard) about a recording event.
+        """
+        for listener in self.event_listeners:
+            try:
+                listener(event, data)
+            except Exception as e:
+                print(f"Error notifying {event} listener: {e}")
+
+    def release_video(self, recording=None, closed=None):
+        """
+        Finishes a recording: completes its video, thumbnails and metadata.
+
+        Parameters:
+        - recording (dict): The recording to finish (the current one if None).
+        - closed (threading.Event): Set by the shared encoder once the video is
+          complete, if finish_recording() already queued the close.
+        """
+        recording = recording or self.current_recording()
+        out, metadata = recording["out"], recording["metadata"]
+        if isinstance(out, VideoWriterWorker):
+            (closed or out.close()).wait()  # The encoder stays open for the next recording
+            metadata["dropped_frames"] = recording["dropped_frames"]  # Report encoder overload
+        else:
+            out.release()  # Release the VideoWriter object
+        if self.thumbnails is not None and self.segment_recorder is None:
+            file_name = metadata["file_name"]
+            try:
+                self.thumbnails.get(
+                    file_name, os.path.join(self.video_directory, file_name)
+                )  # Ready before the gallery hears about the recording
+            except Exception as e:
+                print(f"Error creating thumbnails: {e}")
+        self.write_metadata_to_file(recording)  # Write metadata to a file
+
+    def finish_recording(self):
+        """
+        Stops the current recording and hands it to the finalizer thread. The
+        recording's state is detached first, so that a recording started right
+        away never shares a writer, metadata or track store with it.
+        """
+        self.is_recording = False  # Stop recording
+        recording = self.current_recording()
+        closed = (
+            self.out.close() if isinstance(self.out, VideoWriterWorker) else None
+        )  # Queued before the next recording's frames
+        self.out = None
+        self.metadata = {}
+        self.metadata_writer = None
+        self.track_store = TrackStore()
+        self.start_finalizer()
+        self.finished_recordings.put((recording, closed))
+
+    def start_finalizer(self):
+        if self.finalizer is None:
+            self.finalizer = threading.Thread(
+                target=self.finalize_recordings, daemon=True
+            )  # Joined by shutdown()
+            self.finalizer.start()
+
+    def finalize_recordings(self):
+        """
+        Finishes recordings one at a time and, in between, writes the metadata
+        of the current recording to disk every metadata_sync_interval.
+        """
+        while True:
+            try:
+                item = self.finished_recordings.get(
+                    timeout=self.metadata_sync_interval
+                )
+            except queue.Empty:
+                item = ()  # Only time to sync
+            writer = self.metadata_writer  # Swapped by the detection thread
+            if writer is not None and writer.due():
+                try:
+                    writer.sync()
+                except Exception as e:
+                    print(f"Error syncing metadata: {e}")
+            if item is None:  # Shutting down
+                return
+            if not item:
+                continue
+            try:
+                self.release_video(*item)
+            except Exception as e:
+                print(f"Error finishing recording: {e}")
+
+    def begin_recording(self, continued_from=None):
+        """
+        Starts a recording, either for a new incident (with the pre-event
+        lead-up) or as the continuation of one that reached the maximum length.
+        """
+        self.is_recording = True  # Start recording
+        self.start_time = datetime.datetime.now()  # Record the start time
+        self.start_new_recording()  # Start a new recording with a new timestamp
+        self.frame_count = 0  # Reset frame counter
+        self.grace_frames = 0
+        if continued_from is not None:
+            self.metadata["continued_from"] = continued_from  # Rollover of a long incident
+        else:
+            self.flush_pre_event_buffer()  # Start the video with the lead-up
 
     def start_new_recording(self):
-        output_file = f'output_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.webm'  # Output file name
+        prefix = "incident" if self.segment_recorder is not None else "output"
+        output_file = f'{prefix}_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+        if self.camera_name:
+            output_file += f"_{self.camera_name}"  # Keep cameras from overwriting each other
+        if output_file == self.last_recording_name:
+            self.recording_suffix += 1  # Several recordings started within one second
+        else:
+            self.last_recording_name, self.recording_suffix = output_file, 0
+        if self.recording_suffix:
+            output_file += f"_{self.recording_suffix}"
+        if self.segment_recorder is None:
+            output_file += ".webm"  # Output file name
+        self.metadata = {}  # The previous recording's metadata belongs to the finalizer
         self.metadata["file_name"] = output_file  # Add file name to metadata
-        self.metadata["detections"] = {}  # Initialize detections dictionary in metadata
+        self.metadata["detections"] = {}  # Filled from the track store when the recording ends
+        self.metadata["tracks_npz"] = f"{output_file}.tracks.npz"  # Every tracked box
+        self.track_store = TrackStore()  # Start an empty track store
         self.metadata["start_time"] = datetime.datetime.now().strftime(
             "%Y-%m-%d %H:%M:%S"
         )  # Add start time to metadata
-        self.out = cv2.VideoWriter(
-            os.path.join(self.video_directory, output_file),
-            self.fourcc,
-            self.frame_rate,
-            (int(self.camera.get(3)), int(self.camera.get(4))),
-        )  # Create VideoWriter object
+        self.metadata["raw"] = self.record_raw  # Boxes are drawn by the gallery
+        self.metadata["tracks_file"] = f"{output_file}.tracks.jsonl"
+        self.metadata_writer = MetadataWriter(
+            os.path.join(self.video_directory, self.metadata["tracks_file"]),
+            {
+                "file_name": output_file,
+                "start_time": self.metadata["start_time"],
+                "raw": self.record_raw,
+                "camera_name": self.camera_name,
+                "class_names": self.model.names,
+            },
+            self.metadata_sync_interval,
+        )  # Header line, also carrying the labels used by the overlay
+        self.start_finalizer()  # Syncs the metadata to disk
+        self.emit("recording_started", {"file_name": output_file})
+        if self.segment_recorder is not None:
+            self.out = IncidentClip(
+                self.segment_recorder, self.metadata
+            )  # Index into the running segments instead of encoding
+            return
+        path = os.path.join(self.video_directory, output_file)
+        frame_size = (int(self.camera.get(3)), int(self.camera.get(4)))
+        if not self.async_writer:
+            self.out = cv2.VideoWriter(
+                path, self.fourcc, self.frame_rate, frame_size
+            )  # Create VideoWriter object
+            return
+        if self.video_writer is None:
+            self.video_writer = VideoWriterWorker(
+                None, self.fourcc, self.frame_rate, frame_size
+            )  # Created once and reused by every recording
+        self.video_writer.open(path, frame_size)
+        self.out = self.video_writer
 
     def process_frame(self, frame):
-        detected_objects, processed_frame = self.callback(
-            frame
-        )  # Process the frame using the callback function
-        if len(detected_objects) > 0:
-            if not self.is_recording:
-                self.is_recording = True  # Start recording
-                self.start_time = datetime.datetime.now()  # Record the start time
-                self.start_new_recording()  # Start a new recording with a new timestamp
-                self.frame_count = 0  # Reset frame counter
-                class_ids = (
-                    detected_objects.class_id
-                )  # Get class IDs of detected objects
-                object_names = [
-                    self.model.names[class_id] for class_id in class_ids
-                ]  # Get names of detected objects
-                object_count = len(object_names)  # Count the number of detected objects
-                object_word = (
-                    "object" if object_count < 2 else "objects"
-                )  # Singular or plural
-                message = f"The Surveillance System has detected {object_count} {object_word} and started recording. {object_word} detected: {', '.join(object_names)}."  # Create message
-                # Run the tasks in a separate thread
-                self.run_telegram_tasks_in_thread(message, processed_frame)
-
-            # Update metadata with detected objects
-            for class_id, tracker_id, bbox in zip(
-                detected_objects.class_id,
-                detected_objects.tracker_id,
-                detected_objects.xyxy,
-            ):
-                tracker_id = int(
-                    tracker_id
-                )  # Ensure tracker_id is a standard Python int
-                if tracker_id not in self.metadata["detections"]:
-                    self.metadata["detections"][tracker_id] = {
-                        "class_id": int(
-                            class_id
-                        ),  # Ensure class_id is a standard Python int
-                        "class_name": self.model.names[class_id],
-                        "positions": [],
-                        "previous_position": None,  # Initialize previous position
-                    }
-
-                # Get the current bounding box
-                current_bbox = bbox.tolist()
-
-                # Determine the movement direction
-                movement_direction = "stationary"
-                if (
-                    self.metadata["detections"][tracker_id]["previous_position"]
-                    is not None
-                ):
-                    previous_bbox = self.metadata["detections"][tracker_id][
-                        "previous_position"
-                    ]
-                    if current_bbox[0] > previous_bbox[0]:
-                        movement_direction = "right"
-                    elif current_bbox[0] < previous_bbox[0]:
-                        movement_direction = "left"
-
-                # Update the metadata with the current position and movement direction
-                self.metadata["detections"][tracker_id]["positions"].append(
-                    {
-                        "bbox": current_bbox,
-                        "timestamp": datetime.datetime.now().strftime(
-                            "%Y-%m-%d %H:%M:%S"
-                        ),
-                        "movement_direction": movement_direction,
-                    }
-                )
+        return self.handle_detections(
+            frame, self.detect(frame)
+        )  # Detect, record, publish and annotate the frame
 
-                # Update the previous position
-                self.metadata["detections"][tracker_id][
-                    "previous_position"
-                ] = current_bbox
+    def handle_detections(self, frame, detected_objects):
+        """
+        Records a frame and returns it annotated for display. In raw recording
+        mode the original frame is recorded and boxes are only drawn when the
+        frame is displayed; alerts annotate their own snapshot.
+        """
+        if self.record_raw:
+            self.record_frame(detected_objects, frame)  # Record the original footage
+            processed_frame = (
+                self.annotate(frame, detected_objects) if self.displayed() else frame
+            )  # Nobody sees the boxes of a headless camera without live viewers
         else:
-            if self.is_recording:
-                self.is_recording = False  # Stop recording
-                # Use a separate thread to release the video and write metadata
-                threading.Thread(target=self.release_video).start()
+            annotated_frame = self.annotate(frame, detected_objects)
+            processed_frame = self.record_frame(detected_objects, annotated_frame)
+        if self.frame_bus is not None:
+            self.frame_bus.publish(
+                processed_frame, detected_objects
+            )  # Latest frame and detections for the web server of a worker process
+        return processed_frame
+
+    def displayed(self):
+        """
+        Returns:
+        - displayed (bool): Whether the processed frames are shown in a window
+          or to a live viewer, here or in the web server of a worker process.
+        """
+        return (
+            not self.headless
+            or self.live_stream.watched()
+            or (self.frame_bus is not None and self.frame_bus.watched())
+        )
+
+    def record_frame(self, detected_objects, processed_frame):
+        """
+        Updates the recording state and metadata for an already processed frame.
+
+        Parameters:
+        - detected_objects (sv.Detections): The tracked detections for the frame.
+        - processed_frame (np.ndarray): The annotated frame to record.
+
+        Returns:
+        - processed_frame (np.ndarray): The annotated frame.
+        """
+        if self.segment_recorder is not None:
+            self.segment_recorder.write(processed_frame)  # Continuous recording
+        active, digest = self.alert_policy.update(detected_objects)
+        started = active and not self.is_recording
+        if started:
+            self.begin_recording()
+        elif active:
+            self.grace_frames = 0  # The incident continues in the same file
+        elif self.is_recording:
+            self.grace_frames += 1  # Counted from the policy's end of the incident, on top of its stop_frames
+            if self.grace_frames / self.frame_rate >= self.recording_grace:
+                self.finish_recording()  # The incident did not resume
         if self.is_recording:
             elapsed_time = self.frame_count / self.frame_rate  # Calculate elapsed time
-            print(f"Elapsed Time: {elapsed_time}s")  # Print elapsed time
             if elapsed_time >= self.record_duration:
-                self.is_recording = False  # Stop recording
-                # Use a separate thread to release the video and write metadata
-                threading.Thread(target=self.release_video).start()
-            else:
-                self.out.write(
-                    processed_frame
-                )  # Write the processed frame to the output file
-                self.frame_count += 1  # Increment frame counter
+                file_name = self.metadata["file_name"]
+                self.finish_recording()
+                if active:
+                    self.begin_recording(continued_from=file_name)  # Roll over
+        if digest:
+            alert_frame = (
+                self.annotate(processed_frame, detected_objects)
+                if self.record_raw
+                else processed_frame
+            )  # Alerts always show the boxes
+            # Run the tasks in a separate thread
+            self.run_telegram_tasks_in_thread(
+                self.alert_message(digest, started), alert_frame
+            )
+        if self.is_recording and len(detected_objects) > 0:
+            # Update the track store with the detected objects of this frame
+            self.track_store.append(
+                self.frame_count,
+                time.monotonic(),
+                detected_objects.tracker_id,
+                detected_objects.class_id,
+                detected_objects.xyxy,
+            )
+        if self.is_recording and (
+            self.out.write(processed_frame) is not False
+        ):  # Write the processed frame; only the async writer reports dropped frames
+            self.write_track_frame(detected_objects)  # Boxes for the overlay
+            self.frame_count += 1  # Counts the frames in the file, so the overlay stays in sync
+        if not self.is_recording and self.pre_event_buffer is not None:
+            self.pre_event_buffer.push(processed_frame)  # Remember the lead-up
 
         return processed_frame
 
-    def run(self):
-        while True:
-            ret, frame = self.camera.read()  # Read a frame from the camera
-            if not ret:
-                print(
-                    "Failed to grab frame"
-                )  # Print error message if frame is not grabbed
-                break
+    def alert_message(self, digest, started):
+        """
+        Builds the alert text for a digest of the alert policy.
 
-            processed_frame = self.process_frame(frame)  # Process the frame
+        Parameters:
+        - digest (list): (class_id, zone, tracker_id) tuples of the new objects.
+        - started (bool): Whether this frame started a recording.
+        """
+        object_names = [
+            self.model.names[class_id]
+            + (f" (zone {zone + 1})" if len(self.roi_polygons) > 1 and zone >= 0 else "")
+            for class_id, zone, _ in digest
+        ]  # Get names of detected objects
+        object_count = len(object_names)  # Count the number of detected objects
+        object_word = "object" if object_count < 2 else "objects"  # Singular or plural
+        action = " and started recording" if started else ""
+        return f"The Surveillance System has detected {object_count} {object_word}{action}. {object_word} detected: {', '.join(object_names)}."  # Create message
+
+    def write_track_frame(self, detected_objects):
+        """
+        Appends the boxes of one recorded frame to the metadata as a JSON line of
+        the form {"t": seconds, "boxes": [[x1, y1, x2, y2, tracker_id, class_id]]}.
+        """
+        if self.metadata_writer is None:
+            return
+        boxes = [
+            bbox + [tracker_id, class_id]
+            for bbox, tracker_id, class_id in zip(
+                detected_objects.xyxy.round(1).tolist(),
+                detected_objects.tracker_id.tolist(),
+                detected_objects.class_id.tolist(),
+            )
+        ]
+        offset = self.metadata.get("pre_event_duration", 0) + (
+            self.frame_count / self.frame_rate
+        )  # Position of the frame in the video
+        self.metadata_writer.write({"t": round(offset, 3), "boxes": boxes})
+
+    def flush_pre_event_buffer(self):
+        if self.pre_event_buffer is None:
+            return
+        written = 0  # Frames that made it into the recording
+        for frame in self.pre_event_buffer.drain():
+            if self.async_writer:
+                if self.out.write(frame, block=True):  # Wait for free slots rather than drop the lead-up
+                    written += 1
+            else:
+                self.out.write(frame)
+                written += 1
+        self.metadata["pre_event_duration"] = written / self.frame_rate
+
+    def show(self, processed_frame):
+        """
+        Hands a processed frame to the live viewers and, unless headless, to the
+        OpenCV window.
+
+        Returns:
+        - keep_running (bool): False once the user pressed 'q' or stop() was called.
+        """
+        self.live_stream.publish(processed_frame)
+        if not self.headless:
             cv2.imshow(
                 "Intelligent Surveillance System (Press Q to Quit)", processed_frame
             )  # Display the processed frame
-
             if cv2.waitKey(1) & 0xFF == ord("q"):  # Press 'q' to quit
+                return False
+        return not self.stop_requested.is_set()
+
+    def stop(self):
+        self.stop_requested.set()  # run() finishes after the current frame
+
+    def run(self):
+        if self.pipelined:
+            return self.run_pipelined()
+
+        for frame in self.camera_frames():
+            processed_frame = self.process_frame(frame)  # Process the frame
+            if not self.show(processed_frame):
                 break
 
+        self.shutdown()
+
+    def camera_frames(self):
+        """
+        Yields the camera's frames until it stops delivering them.
+
+        With adaptive frame skipping the camera is read by a LatestFrameReader,
+        so that a slow loop always processes the newest frame: the FFmpeg and
+        GStreamer backends (RTSP, files) ignore CAP_PROP_BUFFERSIZE, and the
+        skip interval is capped at max_skip.
+        """
+        if self.frame_skip is None:
+            while True:
+                ret, frame = self.camera.read()  # Read a frame from the camera
+                if not ret:
+                    print(
+                        "Failed to grab frame"
+                    )  # Print error message if frame is not grabbed
+                    return
+                yield frame
+        reader = LatestFrameReader(self.camera).start()
+        last_sequence = 0  # Sequence of the last frame processed
+        try:
+            while not self.stop_requested.is_set():
+                sequence, frame = reader.latest()
+                if sequence != last_sequence:
+                    last_sequence = sequence
+                    yield frame  # Frames read meanwhile are skipped
+                elif reader.finished and reader.latest()[0] == last_sequence:
+                    print("Failed to grab frame")  # The camera has stopped
+                    return
+                else:
+                    time.sleep(self.poll_interval)  # Wait for the next frame
+        finally:
+            reader.stop()
+
+    def shutdown(self):
         self.camera.release()  # Release the camera
         if self.is_recording:
-            threading.Thread(target=self.release_video).start()
-        cv2.destroyAllWindows()  # Close all OpenCV windows
+            self.finish_recording()
+        if self.finalizer is not None:
+            self.finished_recordings.put(None)  # Finish the queued recordings, then stop
+            self.finalizer.join()
+            self.finalizer = None
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+        if self.segment_recorder is not None:
+            self.segment_recorder.release()  # Finish the last segment
+        self.notifier.close()  # Send the alerts that are still queued
+        if not self.headless:
+            cv2.destroyAllWindows()  # Close all OpenCV windows
+
+    def run_pipelined(self):
+        """
+        Runs capture, inference, annotation/encoding and display as separate stages.
+
+        Capture and display keep only the freshest frames: when a downstream stage
+        falls behind, the stalest queued frame is dropped instead of adding latency.
+        Inference hands frames to the encoder with a blocking put so that every
+        detected frame is recorded and back-pressure ends up at the capture queue.
+        """
+        stop_event = threading.Event()  # Signals all stages to finish
+        capture_queue = queue.Queue(maxsize=self.queue_size)  # Capture -> inference
+        encode_queue = queue.Queue(maxsize=self.queue_size)  # Inference -> encoding
+        display_queue = queue.Queue(maxsize=self.queue_size)  # Encoding -> display
+
+        def blocking_put(stage_queue, item):
+            while not stop_event.is_set():
+                try:
+                    stage_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def stage_items(stage_queue):
+            while not stop_event.is_set():
+                try:
+                    item = stage_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:  # Upstream stage finished
+                    return
+                yield item
+
+        def capture_stage():
+            while not stop_event.is_set():
+                ret, frame = self.camera.read()  # Read a frame from the camera
+                if not ret:
+                    print("Failed to grab frame")
+                    break
+                self.dropped_captures += put_latest(capture_queue, frame)
+            blocking_put(capture_queue, None)
+
+        def inference_stage():
+            for frame in stage_items(capture_queue):
+                detections = self.detect(frame)  # Run detection and tracking
+                blocking_put(encode_queue, (frame, detections))
+            blocking_put(encode_queue, None)
+
+        def encode_stage():
+            for frame, detections in stage_items(encode_queue):
+                processed_frame = self.handle_detections(frame, detections)
+                self.dropped_displays += put_latest(display_queue, processed_frame)
+            blocking_put(display_queue, None)
+
+        def run_stage(stage):
+            try:
+                stage()
+            except Exception as e:
+                print(f"Pipeline stage {stage.__name__} failed: {e}")
+                stop_event.set()  # A failed stage stops the whole pipeline
+
+        stages = [
+            threading.Thread(target=run_stage, args=(stage,), daemon=True)
+            for stage in (capture_stage, inference_stage, encode_stage)
+        ]
+        for stage in stages:
+            stage.start()
+
+        # OpenCV windows must be driven from the main thread, so display runs here
+        for processed_frame in stage_items(display_queue):
+            if not self.show(processed_frame):
+                break
+
+        stop_event.set()  # Stop the remaining stages
+        for stage in stages:
+            stage.join()
+        if self.dropped_captures or self.dropped_displays:
+            print(
+                f"Dropped {self.dropped_captures} stale frames before detection"
+                f" and {self.dropped_displays} before display"
+            )
+        self.shutdown()
+
+class MultiCameraSurveillanceSystem:
+    """
+    Watches several cameras from one process with a single shared YOLO model.
+
+    The latest frame of every camera is collected into one batched model call;
+    each camera keeps its own SurveillanceSystem for tracking, recording and metadata.
+    """
+
+    def __init__(
+        self,
+        sources,
+        bot_token=None,
+        chat_id=None,
+        environment="development",
+        camera_options=None,
+        backend=None,
+        headless=None,
+        thumbnails=None,
+        camera_names=None,
+    ):
+        self.headless = (
+            headless if headless is not None else os.getenv("HEADLESS", "0") == "1"
+        )  # Never open OpenCV windows
+        self.model = load_model(
+            "yolov8n.pt", backend or os.getenv("INFERENCE_BACKEND", "torch")
+        )  # One model shared by every camera
+        self.notifier = NotificationDispatcher(
+            bot_token or os.getenv("TELEGRAM_BOT_TOKEN"),
+            chat_id or os.getenv("TELEGRAM_CHAT_ID"),
+        )  # One alert queue and connection for every camera
+        camera_options = camera_options or [{} for _ in sources]  # e.g. roi_polygons
+        camera_names = camera_names or [
+            f"cam{index}" for index in range(len(sources))
+        ]  # Unique across processes when a supervisor runs several workers
+        self.systems = [
+            SurveillanceSystem(
+                bot_token=bot_token,
+                chat_id=chat_id,
+                environment=environment,
+                source=source,
+                model=self.model,
+                camera_name=camera_name,
+                headless=self.headless,
+                thumbnails=thumbnails,
+                notifier=self.notifier,
+                **options,
+            )
+            for source, options, camera_name in zip(
+                sources, camera_options, camera_names
+            )
+        ]  # Per-camera tracker, recording state and metadata
+        self.readers = []  # Background readers holding each camera's latest frame
+        self.poll_interval = 0.005  # Seconds to wait when no camera has a new frame
+
+    def process_batch(self, frames):
+        """
+        Runs one batched inference over the frames of several cameras.
+
+        Parameters:
+        - frames (list): (system, frame) pairs, one per camera with a new frame.
+
+        Returns:
+        - processed_frames (list): The processed frame for each pair, in order.
+        """
+        cheap = {
+            id(system): system.cheap_detections(frame) for system, frame in frames
+        }  # Detections of cameras that are gated or skipping this frame
+        inputs = {
+            id(system): system.preprocess(frame)
+            for system, frame in frames
+            if cheap[id(system)] is None
+        }  # Crops of the cameras that need the detector
+        images = [image for crops, _ in inputs.values() for image in crops]
+        started = time.monotonic()
+        results = self.model(images) if images else []  # Single batched call
+        elapsed = time.monotonic() - started
+        processed_frames = []
+        position = 0  # Index of the next camera's first result
+        for system, frame in frames:
+            if id(system) in inputs:
+                crops, offsets = inputs[id(system)]
+                camera_results = results[position : position + len(crops)]
+                position += len(crops)
+                if system.frame_skip is not None:
+                    system.frame_skip.record_inference_time(elapsed)
+                detections = system.track(
+                    system.merge_results(camera_results, offsets, frame.shape)
+                )  # Per-camera ByteTrack
+            else:
+                detections = cheap[id(system)]
+            processed_frames.append(system.handle_detections(frame, detections))
+        return processed_frames
+
+    def run(self):
+        self.readers = [LatestFrameReader(system.camera).start() for system in self.systems]
+        last_sequences = [0] * len(self.systems)
+        while True:
+            frames = []  # Cameras that produced a frame since the last batch
+            for index, (system, reader) in enumerate(zip(self.systems, self.readers)):
+                sequence, frame = reader.latest()
+                if sequence != last_sequences[index]:
+                    last_sequences[index] = sequence
+                    frames.append((system, frame))
+
+            if not frames:
+                if all(reader.finished for reader in self.readers):
+                    print("Failed to grab frame")  # Every camera has stopped
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            processed_frames = self.process_batch(frames)
+            for (system, _), processed_frame in zip(frames, processed_frames):
+                system.live_stream.publish(processed_frame)  # Per-camera live view
+                if not self.headless:
+                    cv2.imshow(
+                        f"Intelligent Surveillance System - {system.camera_name} (Press Q to Quit)",
+                        processed_frame,
+                    )  # Display each camera in its own window
+
+            if not self.headless and cv2.waitKey(1) & 0xFF == ord("q"):  # Press 'q' to quit
+                break
+            if any(system.stop_requested.is_set() for system in self.systems):
+                break
+
+        for reader in self.readers:
+            reader.stop()
+        for system in self.systems:
+            system.shutdown()
 
 
 def main():
-    system = SurveillanceSystem()
+    sources = os.getenv("CAMERA_SOURCES")  # e.g. "0,rtsp://host/stream"
+    if sources and "," in sources:
+        system = MultiCameraSurveillanceSystem(
+            sources.split(","), thumbnails=ThumbnailCache()
+        )
+    else:
+        system = SurveillanceSystem(source=sources or 0, thumbnails=ThumbnailCache())
     system.run()
 
 
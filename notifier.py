@@ -0,0 +1,265 @@
+import os  # Import os for the alert image settings
+import json  # Import json for the Telegram API payloads and responses
+import time  # Import time for retry backoff and the coalescing window
+import queue  # Import queue for the bounded alert queue
+import threading  # Import threading for the dispatcher thread
+import http.client  # Import http.client for the persistent API connection
+import cv2  # Import OpenCV for encoding alert frames
+
+
+class NotificationDispatcher:
+    """
+    Sends Telegram alerts from one long-lived thread over one keep-alive
+    connection.
+
+    notify() never blocks the caller: alerts go into a bounded queue and the
+    oldest one is dropped when it is full. Alerts arriving within
+    coalesce_window seconds of each other are sent as a single message with
+    the latest frame. Failed requests are retried with exponential backoff,
+    and rate-limited requests (HTTP 429) wait as long as Telegram asks.
+    """
+
+    def __init__(
+        self,
+        bot_token,
+        chat_id,
+        host="api.telegram.org",
+        port=None,
+        secure=True,
+        queue_size=16,
+        coalesce_window=2.0,
+        max_retries=5,
+        backoff=1.0,
+        max_backoff=30.0,
+        timeout=10.0,
+        photo_quality=None,
+        photo_max_width=None,
+    ):
+        self.bot_token = bot_token  # Telegram bot token
+        self.chat_id = chat_id  # Telegram chat ID
+        self.host = host  # API host, a local stand-in server in tests
+        self.port = port  # API port (the scheme's default if None)
+        self.secure = secure  # Use TLS
+        self.coalesce_window = coalesce_window  # Seconds to wait for more alerts of a burst
+        self.max_retries = max_retries  # Attempts after the first failed one
+        self.backoff = backoff  # Seconds before the first retry, doubled each time
+        self.max_backoff = max_backoff  # Longest wait between retries
+        self.timeout = timeout  # Socket timeout of the API connection
+        self.photo_quality = photo_quality or int(
+            os.getenv("ALERT_JPEG_QUALITY", "80")
+        )  # JPEG quality of alert images
+        self.photo_max_width = photo_max_width or int(
+            os.getenv("ALERT_MAX_WIDTH", "1280")
+        )  # Wider alert images are scaled down to this width
+        self.queue = queue.Queue(maxsize=queue_size)  # Pending (message, frame) alerts
+        self.connection = None  # Reused while the server keeps it alive
+        self.connection_lock = threading.Lock()  # One request at a time on the connection
+        self.thread = None  # Started with the first alert
+        self.start_lock = threading.Lock()  # Starts the thread only once
+        self.closing = threading.Event()  # Set by close(); the queue only holds alerts
+        self.poll_interval = 0.1  # Seconds between checks of closing while idle
+        self.dropped = 0  # Alerts discarded because the queue was full
+        self.sent = 0  # Coalesced alerts delivered
+
+    def notify(self, message, frame=None):
+        """
+        Queues an alert without waiting for it to be sent.
+
+        Parameters:
+        - message (str): The alert text.
+        - frame (np.ndarray): An optional image sent with the alert.
+        """
+        with self.start_lock:
+            if self.thread is None:
+                self.closing.clear()
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        while True:
+            try:
+                self.queue.put_nowait((message, frame))
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()  # Drop the oldest alert
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        while True:
+            try:
+                alert = self.queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if self.closing.is_set():  # close() was called and every alert is sent
+                    return
+                continue
+            alerts = [alert]
+            deadline = time.monotonic() + self.coalesce_window
+            while not self.closing.is_set():  # Collect the rest of the burst
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    alerts.append(
+                        self.queue.get(timeout=min(remaining, self.poll_interval))
+                    )
+                except queue.Empty:
+                    continue
+            if self.closing.is_set():
+                for _ in range(self.queue.qsize()):  # Send what is queued without waiting for more
+                    try:
+                        alerts.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self.dispatch(alerts)
+
+    def dispatch(self, alerts):
+        """
+        Sends a burst of alerts as one message and the newest frame.
+        """
+        messages = list(dict.fromkeys(message for message, _ in alerts))  # Unique, in order
+        message = (
+            messages[0]
+            if len(messages) == 1
+            else f"{len(alerts)} alerts:\n" + "\n".join(messages)
+        )
+        frames = [frame for _, frame in alerts if frame is not None]
+        try:
+            self.send_message(message[:4096])  # Telegram's message length limit
+            if frames:
+                self.send_photo(frames[-1])
+            self.sent += 1
+        except Exception as e:
+            print(f"Error sending alert: {e}")
+
+    def send_message(self, message):
+        return self.post(
+            "sendMessage",
+            json.dumps({"chat_id": self.chat_id, "text": message}),
+            {"Content-Type": "application/json"},
+        )
+
+    def encode_photo(self, frame):
+        """
+        Scales a frame down to photo_max_width and JPEG-encodes it in memory.
+
+        Returns:
+        - encoded (memoryview): The JPEG bytes, without a copy of the encoder's buffer.
+        """
+        height, width = frame.shape[:2]
+        if width > self.photo_max_width:
+            frame = cv2.resize(
+                frame,
+                (self.photo_max_width, round(height * self.photo_max_width / width)),
+                interpolation=cv2.INTER_AREA,
+            )
+        ok, encoded = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.photo_quality]
+        )
+        if not ok:
+            raise ValueError("Failed to encode frame")
+        return memoryview(encoded.reshape(-1))
+
+    def send_photo(self, frame, filename="frame.jpg"):
+        photo = self.encode_photo(frame)
+
+        # The multipart/form-data body is sent part by part, so the JPEG is never
+        # copied into a larger buffer
+        boundary = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
+        body = [
+            (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="chat_id"\r\n\r\n{self.chat_id}\r\n'
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="photo"; filename="{filename}"\r\n'
+                "Content-Type: image/jpeg\r\n\r\n"
+            ).encode("utf-8"),
+            photo,
+            f"\r\n--{boundary}--\r\n".encode("utf-8"),
+        ]
+
+        return self.post(
+            "sendPhoto",
+            body,
+            {
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Content-Length": str(sum(len(part) for part in body)),
+            },
+        )
+
+    def post(self, method, body, headers):
+        """
+        Calls a Telegram API method over the persistent connection.
+
+        Parameters:
+        - method (str): The API method, e.g. "sendMessage".
+        - body (str | bytes | list): The request body, or a list of its parts.
+        - headers (dict): The request headers.
+
+        Returns:
+        - response (dict): The decoded API response.
+        """
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                status, headers_in, data = self.request(method, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.max_retries:
+                    raise
+                if attempt > 0:  # The first failure is usually a stale keep-alive
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+                print(f"Retrying {method} after connection error: {e}")
+                continue
+            if status == 200:
+                return json.loads(data)
+            if attempt == self.max_retries or (status < 500 and status != 429):
+                raise ValueError(f"Failed to call {method}: {status}")
+            if status == 429:
+                try:
+                    wait = json.loads(data)["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    wait = headers_in.get("Retry-After", delay)
+                time.sleep(float(wait))  # Telegram says how long the limit lasts
+            else:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def request(self, method, body, headers):
+        with self.connection_lock:
+            if self.connection is None:
+                connection_class = (
+                    http.client.HTTPSConnection
+                    if self.secure
+                    else http.client.HTTPConnection
+                )
+                self.connection = connection_class(
+                    self.host, self.port, timeout=self.timeout
+                )
+            try:
+                self.connection.request(
+                    "POST", f"/bot{self.bot_token}/{method}", body=body, headers=headers
+                )
+                response = self.connection.getresponse()
+                data = response.read()  # Read fully so the connection can be reused
+            except Exception:
+                self.connection.close()
+                self.connection = None  # Reconnect on the next attempt
+                raise
+            if response.will_close:
+                self.connection.close()
+                self.connection = None
+            return response.status, response.headers, data.decode("utf-8")
+
+    def close(self, timeout=10.0):
+        """
+        Sends the queued alerts, then stops the thread and closes the connection.
+        """
+        if self.thread is not None:
+            self.closing.set()  # Not queued, so a full queue can neither block nor drop it
+            self.thread.join(timeout)  # A stuck thread is a daemon and ends with the process
+            self.thread = None
+        with self.connection_lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,305 @@
+import os  # Import os for the worker settings and CPU affinity
+import json  # Import json for the worker configuration
+import time  # Import time for restart backoff
+import threading  # Import threading for the monitor and stop threads
+import multiprocessing  # Import multiprocessing for the camera worker processes
+from framebus import FrameBus  # Import FrameBus for passing frames to the web server
+
+
+def run_worker(name, cameras, cpus, bus_names, stop_event):
+    """
+    Entry point of a worker process: runs the cameras headless until
+    stop_event is set.
+
+    Parameters:
+    - name (str): The worker name.
+    - cameras (dict): Camera name -> source.
+    - cpus (list): CPU cores the process is pinned to, or None.
+    - bus_names (dict): Camera name -> its FrameBus.
+    - stop_event (multiprocessing.Event): Set by the supervisor to stop the worker.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)  # Keep the worker's threads on its own cores
+        try:
+            import torch
+
+            torch.set_num_threads(len(cpus))  # One inference thread per core
+        except ImportError:
+            pass
+
+    from main import MultiCameraSurveillanceSystem, SurveillanceSystem
+    from thumbnails import ThumbnailCache
+
+    buses = {camera: FrameBus(bus_names[camera]) for camera in cameras}
+    if len(cameras) == 1:
+        camera_name, source = next(iter(cameras.items()))
+        system = SurveillanceSystem(
+            source=source,
+            camera_name=camera_name,
+            headless=True,
+            thumbnails=ThumbnailCache(),
+            frame_bus=buses[camera_name],
+        )
+        systems = [system]
+    else:
+        system = MultiCameraSurveillanceSystem(
+            list(cameras.values()),
+            camera_names=list(cameras),
+            camera_options=[{"frame_bus": buses[camera]} for camera in cameras],
+            headless=True,
+            thumbnails=ThumbnailCache(),
+        )
+        systems = system.systems
+
+    def wait_for_stop():
+        stop_event.wait()
+        for camera in systems:
+            camera.stop()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    try:
+        system.run()
+    finally:
+        for bus in buses.values():
+            bus.close()
+    print(f"Worker {name} stopped")
+
+
+class WorkerHandle:
+    """
+    The supervisor's state of one worker process.
+    """
+
+    def __init__(self, name, cameras, cpus):
+        self.name = name
+        self.cameras = cameras  # Camera name -> source
+        self.cpus = cpus  # Pinned CPU cores, or None
+        self.process = None  # The running process
+        self.stop_event = None  # Set to stop the running process
+        self.wanted = False  # Whether the worker should be running
+        self.started_at = None  # time.time() of the last start
+        self.restarts = 0  # Restarts after crashes
+        self.failures = 0  # Crashes since the worker last ran for a while
+        self.restart_at = None  # time.monotonic() of the next restart
+        self.exitcode = None  # Exit code of the last process
+
+
+class Supervisor:
+    """
+    Runs every camera worker in its own process, so that inference, tracking
+    and encoding of different cameras do not contend for one GIL.
+
+    Crashed workers are restarted with exponential backoff, and each worker
+    is pinned to its own share of the CPU cores. The latest frame of every
+    camera is published on a FrameBus for the web server's live view.
+    """
+
+    def __init__(
+        self,
+        workers,
+        cpus=None,
+        target=run_worker,
+        restart_delay=1.0,
+        max_restart_delay=60.0,
+        stable_after=60.0,
+        poll_interval=0.5,
+        start_method="spawn",
+    ):
+        """
+        Parameters:
+        - workers (dict): Worker name -> {camera name: source}.
+        - cpus (list): Cores shared out between the workers; every available
+          core by default, and no pinning if the platform has no affinity.
+        - target (callable): The worker entry point, run_worker unless testing.
+        - restart_delay (float): Seconds before restarting a crashed worker,
+          doubled after every crash up to max_restart_delay.
+        - stable_after (float): Seconds a worker must run before its backoff resets.
+        """
+        if cpus is None and hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        self.target = target
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.poll_interval = poll_interval
+        self.context = multiprocessing.get_context(
+            start_method
+        )  # spawn: the web server's threads are not forked
+        self.lock = threading.Lock()  # Guards the worker handles
+        self.workers = {}
+        share = max(1, len(cpus) // len(workers)) if cpus and workers else 0
+        for index, (name, cameras) in enumerate(workers.items()):
+            pinned = (
+                [cpus[(index * share + offset) % len(cpus)] for offset in range(share)]
+                if share
+                else None
+            )  # Contiguous cores; workers share them round-robin if there are too few
+            self.workers[name] = WorkerHandle(name, cameras, pinned)
+        self.buses = {
+            camera: FrameBus(create=True)
+            for handle in self.workers.values()
+            for camera in handle.cameras
+        }  # Camera name -> frame bus, outliving worker restarts
+        self.monitor = None  # Thread restarting crashed workers
+        self.closed = threading.Event()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        Builds a supervisor from CAMERA_WORKERS, a JSON object of worker name
+        -> list of sources, or else one worker per source in CAMERA_SOURCES.
+        """
+        config = os.getenv("CAMERA_WORKERS")
+        if config:
+            workers = {
+                name: (
+                    {name: sources[0]}
+                    if len(sources) == 1
+                    else {f"{name}_{index}": source for index, source in enumerate(sources)}
+                )
+                for name, sources in json.loads(config).items()
+            }
+        else:
+            sources = (os.getenv("CAMERA_SOURCES") or "0").split(",")
+            workers = {
+                f"cam{index}": {f"cam{index}": source}
+                for index, source in enumerate(sources)
+            }
+        return cls(workers, **kwargs)
+
+    def launch(self, handle):
+        handle.stop_event = self.context.Event()
+        handle.process = self.context.Process(
+            target=self.target,
+            args=(
+                handle.name,
+                handle.cameras,
+                handle.cpus,
+                {camera: self.buses[camera].name for camera in handle.cameras},
+                handle.stop_event,
+            ),
+            name=f"camera-worker-{handle.name}",
+            daemon=True,
+        )
+        handle.process.start()
+        handle.started_at = time.time()
+        handle.restart_at = None
+
+    def start(self, name=None):
+        """
+        Starts one worker, or every worker if name is None.
+
+        Returns:
+        - started (list): The names of the workers that were not already running.
+        """
+        started = []
+        with self.lock:
+            for handle in self.handles(name):
+                handle.wanted = True
+                if handle.process is None or not handle.process.is_alive():
+                    handle.failures = 0
+                    self.launch(handle)
+                    started.append(handle.name)
+            if self.monitor is None:
+                self.monitor = threading.Thread(target=self.watch, daemon=True)
+                self.monitor.start()
+        return started
+
+    def stop(self, name=None, timeout=10.0):
+        """
+        Stops one worker, or every worker if name is None, giving each
+        timeout seconds to finish its recordings before it is terminated.
+
+        Returns:
+        - stopped (list): The names of the workers that were running.
+        """
+        with self.lock:
+            handles = self.handles(name)
+            for handle in handles:
+                handle.wanted = False
+                handle.restart_at = None
+                if handle.stop_event is not None:
+                    handle.stop_event.set()
+        stopped = []
+        for handle in handles:
+            process = handle.process
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout)
+            if process.exitcode is not None:
+                handle.exitcode = process.exitcode
+                stopped.append(handle.name)
+            handle.process = None
+        return stopped
+
+    def handles(self, name):
+        if name is None:
+            return list(self.workers.values())
+        if name not in self.workers:
+            raise KeyError(name)
+        return [self.workers[name]]
+
+    def watch(self):
+        """
+        Restarts workers that exited without being stopped.
+        """
+        while not self.closed.wait(self.poll_interval):
+            with self.lock:
+                now = time.monotonic()
+                for handle in self.workers.values():
+                    if not handle.wanted or handle.process is None:
+                        continue
+                    if handle.process.is_alive():
+                        if time.time() - handle.started_at > self.stable_after:
+                            handle.failures = 0
+                        continue
+                    if handle.restart_at is None:
+                        handle.exitcode = handle.process.exitcode
+                        delay = min(
+                            self.restart_delay * 2**handle.failures,
+                            self.max_restart_delay,
+                        )
+                        handle.failures += 1
+                        handle.restart_at = now + delay
+                        print(
+                            f"Worker {handle.name} exited with {handle.exitcode}, restarting in {delay:.0f}s"
+                        )
+                    elif now >= handle.restart_at:
+                        handle.restarts += 1
+                        self.launch(handle)
+
+    def status(self, name=None):
+        """
+        Returns:
+        - status (dict): Worker name -> its state, pid, cores, cameras and restarts.
+        """
+        with self.lock:
+            status = {}
+            for handle in self.handles(name):
+                alive = handle.process is not None and handle.process.is_alive()
+                status[handle.name] = {
+                    "state": (
+                        "running"
+                        if alive
+                        else "restarting" if handle.wanted else "stopped"
+                    ),
+                    "pid": handle.process.pid if alive else None,
+                    "cpus": handle.cpus,
+                    "cameras": list(handle.cameras),
+                    "started_at": handle.started_at if alive else None,
+                    "restarts": handle.restarts,
+                    "exitcode": handle.exitcode,
+                }
+            return status
+
+    def close(self, timeout=10.0):
+        """
+        Stops every worker and frees the frame buses.
+        """
+        self.closed.set()
+        self.stop(timeout=timeout)
+        for bus in self.buses.values():
+            bus.close()
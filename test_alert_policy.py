@@ -0,0 +1,70 @@
+import unittest  # Import the unittest module for creating and running tests.
+import numpy as np  # Import numpy for building detections.
+import supervision as sv  # Import supervision for building detections.
+from alert_policy import AlertPolicy  # Import the AlertPolicy class from the alert_policy module.
+
+
+def make_detections(*objects):  # Define a helper building detections from (tracker_id, class_id, x) tuples.
+    if not objects:
+        detections = sv.Detections.empty()
+        detections.tracker_id = np.array([], dtype=int)
+        return detections
+    return sv.Detections(
+        xyxy=np.array([[x, 10, x + 10, 20] for _, _, x in objects], dtype=np.float32),
+        class_id=np.array([class_id for _, class_id, _ in objects]),
+        tracker_id=np.array([tracker_id for tracker_id, _, _ in objects]),
+    )
+
+
+class TestAlertPolicy(unittest.TestCase):  # Define a test case class for the alert policy.
+
+    def test_hysteresis_ignores_flicker(self):  # Define a test method for start and stop hysteresis.
+        policy = AlertPolicy(start_frames=3, stop_frames=2, cooldown=0, digest_interval=0)  # Start after 3 frames, stop after 2.
+        person = make_detections((1, 0, 0))  # One tracked person.
+        empty = make_detections()  # No detections.
+
+        flicker = [policy.update(frame, now=index)[0] for index, frame in enumerate([person, empty, person, person, empty])]  # Detection flickers.
+        self.assertEqual(flicker, [False] * 5)  # Assert that flicker never starts an incident.
+        steady = [policy.update(frame, now=10 + index)[0] for index, frame in enumerate([person, person, person, empty, person, empty, empty])]  # Steady detection, then a gap.
+        self.assertEqual(steady, [False, False, True, True, True, True, False])  # Assert that one empty frame does not end the incident.
+
+    def test_tracker_is_reported_once(self):  # Define a test method for tracker ID deduplication.
+        policy = AlertPolicy(start_frames=1, stop_frames=1, cooldown=0, digest_interval=0)  # Alert on every new object.
+
+        first = policy.update(make_detections((1, 0, 0)), now=0)[1]  # A person appears.
+        again = policy.update(make_detections((1, 0, 0)), now=100)[1]  # The same person, much later.
+        other = policy.update(make_detections((1, 0, 0), (2, 0, 50)), now=200)[1]  # A second person joins.
+
+        self.assertEqual(first, [(0, 0, 1)])  # Assert that the first person is reported.
+        self.assertIsNone(again)  # Assert that the same tracker ID is not reported again.
+        self.assertEqual(other, [(0, 0, 2)])  # Assert that only the new person is reported.
+
+    def test_cooldown_is_per_class_and_zone(self):  # Define a test method for cooldowns.
+        zones = [np.array([[0, 0], [100, 0], [100, 100], [0, 100]], dtype=np.int32), np.array([[100, 0], [200, 0], [200, 100], [100, 100]], dtype=np.int32)]  # Two side by side zones.
+        policy = AlertPolicy(start_frames=1, stop_frames=1, cooldown=60, digest_interval=0, zones=zones)  # One minute cooldown.
+
+        policy.update(make_detections((1, 0, 10)), now=0)  # A person in zone 0 is reported.
+        same = policy.update(make_detections((2, 0, 20)), now=10)[1]  # Another person in zone 0 during the cooldown.
+        other_zone = policy.update(make_detections((3, 0, 150)), now=11)[1]  # A person in zone 1.
+        other_class = policy.update(make_detections((4, 2, 20)), now=12)[1]  # A car in zone 0.
+        later = policy.update(make_detections((5, 0, 20)), now=61)[1]  # A person in zone 0 after the cooldown.
+
+        self.assertIsNone(same)  # Assert that the cooldown suppresses the alert.
+        self.assertEqual(other_zone, [(0, 1, 3)])  # Assert that other zones have their own cooldown.
+        self.assertEqual(other_class, [(2, 0, 4)])  # Assert that other classes have their own cooldown.
+        self.assertEqual(later, [(0, 0, 5)])  # Assert that alerts resume after the cooldown.
+
+    def test_alerts_are_batched_into_digests(self):  # Define a test method for digest batching.
+        policy = AlertPolicy(start_frames=1, stop_frames=1, cooldown=0, digest_interval=30)  # Batch alerts over 30 seconds.
+
+        first = policy.update(make_detections((1, 0, 0)), now=0)[1]  # The first object is reported at once.
+        batched = [policy.update(make_detections((tracker_id, 0, 0)), now=tracker_id)[1] for tracker_id in (2, 3)]  # Two more objects soon after.
+        digest = policy.update(make_detections(), now=30)[1]  # The digest interval passes.
+
+        self.assertEqual(first, [(0, 0, 1)])  # Assert that the first alert is immediate.
+        self.assertEqual(batched, [None, None])  # Assert that the following alerts wait.
+        self.assertEqual(digest, [(0, 0, 2), (0, 0, 3)])  # Assert that they are sent together.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
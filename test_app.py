@@ -1,38 +1,152 @@
 import unittest  # Import the unittest module for creating and running tests.
 import os  # Import the os module for interacting with the operating system.
 from unittest.mock import patch, MagicMock  # Import patch and MagicMock for mocking dependencies.
-from app import app, start_flask  # Import the Flask app and start_flask function from the app module.
+import tempfile  # Import tempfile for a throwaway index database.
+import shutil  # Import shutil for removing the temporary directory.
+import json  # Import json for writing metadata files.
+from app import app, start_flask, EventBroker, IndexWatcher, format_sse, video_cache  # Import the Flask app and helpers from the app module.
+from incident_index import IncidentIndex  # Import the IncidentIndex class for the gallery test.
+from main import LiveStream  # Import the LiveStream class for the live view test.
+import numpy as np  # Import numpy for creating dummy frames.
+import cv2  # Import OpenCV for writing a test recording.
+from thumbnails import ThumbnailCache  # Import the ThumbnailCache class for the thumbnail test.
+from framebus import FrameBus  # Import the FrameBus class for the worker live view test.
 
 class TestApp(unittest.TestCase):  # Define a test case class inheriting from unittest.TestCase.
 
     def setUp(self):  # Define the setup method to initialize the test client.
         self.app = app.test_client()  # Create a test client for the Flask app.
         self.app.testing = True  # Enable testing mode for the Flask app.
+        directory = tempfile.mkdtemp()  # Create a temporary directory for the index and recordings.
+        self.addCleanup(shutil.rmtree, directory)  # Remove it after the test.
+        self.index = IncidentIndex(os.path.join(directory, "incidents.db"))  # Create an empty index.
+        self.static = os.path.join(directory, "static")  # Path of the temporary static folder.
+        self.videos = os.path.join(self.static, "recorded_videos")  # Path of the temporary recordings directory.
+        os.makedirs(self.videos)  # Create the recordings directory.
+        self.addCleanup(setattr, app, "static_folder", app.static_folder)  # Restore the static folder after the test.
+        app.static_folder = self.static  # Never touch the real recordings.
+        self.addCleanup(self.index.connection.close)  # Close the database after the test.
+        index_patch = patch("app.incident_index", self.index)  # Use the temporary index in the app.
+        index_patch.start()
+        self.addCleanup(index_patch.stop)
+        video_cache.invalidate()  # Do not reuse a video list cached by another test.
 
-    @patch("app.get_video_files")  # Mock the get_video_files function in the app module.
-    def test_check_videos(self, mock_get_video_files):  # Define a test method for the /check-videos endpoint.
-        mock_get_video_files.return_value = (  # Set the return value of the mocked get_video_files function.
-            os.path.join(app.static_folder, "recorded_videos"),  # Return the path to the recorded videos folder.
-            ["video1.webm"],  # Return a list containing one video file.
-        )
+    def test_check_videos(self):  # Define a test method for the /check-videos endpoint.
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index one recording.
 
         response = self.app.get("/check-videos")  # Send a GET request to the /check-videos endpoint.
 
         self.assertEqual(response.status_code, 200)  # Assert that the response status code is 200.
         self.assertEqual(response.json, ["video1.webm"])  # Assert that the response JSON contains the expected video file.
 
-    @patch("os.path.exists")  # Mock the os.path.exists function.
-    @patch("os.remove")  # Mock the os.remove function.
-    def test_delete_video(self, mock_remove, mock_exists):  # Define a test method for the /delete-video endpoint.
-        mock_exists.side_effect = lambda x: x.endswith("video1.webm") or x.endswith(  # Set the side effect of the mocked os.path.exists function.
-            "video1.webm.json"  # Return True if the file name ends with video1.webm or video1.webm.json.
-        )
+    def test_check_videos_not_modified(self):  # Define a test method for conditional polling.
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index one recording.
+
+        first = self.app.get("/check-videos")  # Poll once to get the ETag.
+        second = self.app.get("/check-videos", headers={"If-None-Match": first.headers["ETag"]})  # Poll again with the ETag.
+
+        self.assertEqual(second.status_code, 304)  # Assert that the unchanged list is not sent again.
+        self.assertEqual(second.data, b"")  # Assert that the 304 has no body.
+
+    def test_video_list_is_cached_until_the_index_changes(self):  # Define a test method for the video list cache.
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index one recording.
+
+        with patch.object(self.index, "file_names", wraps=self.index.file_names) as mock_file_names:  # Count index reads.
+            first = self.app.get("/check-videos")  # Read the index once.
+            self.app.get("/check-videos")  # Poll again while the index is unchanged.
+            page = self.app.get("/")  # Render the gallery.
+        self.assertEqual(mock_file_names.call_count, 1)  # Assert that later requests were served from the cache.
+        revalidated = self.app.get("/check-videos", headers={"If-Modified-Since": first.headers["Last-Modified"]})  # Revalidate by date.
+        self.assertEqual(revalidated.status_code, 304)  # Assert that the date validator is honoured.
+
+        self.index.add({"file_name": "incident_2024-05-01_09-00-00", "start_time": "2024-05-01 09:00:00", "detections": {}})  # Index a segment-mode incident, which has no video file.
+        second = self.app.get("/check-videos", headers={"If-None-Match": first.headers["ETag"]})  # Poll with the old ETag.
+        gallery = self.app.get("/", headers={"If-None-Match": page.headers["ETag"]})  # Revalidate the gallery too.
+
+        self.assertEqual(second.status_code, 200)  # Assert that the new list is sent.
+        self.assertEqual(second.json, ["video1.webm", "incident_2024-05-01_09-00-00"])  # Assert that it contains the new incident.
+        self.assertNotEqual(second.headers["ETag"], first.headers["ETag"])  # Assert that the validator changed.
+        self.assertEqual(gallery.status_code, 200)  # Assert that the gallery is rendered again.
+
+    def test_old_recordings_are_imported_after_the_recorder_wrote_first(self):  # Define a test method for the one-off import.
+        with open(os.path.join(self.videos, "output_2024-04-30_08-00-00.webm"), "wb") as f:  # Write a recording made before the index existed.
+            f.write(b"video")
+        with open(os.path.join(self.videos, "output_2024-04-30_08-00-00.webm.json"), "w") as f:  # Write its metadata.
+            json.dump({"file_name": "output_2024-04-30_08-00-00.webm", "start_time": "2024-04-30 08:00:00", "detections": {}}, f)
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # The recorder indexes a new incident before the dashboard opens.
+
+        response = self.app.get("/check-videos")  # Open the dashboard.
+
+        self.assertEqual(response.json, ["output_2024-04-30_08-00-00.webm", "video1.webm"])  # Assert that the old recording was imported too.
+        self.assertTrue(self.index.imported())  # Assert that the import is remembered.
+
+    def test_deleted_and_replaced_recording_changes_the_validator(self):  # Define a test method for reused names.
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index one recording.
+        first = self.app.get("/check-videos")  # Poll once to get the ETag.
+
+        self.index.remove("video1.webm")  # Delete it.
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Record one with the same name.
+        second = self.app.get("/check-videos", headers={"If-None-Match": first.headers["ETag"]})  # Poll with the old ETag.
+
+        self.assertEqual(second.status_code, 200)  # Assert that the change is not hidden by the identical list.
+
+    def test_event_broker_fans_out_and_drops_for_slow_clients(self):  # Define a test method for the event broker.
+        broker = EventBroker(client_queue_size=1)  # Buffer one event per client.
+        first, second = broker.subscribe(), broker.subscribe()  # Connect two clients.
+
+        broker.publish("video_added", {"file_name": "a.webm"})  # Publish an event.
+        broker.publish("video_added", {"file_name": "b.webm"})  # Publish another one before the clients read.
+
+        self.assertEqual(first.get_nowait(), ("video_added", {"file_name": "a.webm"}))  # Assert that the first client got the event.
+        self.assertEqual(second.qsize(), 1)  # Assert that the overflow was dropped instead of blocking.
+        broker.unsubscribe(first)  # Disconnect the first client.
+        self.assertEqual(broker.subscribers, [second])  # Assert that only the second client remains.
+        self.assertEqual(format_sse("video_added", {"file_name": "a.webm"}), 'event: video_added\ndata: {"file_name": "a.webm"}\n\n')  # Assert the wire format.
+
+    def test_event_streams_are_capped(self):  # Define a test method for the event stream limit.
+        with patch("app.events", EventBroker(max_subscribers=1)), patch("app.index_watcher"):  # Allow one stream.
+            first = self.app.get("/events")  # Open one stream.
+            second = self.app.get("/events")  # Open another one.
+            first.close()  # Disconnect the first dashboard.
+            third = self.app.get("/events")  # Connect again.
+            third.close()  # Disconnect it.
+
+        self.assertEqual(first.status_code, 200)  # Assert that the first dashboard is streamed.
+        self.assertEqual(second.status_code, 503)  # Assert that the second one is told to poll instead.
+        self.assertEqual(second.headers["Retry-After"], "60")  # Assert that it is told when to try again.
+        self.assertEqual(third.status_code, 200)  # Assert that a closed stream frees its slot.
+
+    def test_index_watcher_publishes_changes(self):  # Define a test method for the index watcher.
+        broker = MagicMock()  # Mock the event broker.
+        self.index.add({"file_name": "old.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index one recording.
+        watcher = IndexWatcher(broker)  # Create a watcher.
+        watcher.last_version = self.index.version()  # Pretend the index was listed.
+        watcher.known_videos = {"old.webm"}  # Pretend one recording existed.
+
+        with patch.object(self.index, "file_names", wraps=self.index.file_names) as mock_file_names:  # Count index listings.
+            for _ in range(5):  # Check for changes several times.
+                watcher.check()
+        broker.publish.assert_not_called()  # Assert that nothing is published.
+        mock_file_names.assert_not_called()  # Assert that an unchanged index is not listed.
+
+        self.index.remove("old.webm")  # Another process deletes the recording.
+        self.index.add({"file_name": "incident_2024-05-01_09-00-00", "start_time": "2024-05-01 09:00:00", "detections": {}})  # And indexes a segment incident.
+        watcher.check()  # Check for changes.
+        broker.publish.assert_any_call("video_added", {"file_name": "incident_2024-05-01_09-00-00"})  # Assert that the incident without a video is published.
+        broker.publish.assert_any_call("video_deleted", {"file_name": "old.webm"})  # Assert that the deleted recording is published.
+
+    def test_delete_video(self):  # Define a test method for the /delete-video endpoint.
+        for name in ("video1.webm", "video1.webm.json", "video2.webm"):  # Write fake recordings into the temporary folder.
+            with open(os.path.join(self.videos, name), "wb") as f:
+                f.write(b"{}")
+        self.index.add({"file_name": "video1.webm", "start_time": "2024-05-01 08:00:00", "detections": {}})  # Index the recording.
 
         response = self.app.post("/delete-video", json={"file_name": "video1.webm"})  # Send a POST request to the /delete-video endpoint with the file name.
 
         self.assertEqual(response.status_code, 200)  # Assert that the response status code is 200.
         self.assertEqual(response.json, {"success": "video1.webm deleted successfully"})  # Assert that the response JSON contains the expected success message.
-        mock_remove.assert_called()  # Assert that the os.remove function was called.
+        self.assertEqual(sorted(os.listdir(self.videos)), ["video2.webm"])  # Assert that only the recording and its metadata were removed.
+        self.assertEqual(self.index.file_names(), [])  # Assert that it was removed from the index.
 
     @patch("subprocess.run")  # Mock the subprocess.run function.
     def test_run_main(self, mock_run):  # Define a test method for the /run-main endpoint.
@@ -42,12 +156,143 @@ class TestApp(unittest.TestCase):  # Define a test case class inheriting from un
 
         self.assertEqual(response.status_code, 200)  # Assert that the response status code is 200.
 
+    def test_video_gallery_uses_index(self):  # Define a test method for the paged gallery.
+        index = self.index  # The temporary index used by the app.
+        for day in (1, 2):  # Index two recordings on different days.
+            index.add({"file_name": f"output_2024-05-0{day}_08-00-00.webm", "start_time": f"2024-05-0{day} 08:00:00", "detections": {}})
+
+        with patch("app.incident_index", index):  # Use the temporary index in the app.
+            response = self.app.get("/?date=2024-05-02")  # Request the gallery for one day.
+            cached = self.app.get("/?date=2024-05-02", headers={"If-None-Match": response.headers["ETag"]})  # Revalidate the page.
+            other = self.app.get("/?date=2024-05-01", headers={"If-None-Match": response.headers["ETag"]})  # Request another filter.
+
+        self.assertEqual(response.status_code, 200)  # Assert that the response status code is 200.
+        self.assertIn(b"output_2024-05-02_08-00-00.webm", response.data)  # Assert that the matching recording is shown.
+        self.assertNotIn(b"output_2024-05-01_08-00-00.webm", response.data)  # Assert that other days are filtered out.
+        self.assertEqual(cached.status_code, 304)  # Assert that an unchanged page is not rendered again.
+        self.assertEqual(other.status_code, 200)  # Assert that the validator depends on the filters.
+
+    def test_gallery_plays_every_segment_of_an_incident(self):  # Define a test method for incidents spanning several segments.
+        segments = [{"file": "segment_00000.mp4", "start": 55.0, "end": 60.0}, {"file": "segment_00001.mp4", "start": 0.0, "end": 4.0}]  # An incident crossing a segment boundary.
+        self.index.add({"file_name": "incident_2024-05-01_09-00-00", "start_time": "2024-05-01 09:00:00", "detections": {}, "segments": segments})  # Index it.
+
+        response = self.app.get("/")  # Render the gallery.
+
+        self.assertIn(b"/videos/segment_00000.mp4#t=55.0,60.0", response.data)  # Assert that playback starts in the first segment.
+        self.assertIn(b"/videos/segment_00001.mp4", response.data)  # Assert that the following segment is in the playlist.
+        self.assertIn(b"&#34;start&#34;: 0.0", response.data)  # Assert that the playlist is escaped JSON with each span.
+
+    def test_incident_index_is_opened_lazily(self):  # Define a test method for importing the app.
+        with patch("app.incident_index", None), patch("app.IncidentIndex") as mock_index:  # Pretend the index was never used.
+            import app as app_module  # The app module, for its index accessor.
+            first = app_module.get_incident_index()  # Use the index.
+            second = app_module.get_incident_index()  # Use it again.
+
+        mock_index.assert_called_once_with()  # Assert that the database is opened on first use only.
+        self.assertIs(first, second)  # Assert that it is shared.
+
+    def test_play_video_range_requests(self):  # Define a test method for video playback.
+        with open(os.path.join(self.videos, "video1.webm"), "wb") as f:  # Write a fake recording.
+            f.write(bytes(range(100)))
+        for name in ("segment_00000.mp4", "segment_00000.mkv"):  # Write fake stream-copied segments.
+            with open(os.path.join(self.videos, name), "wb") as f:
+                f.write(bytes(10))
+
+        wrapped = []  # Files handed to the server's file wrapper.
+        def file_wrapper(file, block_size):  # Stand in for waitress' wsgi.file_wrapper.
+            wrapped.append(file.tell())  # Remember where the file was positioned.
+            return iter([file.read(block_size)[:20]])  # Let the server send Content-Length bytes.
+
+        full = self.app.get("/videos/video1.webm")  # Request the whole file.
+        partial = self.app.get("/videos/video1.webm", headers={"Range": "bytes=10-29"})  # Request a range.
+        fast = self.app.get("/videos/video1.webm", headers={"Range": "bytes=40-59"}, environ_overrides={"wsgi.file_wrapper": file_wrapper})  # Request a range from waitress.
+        missing = self.app.get("/videos/../recorded_videos/missing.webm")  # Request a file that does not exist.
+        other = self.app.get("/videos/video1.webm.json")  # Request a file that is not a video.
+        segments = [self.app.get(f"/videos/segment_00000.{extension}") for extension in ("mp4", "mkv")]  # Request the segments.
+
+        self.assertEqual(full.status_code, 200)  # Assert that the whole file is served.
+        self.assertEqual(full.headers["Accept-Ranges"], "bytes")  # Assert that seeking is advertised.
+        self.assertEqual(partial.status_code, 206)  # Assert that the range is served as partial content.
+        self.assertEqual(partial.headers["Content-Range"], "bytes 10-29/100")  # Assert the range header.
+        self.assertEqual(partial.data, bytes(range(10, 30)))  # Assert that only the range is sent.
+        self.assertEqual(wrapped[-1], 40)  # Assert that the body handed to the server starts at the range.
+        self.assertEqual(fast.data, bytes(range(40, 60)))  # Assert that the file wrapper sends the range.
+        self.assertEqual(missing.status_code, 404)  # Assert that missing files are not found.
+        self.assertEqual(other.status_code, 404)  # Assert that only videos are served.
+        self.assertEqual(full.mimetype, "video/webm")  # Assert the type of incident recordings.
+        self.assertEqual([segment.mimetype for segment in segments], ["video/mp4", "video/x-matroska"])  # Assert that stream-copied segments play with their own type.
+
+    def test_video_thumbnail(self):  # Define a test method for posters and previews.
+        videos = self.videos  # The temporary recordings directory.
+        writer = cv2.VideoWriter(os.path.join(videos, "video1.webm"), cv2.VideoWriter_fourcc(*"VP80"), 10.0, (64, 48))  # Write a short recording.
+        for _ in range(10):
+            writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+        writer.release()
+        with open(os.path.join(videos, "video1.webm.json"), "w") as f:  # Write its metadata.
+            f.write("{}")
+        with patch("app.thumbnail_cache", ThumbnailCache(os.path.join(self.static, "cache"))):  # Use a temporary cache.
+            poster = self.app.get("/thumbnails/video1.webm/poster")  # Request the poster.
+            preview = self.app.get("/thumbnails/video1.webm/preview")  # Request the preview.
+            missing = self.app.get("/thumbnails/video2.webm/poster")  # Request the poster of an unknown recording.
+            outside = self.app.get("/thumbnails/../secret/poster")  # Request a file outside the recordings.
+
+        self.assertEqual(poster.status_code, 200)  # Assert that the poster is served.
+        self.assertEqual(poster.mimetype, "image/jpeg")  # Assert that it is a JPEG.
+        self.assertEqual(preview.mimetype, "video/webm")  # Assert that the preview is a WebM video.
+        self.assertEqual(missing.status_code, 404)  # Assert that unknown recordings are not found.
+        self.assertEqual(outside.status_code, 404)  # Assert that paths cannot leave the recordings directory.
+
+    def test_live_view(self):  # Define a test method for the live MJPEG stream.
+        self.assertEqual(self.app.get("/live").status_code, 404)  # Assert that nothing is served before the system runs.
+
+        system = MagicMock()  # Mock a running surveillance system.
+        system.live_stream = LiveStream()  # Give it a real live stream.
+        system.live_stream.publish(np.zeros((48, 64, 3), dtype=np.uint8))  # Publish a frame.
+        with patch("app.live_system", system):  # Pretend the system was started from the dashboard.
+            response = self.app.get("/live")  # Open the live stream.
+            part = next(response.response)  # Read the first frame.
+            response.close()  # Disconnect the viewer.
+
+        self.assertTrue(response.mimetype.startswith("multipart/x-mixed-replace"))  # Assert the MJPEG content type.
+        self.assertTrue(part.startswith(b"--frame\r\nContent-Type: image/jpeg"))  # Assert the part header.
+        self.assertIn(b"\xff\xd8", part)  # Assert that the part carries a JPEG.
+
+    def test_worker_control(self):  # Define a test method for the camera worker API.
+        supervisor = MagicMock()  # Mock the worker supervisor.
+        supervisor.start.return_value = ["gate"]  # The worker was started.
+        supervisor.status.return_value = {"gate": {"state": "running"}}  # And now runs.
+        supervisor.stop.side_effect = KeyError("garage")  # There is no such worker.
+        with patch("app.supervisor", supervisor):  # Use the mock instead of starting processes.
+            status = self.app.get("/workers")  # Report on the workers.
+            started = self.app.post("/workers/gate/start")  # Start a worker.
+            unknown = self.app.post("/workers/garage/stop")  # Stop an unknown worker.
+
+        self.assertEqual(status.get_json(), {"gate": {"state": "running"}})  # Assert that the status is returned.
+        supervisor.start.assert_called_once_with("gate")  # Assert that the worker was started.
+        self.assertEqual(started.get_json()["workers"], ["gate"])  # Assert that the started worker is reported.
+        self.assertEqual(unknown.status_code, 404)  # Assert that unknown workers are not found.
+
+    def test_worker_live_view(self):  # Define a test method for the live view of a worker process.
+        bus = FrameBus(create=True, width=64, height=48)  # Create a frame bus.
+        self.addCleanup(bus.close)  # Free it after the test.
+        bus.publish(np.zeros((48, 64, 3), dtype=np.uint8))  # Publish a frame, as the worker does.
+        supervisor = MagicMock()  # Mock the worker supervisor.
+        supervisor.buses = {"gate": bus}  # It owns the bus.
+        with patch("app.supervisor", supervisor):  # Use the mock instead of starting processes.
+            self.assertEqual(self.app.get("/live/garage").status_code, 404)  # Assert that unknown cameras are not found.
+            response = self.app.get("/live/gate")  # Open the live stream.
+            part = next(response.response)  # Read the first frame.
+            response.close()  # Disconnect the viewer.
+
+        jpeg = part[part.index(b"\r\n\r\n") + 4 : -2]  # The JPEG of the first part.
+        self.assertEqual(cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR).shape, (48, 64, 3))  # Assert that the frame came from the bus.
+
     @patch("waitress.serve")  # Mock the waitress.serve function.
     @patch("app.app.run")  # Mock the app.run function in the app module.
     def test_start_flask(self, mock_run, mock_serve):  # Define a test method for the start_flask function.
         start_flask(app=app, port=5000, host="0.0.0.0")  # Call the start_flask function with the app, port, and host.
 
-        mock_serve.assert_called_once_with(app, port=5000, host="0.0.0.0")  # Assert that the waitress.serve function was called with the correct arguments.
+        mock_serve.assert_called_once_with(app, port=5000, host="0.0.0.0", threads=8)  # Assert that the waitress.serve function was called with the correct arguments.
         mock_run.assert_not_called()  # Assert that the app.run function was not called.
 
 if __name__ == "__main__":  # Check if the script is being run directly.
@@ -0,0 +1,70 @@
+import unittest  # Import the unittest module for creating and running tests.
+import numpy as np  # Import numpy for creating dummy frames.
+import supervision as sv  # Import supervision for building detections.
+from framebus import FrameBus  # Import the FrameBus class from the framebus module.
+
+
+class TestFrameBus(unittest.TestCase):  # Define a test case class for the shared memory frame bus.
+
+    def setUp(self):  # Define the setup method to create a small bus.
+        self.bus = FrameBus(create=True, slots=3, width=64, height=48, max_detections=2)  # Three 64x48 slots.
+        self.addCleanup(self.bus.close)  # Free it after the test.
+        self.reader = FrameBus(self.bus.name)  # Attach to it, as the web server does.
+
+    def tearDown(self):  # Define the teardown method to detach the reader.
+        self.reader.close()
+
+    def test_frame_and_detections_are_shared(self):  # Define a test method for publishing a frame.
+        frame = np.random.randint(0, 255, (48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Three detections, one more than the slots hold.
+            xyxy=np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]], dtype=np.float32),
+            confidence=np.array([0.9, 0.8, 0.7]),
+            class_id=np.array([0, 2, 0]),
+            tracker_id=np.array([7, 8, 9]),
+        )
+
+        self.assertIsNone(self.reader.latest())  # Assert that nothing was published yet.
+        self.assertEqual(self.bus.publish(frame, detections, timestamp=12.5), 1)  # Publish the frame.
+        view = self.reader.latest()  # Read it from the other handle.
+
+        self.assertEqual((self.reader.width, self.reader.height, self.reader.slots), (64, 48, 3))  # Assert that the reader found the geometry.
+        self.assertEqual((view.sequence, view.timestamp), (1, 12.5))  # Assert the slot header.
+        np.testing.assert_array_equal(view.frame, frame)  # Assert that the frame came through.
+        self.assertFalse(view.frame.flags.writeable)  # Assert that readers cannot change the slot.
+        self.assertEqual(view.detections["tracker_id"].tolist(), [7, 8])  # Assert that the detections are capped.
+        self.assertEqual(view.detections["xyxy"][1].tolist(), [5, 6, 7, 8])  # Assert the boxes.
+        self.assertEqual(view.detections["class_id"].tolist(), [0, 2])  # Assert the classes.
+        del view  # Release the shared memory before closing.
+
+    def test_overwritten_frames_are_detected(self):  # Define a test method for the ring of slots.
+        frames = [np.full((48, 64, 3), value, dtype=np.uint8) for value in range(5)]  # Create five frames.
+        self.bus.publish(frames[0])  # Publish the first one.
+        first = self.reader.latest()  # A reader starts using it.
+
+        for frame in frames[1:3]:  # Publish as many frames as the ring has other slots.
+            self.bus.publish(frame)
+        still_valid = self.reader.valid(first)  # The first slot has not been reused yet.
+        self.bus.publish(frames[3])  # Reuse the first slot.
+
+        self.assertTrue(still_valid)  # Assert that readers get slots - 1 frames of time.
+        self.assertFalse(self.reader.valid(first))  # Assert that the reader learns its frame was overwritten.
+        self.assertIsNone(self.reader.read(1))  # Assert that the old frame cannot be read again.
+        self.assertEqual(self.reader.latest().frame[0, 0, 0], 3)  # Assert that the newest frame is returned.
+        del first  # Release the shared memory before closing.
+
+    def test_oversized_frames_are_skipped(self):  # Define a test method for the slot size.
+        self.assertIsNone(self.bus.publish(np.zeros((96, 64, 3), dtype=np.uint8)))  # Publish a frame that is too tall.
+        self.assertEqual(self.bus.skipped, 1)  # Assert that it was counted.
+        self.assertEqual(self.bus.publish(np.zeros((24, 32, 3), dtype=np.uint8)), 1)  # Assert that smaller frames fit.
+        self.assertEqual(self.reader.wait(0, timeout=0).frame.shape, (24, 32, 3))  # Assert that they keep their size.
+
+
+    def test_viewers_mark_the_bus_as_watched(self):  # Define a test method for the live view heartbeat.
+        self.assertFalse(self.bus.watched())  # Assert that a new bus is not watched.
+        self.reader.touch()  # A live viewer polls the bus.
+        self.assertTrue(self.bus.watched())  # Assert that the writer sees the viewer.
+        self.assertFalse(self.bus.watched(within=0))  # Assert that the heartbeat expires.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
@@ -0,0 +1,79 @@
+import unittest  # Import the unittest module for creating and running tests.
+import os  # Import the os module for interacting with the operating system.
+import json  # Import the json module for writing metadata files.
+import tempfile  # Import tempfile for a throwaway index database.
+import shutil  # Import shutil for removing the temporary directory.
+from incident_index import IncidentIndex  # Import the IncidentIndex class from the incident_index module.
+
+
+def make_metadata(file_name, start_time, class_names):  # Define a helper building recording metadata.
+    return {
+        "file_name": file_name,
+        "start_time": start_time,
+        "end_time": start_time,
+        "total_duration": 5.0,
+        "detections": {
+            str(tracker_id): {"class_name": class_name}
+            for tracker_id, class_name in enumerate(class_names)
+        },
+    }
+
+
+class TestIncidentIndex(unittest.TestCase):  # Define a test case class for the incident index.
+
+    def setUp(self):  # Define the setup method to create an empty index.
+        self.directory = tempfile.mkdtemp()  # Create a temporary directory.
+        self.addCleanup(shutil.rmtree, self.directory)  # Remove it after the test.
+        self.index = IncidentIndex(os.path.join(self.directory, "incidents.db"))  # Create the index.
+        self.addCleanup(self.index.connection.close)  # Close the database after the test.
+
+    def test_query_pages_most_recent_first(self):  # Define a test method for pagination.
+        for minute in range(5):  # Index five recordings.
+            self.index.add(make_metadata(f"output_{minute}.webm", f"2024-05-01 12:0{minute}:00", ["person"]))
+
+        first_page, total = self.index.query(page=1, per_page=2)  # Get the first page.
+        last_page, _ = self.index.query(page=3, per_page=2)  # Get the last page.
+
+        self.assertEqual(total, 5)  # Assert that all recordings are counted.
+        self.assertEqual([video["file_name"] for video in first_page], ["output_4.webm", "output_3.webm"])  # Assert that the newest come first.
+        self.assertEqual([video["file_name"] for video in last_page], ["output_0.webm"])  # Assert that the oldest is on the last page.
+        self.assertEqual(first_page[0]["metadata"]["total_duration"], 5.0)  # Assert that the metadata is returned.
+
+    def test_query_filters_by_date_and_class(self):  # Define a test method for filtering.
+        self.index.add(make_metadata("a.webm", "2024-05-01 08:00:00", ["person", "person", "dog"]))  # Index a recording with people and a dog.
+        self.index.add(make_metadata("b.webm", "2024-05-02 08:00:00", ["car"]))  # Index a recording with a car.
+
+        self.assertEqual(self.index.query(date="2024-05-02")[1], 1)  # Assert that the date filter matches one recording.
+        dogs, _ = self.index.query(class_name="dog")  # Filter by class.
+        self.assertEqual([video["file_name"] for video in dogs], ["a.webm"])  # Assert that only the dog recording matches.
+        self.assertEqual(self.index.class_names(), ["car", "dog", "person"])  # Assert that the detected classes are listed.
+
+        self.index.remove("a.webm")  # Remove a recording.
+        self.assertEqual(self.index.query(class_name="dog")[1], 0)  # Assert that its classes were removed too.
+
+    def test_version_changes_with_every_write(self):  # Define a test method for the change counter.
+        self.assertEqual(self.index.version(), 0)  # Assert that a new index has never been written.
+        self.index.add(make_metadata("output_0.webm", "2024-05-01 12:00:00", ["person"]))  # Index a recording.
+        added = self.index.version()  # The version after adding it.
+        self.index.remove("output_0.webm")  # Remove it.
+        self.index.add(make_metadata("output_0.webm", "2024-05-01 12:00:00", ["person"]))  # Index it again.
+
+        self.assertEqual(len({0, added, self.index.version()}), 3)  # Assert that the same list still has a new version.
+        other = IncidentIndex(self.index.path)  # Open the index from another connection.
+        self.addCleanup(other.connection.close)  # Close it after the test.
+        self.assertEqual(other.version(), self.index.version())  # Assert that other connections see it.
+
+    def test_rebuild_from_metadata_files(self):  # Define a test method for indexing existing recordings.
+        with open(os.path.join(self.directory, "output_1.webm.json"), "w") as f:  # Write a metadata file.
+            json.dump(make_metadata("output_1.webm", "2024-05-01 08:00:00", ["person"]), f)
+        with open(os.path.join(self.directory, "objects.json"), "w") as f:  # Write an unrelated JSON file.
+            json.dump({"0": "person"}, f)
+
+        self.assertFalse(self.index.imported())  # Assert that a new index has not imported anything.
+        self.assertEqual(self.index.rebuild(self.directory), 1)  # Assert that only the recording is indexed.
+        self.assertEqual(self.index.count(), 1)  # Assert that the index holds one recording.
+        self.assertTrue(self.index.imported())  # Assert that the import is remembered.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
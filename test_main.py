@@ -2,8 +2,33 @@ import unittest  # Import the unittest module for creating and running tests.
 from unittest.mock import patch, MagicMock  # Import patch and MagicMock for mocking dependencies.
 import numpy as np  # Import numpy for numerical operations, particularly for creating arrays.
 import os  # Import the os module for interacting with the operating system.
-from main import SurveillanceSystem  # Import the SurveillanceSystem class from the main module.
+from main import (  # Import the surveillance classes and helpers from the main module.
+    FrameSkipScheduler,
+    LiveStream,
+    MotionGate,
+    MultiCameraSurveillanceSystem,
+    PreEventBuffer,
+    SegmentRecorder,
+    TrackStore,
+    SurveillanceSystem,
+    VideoWriterWorker,
+    empty_detections,
+    load_model,
+    recover_metadata,
+    tile_windows,
+    parse_source,
+    put_latest,
+)
 import json  # Import the json module for handling JSON data.
+import queue  # Import the queue module for testing the bounded stage queues.
+import threading  # Import threading for controlling the writer thread.
+import time  # Import time for slowing down the mock encoder.
+import datetime  # Import datetime for the recording start time.
+import tempfile  # Import tempfile for writing recordings and track stores.
+import shutil  # Import shutil for removing temporary recordings.
+import supervision as sv  # Import supervision for building empty detections.
+import cv2  # Import OpenCV for counting decoded frames.
+from alert_policy import AlertPolicy  # Import the AlertPolicy class for configuring the hysteresis.
 
 class TestSurveillanceSystem(unittest.TestCase):  # Define a test case class inheriting from unittest.TestCase.
 
@@ -13,7 +38,10 @@ class TestSurveillanceSystem(unittest.TestCase):  # Define a test case class inh
     )
     @patch("cv2.VideoCapture")  # Patch the cv2.VideoCapture class to mock the camera.
     def setUp(self, mock_video_capture):  # Define the setup method to initialize the test environment.
-        self.system = SurveillanceSystem()  # Create an instance of the SurveillanceSystem class.
+        video_directory = tempfile.mkdtemp()  # Record into a temporary directory.
+        self.addCleanup(shutil.rmtree, video_directory)  # Remove the recordings after the test.
+        self.system = SurveillanceSystem(video_directory=video_directory, incident_index=MagicMock())  # Create a system that keeps test recordings out of the real directory and gallery index.
+        self.system.alert_policy = AlertPolicy(start_frames=1, stop_frames=1)  # Start and stop recordings on the first frame.
         self.system.camera = MagicMock()  # Mock the camera object.
         self.system.camera.read.return_value = (  # Set the return value of the camera's read method.
             True,
@@ -31,10 +59,10 @@ class TestSurveillanceSystem(unittest.TestCase):  # Define a test case class inh
 
         response = self.system.send_telegram_message("Test message")  # Call the method to send a Telegram message.
         self.assertTrue(response["ok"])  # Assert that the response indicates success.
-        mock_https_connection.assert_called_once_with("api.telegram.org")  # Assert that the HTTPSConnection was called with the correct host.
+        mock_https_connection.assert_called_once_with("api.telegram.org", None, timeout=10.0)  # Assert that the HTTPSConnection was called with the correct host.
         mock_conn.request.assert_called_once_with(  # Assert that the request was made with the correct parameters.
             "POST",
-            f"https://api.telegram.org/bot{self.system.bot_token}/sendMessage",
+            f"/bot{self.system.bot_token}/sendMessage",
             body=json.dumps({"chat_id": self.system.chat_id, "text": "Test message"}),
             headers={"Content-Type": "application/json"},
         )
@@ -51,22 +79,668 @@ class TestSurveillanceSystem(unittest.TestCase):  # Define a test case class inh
         frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
         response = self.system.send_telegram_frame(frame, "test_frame.jpg")  # Call the method to send a Telegram frame.
         self.assertTrue(response["ok"])  # Assert that the response indicates success.
-        mock_https_connection.assert_called_once_with("api.telegram.org")  # Assert that the HTTPSConnection was called with the correct host.
+        mock_https_connection.assert_called_once_with("api.telegram.org", None, timeout=10.0)  # Assert that the HTTPSConnection was called with the correct host.
         mock_conn.request.assert_called_once()  # Assert that the request was made.
 
-    @patch.object(SurveillanceSystem, "send_telegram_message")  # Patch the send_telegram_message method of the SurveillanceSystem class.
-    @patch.object(SurveillanceSystem, "send_telegram_frame")  # Patch the send_telegram_frame method of the SurveillanceSystem class.
-    @patch("concurrent.futures.ThreadPoolExecutor")  # Patch the ThreadPoolExecutor class to mock threading.
-    def test_run_telegram_tasks_in_thread(  # Define a test method for running Telegram tasks in a thread.
-        self, mock_executor, mock_send_frame, mock_send_message
-    ):
-        mock_executor_instance = MagicMock()  # Create a mock executor instance.
-        mock_executor.return_value = mock_executor_instance  # Set the return value of the mocked ThreadPoolExecutor.
+    def test_run_telegram_tasks_in_thread(self):  # Define a test method for running Telegram tasks in a thread.
+        self.system.notifier = MagicMock()  # Mock the notification dispatcher.
 
         frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
         self.system.run_telegram_tasks_in_thread("Test message", frame)  # Call the method to run Telegram tasks in a thread.
 
-        mock_executor_instance.submit.assert_called_once()  # Assert that the submit method of the executor was called once.
+        self.system.notifier.notify.assert_called_once_with("Test message", frame)  # Assert that the alert was queued for the dispatcher.
+
+    def test_put_latest_drops_stalest_item(self):  # Define a test method for the stale-frame drop policy.
+        stage_queue = queue.Queue(maxsize=2)  # Create a bounded stage queue.
+        self.assertEqual(put_latest(stage_queue, 1), 0)  # Assert that nothing is dropped while there is room.
+        self.assertEqual(put_latest(stage_queue, 2), 0)  # Fill the queue.
+        self.assertEqual(put_latest(stage_queue, 3), 1)  # Assert that the stalest item is dropped when full.
+        self.assertEqual([stage_queue.get(), stage_queue.get()], [2, 3])  # Assert that the freshest items are kept in order.
+
+    def test_frame_skip_always_processes_the_newest_frame(self):  # Define a test method for bounded latency.
+        frames = [np.full((48, 64, 3), index, dtype=np.uint8) for index in range(10)]  # Number ten frames.
+        def read():  # Deliver a frame every 10 ms, like a camera, then fail.
+            time.sleep(0.01)
+            return (True, frames.pop(0)) if frames else (False, None)
+        self.system.camera.read.side_effect = read
+        self.system.frame_skip = FrameSkipScheduler(target_fps=20)  # Enable adaptive frame skipping.
+        self.system.headless = True  # No OpenCV window.
+        self.system.shutdown = MagicMock()  # Keep the camera mock inspectable.
+        processed = []  # Numbers of the processed frames.
+        def process_frame(frame):  # Process more slowly than the camera delivers.
+            processed.append(int(frame[0, 0, 0]))
+            time.sleep(0.05)
+            return frame
+        self.system.process_frame = process_frame
+
+        self.system.run()  # Run until the camera stops.
+
+        self.assertLess(len(processed), 10)  # Assert that stale frames were skipped instead of queued up.
+        self.assertEqual(processed[-1], 9)  # Assert that the newest frame was processed.
+        self.assertEqual(processed, sorted(processed))  # Assert that frames are processed in order.
+
+    @patch("cv2.destroyAllWindows")  # Patch cv2.destroyAllWindows to avoid needing a display.
+    @patch("cv2.waitKey", return_value=-1)  # Patch cv2.waitKey so that the loop never quits on a key press.
+    @patch("cv2.imshow")  # Patch cv2.imshow to avoid needing a display.
+    def test_run_pipelined(self, mock_imshow, mock_wait_key, mock_destroy):  # Define a test method for the pipelined run mode.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        self.system.camera.read.side_effect = [(True, frame)] * 5 + [(False, None)]  # Return five frames, then fail.
+        self.system.detect = MagicMock(return_value=empty_detections())  # Mock detection to return no objects.
+        mock_imshow.side_effect = lambda *args: time.sleep(0.05)  # Make the display slow enough to drop processed frames.
+
+        self.system.run_pipelined()  # Run the pipelined stages until the camera stops.
+
+        self.assertGreater(self.system.detect.call_count, 0)  # Assert that the inference stage ran.
+        self.assertEqual(self.system.detect.call_count + self.system.dropped_captures, 5)  # Assert that every frame was either detected or dropped before detection.
+        self.system.camera.release.assert_called_once()  # Assert that the camera was released.
+
+    @patch("cv2.destroyAllWindows")  # Patch the cv2.destroyAllWindows function.
+    @patch("cv2.waitKey")  # Patch the cv2.waitKey function.
+    @patch("cv2.imshow")  # Patch the cv2.imshow function.
+    def test_headless_run_publishes_live_frames(self, mock_imshow, mock_wait_key, mock_destroy):  # Define a test method for headless mode.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        self.system.camera.read.side_effect = [(True, frame)] * 3 + [(False, None)]  # Return three frames, then fail.
+        self.system.process_frame = MagicMock(return_value=frame)  # Skip detection and recording.
+        self.system.headless = True  # Run without a window.
+
+        self.system.run()  # Run until the camera stops.
+
+        mock_imshow.assert_not_called()  # Assert that no window was opened.
+        mock_wait_key.assert_not_called()  # Assert that the loop did not poll the keyboard.
+        self.assertEqual(self.system.live_stream.sequence, 3)  # Assert that every frame went to the live viewers.
+
+    def test_processed_frames_are_published_to_the_frame_bus(self):  # Define a test method for the frame bus.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = empty_detections()  # No objects in the frame.
+        self.system.detect = MagicMock(return_value=detections)  # Skip the model.
+        self.system.frame_bus = MagicMock()  # Mock the frame bus of a worker process.
+
+        processed_frame = self.system.process_frame(frame)  # Process the frame as run() does.
+
+        self.system.frame_bus.publish.assert_called_once_with(processed_frame, detections)  # Assert that the shown frame and its detections were shared.
+
+    def test_parse_source(self):  # Define a test method for parsing camera sources.
+        self.assertEqual(parse_source("1"), 1)  # Assert that device indexes become integers.
+        self.assertEqual(parse_source("rtsp://camera/stream"), "rtsp://camera/stream")  # Assert that URLs are unchanged.
+
+    def test_motion_gate_skips_detection_when_idle(self):  # Define a test method for motion-gated inference.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        self.system.model = MagicMock()  # Mock the model to count inference calls.
+        self.system.motion_gate = MagicMock()  # Mock the motion gate.
+        self.system.motion_gate.has_motion.return_value = False  # Report a still scene.
+        self.system.last_inference_time = float("inf")  # Make sure the heartbeat is not due.
+
+        detections = self.system.detect(frame)  # Detect objects in the still frame.
+
+        self.assertEqual(len(detections), 0)  # Assert that no objects are reported.
+        self.system.model.assert_not_called()  # Assert that the detector was skipped.
+        self.assertFalse(self.system.should_run_inference(frame))  # Assert that the next still frame is skipped too.
+
+        self.system.motion_gate.has_motion.return_value = True  # Report motion.
+        self.assertTrue(self.system.should_run_inference(frame))  # Assert that motion switches detection back on.
+
+    def test_motion_gate_detects_change(self):  # Define a test method for the background-subtraction gate.
+        gate = MotionGate()  # Create a motion gate.
+        still = np.zeros((480, 640, 3), dtype=np.uint8)  # Create an empty scene.
+        for _ in range(10):  # Let the background model learn the empty scene.
+            gate.has_motion(still)
+        self.assertFalse(gate.has_motion(still))  # Assert that the still scene has no motion.
+        moved = still.copy()  # Create a frame with a bright object in it.
+        moved[100:300, 200:400] = 255
+        self.assertTrue(gate.has_motion(moved))  # Assert that the object is reported as motion.
+
+    def test_tile_windows_cover_frame(self):  # Define a test method for SAHI-style slicing.
+        self.assertEqual(tile_windows(640, 480, None, 0.2), [(0, 0, 640, 480)])  # Assert that tiling is off by default.
+        windows = tile_windows(1920, 1080, 640, 0.2)  # Slice a 1080p frame into 640 pixel tiles.
+        self.assertEqual(max(x2 for _, _, x2, _ in windows), 1920)  # Assert that the tiles reach the right edge.
+        self.assertEqual(max(y2 for _, _, _, y2 in windows), 1080)  # Assert that the tiles reach the bottom edge.
+        self.assertTrue(all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in windows))  # Assert that every tile has the tile size.
+
+    def test_roi_crop_maps_boxes_to_full_frame(self):  # Define a test method for region-of-interest cropping.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        self.system.roi_polygons = [np.array([[100, 200], [400, 200], [400, 480], [100, 480]])]  # Watch the lower middle of the frame.
+
+        images, offsets = self.system.preprocess(frame)  # Crop the frame to the region of interest.
+
+        self.assertEqual(images[0].shape[:2], (280, 301))  # Assert that only the bounding crop is sent to the model.
+        self.assertEqual(offsets, [(100, 200)])  # Assert that the crop offset is reported.
+
+        crop_detections = sv.Detections(  # Create detections in crop coordinates.
+            xyxy=np.array([[10, 10, 50, 50], [250, -190, 290, -150]], dtype=np.float32),
+            confidence=np.array([0.9, 0.9], dtype=np.float32),
+            class_id=np.array([0, 0]),
+        )
+        with patch("supervision.Detections.from_ultralytics", return_value=crop_detections):  # Use the crop detections as model output.
+            detections = self.system.merge_results(["result"], offsets, frame.shape)  # Map the detections back.
+
+        np.testing.assert_allclose(detections.xyxy, [[110, 210, 150, 250]])  # Assert that boxes are in full-frame coordinates and outside boxes are dropped.
+
+    def test_recording_starts_with_pre_event_frames(self):  # Define a test method for flushing the pre-event buffer.
+        self.system.pre_event_buffer = PreEventBuffer(seconds=5.0)  # Enable the pre-event buffer.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        for _ in range(3):  # Record three idle frames.
+            self.system.record_frame(empty_detections(), frame)
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+
+        with patch("main.VideoWriterWorker") as mock_writer:  # Patch the writer to count frames.
+            self.system.record_frame(detections, frame)  # Start recording.
+
+        self.assertEqual(mock_writer.return_value.write.call_count, 4)  # Assert that three buffered frames precede the detection.
+        self.assertEqual(self.system.metadata["pre_event_duration"], 3 / self.system.frame_rate)  # Assert that the lead-up is recorded in the metadata.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_pre_event_flush_waits_for_the_encoder(self, mock_video_writer):  # Define a test method for flushing into a small ring.
+        mock_video_writer.return_value.write.side_effect = lambda frame: time.sleep(0.001)  # Encode slowly.
+        self.system.video_writer = VideoWriterWorker(None, 0, self.system.frame_rate, (64, 48), slots=2)  # Use a two-slot ring.
+        self.system.pre_event_buffer = PreEventBuffer(seconds=5.0)  # Enable the pre-event buffer.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        for _ in range(10):  # Buffer more idle frames than the ring holds.
+            self.system.record_frame(empty_detections(), frame)
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+
+        self.system.begin_recording()  # Start recording and flush the buffer.
+
+        self.assertEqual(self.system.video_writer.dropped, 0)  # Assert that no buffered frame was dropped.
+        self.assertEqual(self.system.metadata["pre_event_duration"], 10 / self.system.frame_rate)  # Assert that the lead-up matches the queued frames.
+        self.system.video_writer.release()  # Encode the backlog and stop.
+        self.system.video_writer = None  # Nothing left to release in the cleanup.
+        self.assertEqual(mock_video_writer.return_value.write.call_count, 10)  # Assert that every buffered frame was encoded.
+
+    @patch("main.VideoWriterWorker")  # Patch the writer to avoid real encoding.
+    def test_segment_mode_indexes_incidents(self, mock_writer):  # Define a test method for segment recording.
+        self.system.segment_recorder = SegmentRecorder(  # Record two-second segments at ten frames per second.
+            self.system.video_directory, 10.0, segment_duration=2
+        )
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+        for _ in range(15):  # Record idle frames into the first segment.
+            self.system.record_frame(empty_detections(), frame)
+        for _ in range(10):  # Record an incident that crosses into the second segment.
+            self.system.record_frame(detections, frame)
+
+        segments = self.system.metadata["segments"]  # Get the incident's index entries.
+        self.assertEqual(len(segments), 2)  # Assert that the incident spans both segments.
+        self.assertEqual((segments[0]["start"], segments[0]["end"]), (1.5, 2.0))  # Assert the offsets into the first segment.
+        self.assertEqual((segments[1]["start"], segments[1]["end"]), (0.0, 0.5))  # Assert the offsets into the second segment.
+        self.assertEqual(mock_writer.call_count, 1)  # Assert that one encoder is shared by the segments.
+        self.assertEqual(mock_writer.return_value.open.call_count, 2)  # Assert that it switched to the second segment.
+        mock_writer.return_value.release.assert_not_called()  # Assert that the detection thread never waited for a segment to finish.
+        self.assertTrue(self.system.metadata["file_name"].startswith("incident_"))  # Assert that the incident has no video of its own.
+
+    @patch("main.VideoWriterWorker")  # Patch the writer to control dropped frames.
+    def test_segment_offsets_skip_dropped_frames(self, mock_writer):  # Define a test method for an overloaded encoder.
+        mock_writer.return_value.write.side_effect = [True, False, False, True, True]  # Drop two of five frames.
+        recorder = SegmentRecorder(self.system.video_directory, 10.0, segment_duration=60)  # Record at ten frames per second.
+
+        for _ in range(5):  # Write five frames.
+            recorder.write(np.zeros((48, 64, 3), dtype=np.uint8))
+
+        self.assertEqual(recorder.position()[1], 0.2)  # Assert that the last frame is the third one in the file.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_segments_are_encoded_by_one_thread(self, mock_video_writer):  # Define a test method for switching segment files.
+        recorder = SegmentRecorder(self.system.video_directory, 10.0, segment_duration=1)  # Record one-second segments at ten frames per second.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+
+        for _ in range(10):  # Fill the first segment.
+            recorder.write(frame)
+        thread = recorder.writer.thread  # The encoder thread of the first segment.
+        recorder.write(frame)  # Start the second segment.
+        second = recorder.writer.thread  # The encoder thread of the second segment.
+        recorder.release()  # Finish the last segment.
+
+        self.assertIs(second, thread)  # Assert that the encoder thread was reused.
+        self.assertEqual(mock_video_writer.call_count, 2)  # Assert that a file was opened per segment.
+        self.assertEqual(mock_video_writer.return_value.write.call_count, 11)  # Assert that every frame was encoded.
+        self.assertEqual(mock_video_writer.return_value.release.call_count, 2)  # Assert that both segments were finished.
+
+    @patch("main.VideoWriterWorker")  # Patch the writer to control dropped frames.
+    def test_track_skips_frames_dropped_by_the_writer(self, mock_writer):  # Define a test method for the overlay timeline.
+        mock_writer.return_value.write.side_effect = [True, False, True]  # Drop the second frame.
+        self.system.record_raw = True  # Record raw frames plus a detection track.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 2, 10, 20]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([5]),
+        )
+
+        for _ in range(3):  # Record three frames.
+            self.system.record_frame(detections, np.zeros((48, 64, 3), dtype=np.uint8))
+        self.system.metadata_writer.sync()  # Write the track to disk.
+
+        tracks_path = os.path.join(self.system.video_directory, self.system.metadata["tracks_file"])  # Get the track file path.
+        with open(tracks_path) as f:  # Read the detection track.
+            times = [json.loads(line)["t"] for line in f if '"t"' in line]
+        self.assertEqual(self.system.frame_count, 2)  # Assert that only the encoded frames are counted.
+        self.assertEqual(times, [0.0, 1 / self.system.frame_rate])  # Assert that the track follows the video.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_raw_recording_writes_detection_track(self, mock_writer):  # Define a test method for raw recording.
+        self.system.record_raw = True  # Record raw frames plus a detection track.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 2, 10, 20]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([5]),
+        )
+
+        annotated = self.system.handle_detections(frame, detections)  # Record and display one frame.
+        self.system.release_video()  # Finish the recording.
+
+        recorded = mock_writer.return_value.write.call_args.args[0]  # Get the recorded frame.
+        self.assertFalse(recorded.any())  # Assert that the recorded frame carries no annotation.
+        self.assertTrue(annotated.any())  # Assert that the displayed frame is annotated.
+        tracks_path = os.path.join(self.system.video_directory, self.system.metadata["tracks_file"])  # Get the track file path.
+        with open(tracks_path) as f:  # Read the detection track.
+            lines = [json.loads(line) for line in f]
+        self.assertIn("class_names", lines[0])  # Assert that the header carries the labels.
+        self.assertEqual(lines[1], {"t": 0.0, "boxes": [[1.0, 2.0, 10.0, 20.0, 5, 0]]})  # Assert that the boxes of the frame are stored.
+
+    @patch("main.VideoWriterWorker")  # Patch the writer to avoid real encoding.
+    def test_raw_frames_are_annotated_only_when_displayed(self, mock_writer):  # Define a test method for headless raw recording.
+        self.system.record_raw = True  # Record raw frames plus a detection track.
+        self.system.headless = True  # No OpenCV window.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Capture the alerts.
+        self.system.annotate = MagicMock(side_effect=lambda frame, detections: frame + 1)  # Count the annotations.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 2, 10, 20]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([5]),
+        )
+
+        unwatched = self.system.handle_detections(frame, detections)  # Process a frame that starts an incident.
+        alerts = self.system.annotate.call_count  # Annotations made for the alert snapshot.
+        with self.system.live_stream.viewing():  # Connect a live viewer.
+            watched = self.system.handle_detections(frame, detections)  # Process a frame somebody watches.
+
+        self.assertIs(unwatched, frame)  # Assert that an unwatched frame is not drawn on.
+        self.assertEqual(alerts, 1)  # Assert that the alert snapshot still shows the boxes.
+        self.assertTrue(self.system.run_telegram_tasks_in_thread.call_args.args[1].any())  # Assert that the alert got the annotated snapshot.
+        self.assertTrue(watched.any())  # Assert that a watched frame is annotated.
+        self.assertFalse(self.system.live_stream.watched())  # Assert that the viewer is no longer counted.
+
+    @patch("main.VideoWriterWorker")  # Patch the writer to avoid real encoding.
+    def test_flickering_detection_does_not_start_recordings(self, mock_writer):  # Define a test method for the alert policy hysteresis.
+        self.system.alert_policy = AlertPolicy(start_frames=3, stop_frames=3)  # Require three frames to start and stop.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Capture the alerts.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+
+        for index in range(10):  # Let the person flicker in and out of view.
+            self.system.record_frame(detections if index % 2 else empty_detections(), frame)
+        self.assertFalse(self.system.is_recording)  # Assert that flicker did not start a recording.
+        for _ in range(5):  # Let the person stay in view.
+            self.system.record_frame(detections, frame)
+
+        self.assertTrue(self.system.is_recording)  # Assert that a steady detection starts recording.
+        self.assertEqual(mock_writer.call_count, 1)  # Assert that a single video was opened.
+        self.system.run_telegram_tasks_in_thread.assert_called_once()  # Assert that the person was reported once.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_short_gaps_extend_the_recording(self, mock_writer):  # Define a test method for the recording grace period.
+        self.system.recording_grace = 0.5  # Keep recording for ten frames after the incident ends.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        self.system.headless = True  # Do not touch OpenCV windows on shutdown.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+
+        for objects in [detections] * 5 + [empty_detections()] * 5 + [detections] * 5:  # The person disappears briefly.
+            self.system.record_frame(objects, frame)
+        self.assertTrue(self.system.is_recording)  # Assert that the short gap did not stop the recording.
+        for _ in range(10):  # The person leaves.
+            self.system.record_frame(empty_detections(), frame)
+        self.assertFalse(self.system.is_recording)  # Assert that the recording stops after the grace period.
+        self.system.shutdown()  # Wait for the recording to be finalised.
+
+        self.assertEqual(mock_writer.call_count, 1)  # Assert that a single video was written.
+        self.assertEqual(mock_writer.return_value.write.call_count, 24)  # Assert that the gap and the grace period were recorded.
+        self.assertEqual(len([name for name in os.listdir(self.system.video_directory) if name.endswith(".webm.json")]), 1)  # Assert that one recording was finalised.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_grace_period_follows_the_policy_stop_frames(self, mock_writer):  # Define a test method for the documented stop delay.
+        self.system.alert_policy = AlertPolicy(start_frames=1, stop_frames=3)  # End incidents after three empty frames.
+        self.system.recording_grace = 0.25  # Then keep recording for five frames at 20 FPS.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+
+        self.system.record_frame(detections, frame)  # Start an incident.
+        for _ in range(6):  # The person leaves; the third empty frame ends the incident and is the first grace frame.
+            self.system.record_frame(empty_detections(), frame)
+        still_recording = self.system.is_recording  # Recording state before the last grace frame.
+        self.system.record_frame(empty_detections(), frame)  # The last grace frame.
+
+        self.assertTrue(still_recording)  # Assert that the grace period starts when the policy ends the incident.
+        self.assertFalse(self.system.is_recording)  # Assert that the recording stops after stop frames plus grace.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_long_incident_rolls_over(self, mock_writer):  # Define a test method for the maximum recording length.
+        self.system.record_duration = 0.5  # Roll over every ten frames.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Capture the alerts.
+        self.system.headless = True  # Do not touch OpenCV windows on shutdown.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 1, 10, 10]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([1]),
+        )
+
+        for _ in range(25):  # Keep the person in view for 25 frames.
+            self.system.record_frame(detections, frame)
+        writer = self.system.video_writer  # Remember the shared encoder.
+        self.system.shutdown()  # Wait for the recordings to be finalised.
+
+        self.assertIsNotNone(writer)  # Assert that the encoder was shared by the files.
+        self.assertEqual(mock_writer.call_count, 3)  # Assert that the incident was split into three files.
+        self.assertEqual(mock_writer.return_value.write.call_count, 25)  # Assert that no frame was lost at the rollovers.
+        self.system.run_telegram_tasks_in_thread.assert_called_once()  # Assert that rollovers do not alert again.
+        following = {}  # Maps each recording to the one it continues.
+        for name in os.listdir(self.system.video_directory):  # Read the finalised metadata.
+            if name.endswith(".webm.json"):
+                with open(os.path.join(self.system.video_directory, name)) as f:
+                    metadata = json.load(f)
+                following[metadata.get("continued_from")] = metadata["file_name"]
+        chain = [following[None]]  # Start with the recording that began the incident.
+        while chain[-1] in following:  # Follow the rollovers.
+            chain.append(following[chain[-1]])
+        self.assertEqual(len(chain), 3)  # Assert that the three files form one chain.
+
+    def test_interrupted_recording_metadata_is_recovered(self):  # Define a test method for crash recovery.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        self.system.async_writer = False  # Encode inline.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 2, 10, 20]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([5]),
+        )
+        with patch("cv2.VideoWriter"):  # Patch the cv2.VideoWriter class to avoid real encoding.
+            for _ in range(3):  # Record three frames.
+                self.system.record_frame(detections, frame)
+        self.system.metadata_writer.sync()  # Simulate the periodic flush before a crash.
+        file_name = self.system.metadata["file_name"]  # Get the recording's file name.
+
+        in_progress = recover_metadata(self.system.video_directory)  # Try to recover while the recording is still running.
+        self.system.metadata_writer.file.close()  # Simulate the crash, which releases the lock without a footer.
+        skipped = recover_metadata(self.system.video_directory, camera_name="gate")  # Let the other camera recover.
+        recovered = recover_metadata(self.system.video_directory)  # Recover without the recording being released.
+
+        self.assertEqual(in_progress, [])  # Assert that a recording still being written is left alone.
+        self.assertEqual(skipped, [])  # Assert that other cameras' recordings are left alone.
+        self.assertEqual(recovered, [file_name])  # Assert that the interrupted recording was recovered.
+        with open(os.path.join(self.system.video_directory, f"{file_name}.json")) as f:  # Read the recovered metadata.
+            metadata = json.load(f)
+        self.assertTrue(metadata["recovered"])  # Assert that the metadata is marked as recovered.
+        self.assertEqual(metadata["detections"]["5"]["frames"], 3)  # Assert that the detections were rebuilt.
+        self.assertEqual(recover_metadata(self.system.video_directory), [])  # Assert that complete recordings are left alone.
+
+
+    def test_metadata_is_synced_by_the_finalizer(self):  # Define a test method for syncing metadata off the detection thread.
+        self.system.run_telegram_tasks_in_thread = MagicMock()  # Avoid sending alerts.
+        self.system.async_writer = False  # Encode inline.
+        self.system.metadata_sync_interval = 0.01  # Sync often.
+        detections = sv.Detections(  # Create one tracked person.
+            xyxy=np.array([[1, 2, 10, 20]], dtype=np.float32),
+            class_id=np.array([0]),
+            tracker_id=np.array([5]),
+        )
+        synced = threading.Event()  # Set when fsync runs.
+        fsyncing_threads = []  # Threads that called fsync.
+
+        def fsync(fd):  # Record which thread syncs.
+            fsyncing_threads.append(threading.current_thread())
+            synced.set()
+
+        with patch("cv2.VideoWriter"), patch("os.fsync", side_effect=fsync):  # Avoid real encoding and count fsyncs.
+            for _ in range(3):  # Record three frames.
+                self.system.record_frame(detections, np.zeros((48, 64, 3), dtype=np.uint8))
+            self.assertTrue(synced.wait(5))  # Assert that the metadata was synced while recording.
+            self.system.shutdown()  # Finish the recording.
+
+        self.assertNotIn(threading.current_thread(), fsyncing_threads)  # Assert that the detection thread never waited for the disk.
+
+
+class TestLoadModel(unittest.TestCase):  # Define a test case class for the inference backend loader.
+
+    def test_unknown_backend_is_rejected(self):  # Define a test method for invalid configuration.
+        with self.assertRaises(ValueError):  # Assert that an unknown backend raises a ValueError.
+            load_model("yolov8n.pt", "tensorrt-nightly", warm_up=False)
+
+    @patch("os.path.exists", return_value=True)  # Pretend the exported model is already cached.
+    @patch("main.YOLO")  # Patch the YOLO class to avoid loading real weights.
+    def test_cached_export_is_reused(self, mock_yolo, mock_exists):  # Define a test method for the export cache.
+        load_model("yolov8n.pt", "onnx", warm_up=True)  # Load the ONNX backend.
+
+        mock_yolo.return_value.export.assert_not_called()  # Assert that the cached export was not redone.
+        mock_yolo.assert_called_with("yolov8n.onnx", task="detect")  # Assert that the exported model was loaded.
+        mock_yolo.return_value.assert_called_once()  # Assert that one warm-up inference ran.
+
+
+class TestVideoWriterWorker(unittest.TestCase):  # Define a test case class for the non-blocking encoder.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_frames_are_encoded_in_order(self, mock_video_writer):  # Define a test method for the writer thread.
+        worker = VideoWriterWorker("out.webm", 0, 20.0, (4, 4), slots=4)  # Create a worker with four slots.
+        for value in range(3):  # Queue three frames with different contents.
+            self.assertTrue(worker.write(np.full((4, 4, 3), value, dtype=np.uint8)))
+        worker.release()  # Encode the backlog and stop.
+
+        written = [call.args[0][0, 0, 0] for call in mock_video_writer.return_value.write.call_args_list]  # Collect the encoded frames.
+        self.assertEqual(written, [0, 1, 2])  # Assert that every frame was encoded in order.
+        mock_video_writer.return_value.release.assert_called_once()  # Assert that the encoder was released.
+
+    @patch("cv2.VideoWriter")  # Patch the cv2.VideoWriter class to avoid real encoding.
+    def test_full_ring_drops_instead_of_blocking(self, mock_video_writer):  # Define a test method for encoder overload.
+        encoding = threading.Event()  # Event that keeps the encoder busy.
+        mock_video_writer.return_value.write.side_effect = lambda frame: encoding.wait()  # Block the encoder.
+        worker = VideoWriterWorker("out.webm", 0, 20.0, (4, 4), slots=2)  # Create a worker with two slots.
+        frame = np.zeros((4, 4, 3), dtype=np.uint8)  # Create a dummy frame.
+
+        results = [worker.write(frame) for _ in range(5)]  # Write more frames than the ring holds.
+
+        self.assertEqual(results[:2], [True, True])  # Assert that the first frames were queued.
+        self.assertFalse(results[-1])  # Assert that the overflow was dropped instead of blocking.
+        self.assertEqual(worker.dropped, 3)  # Assert that the drops are counted.
+        encoding.set()  # Let the encoder finish.
+        worker.release()  # Release the worker.
+
+
+class TestPreEventBuffer(unittest.TestCase):  # Define a test case class for the pre-event ring buffer.
+
+    def test_old_frames_are_evicted(self):  # Define a test method for age-based eviction.
+        buffer = PreEventBuffer(seconds=2.0)  # Keep the last two seconds.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        for second in range(5):  # Push one frame per second for five seconds.
+            buffer.push(frame, now=float(second))
+
+        with patch("cv2.imdecode", wraps=cv2.imdecode) as mock_imdecode:  # Count the decoded frames.
+            drained = buffer.drain()  # Take the buffered frames.
+            first = next(drained)  # Decode the oldest frame.
+            decoded = mock_imdecode.call_count  # Frames decoded for the first one.
+            frames = [first] + list(drained)  # Decode the rest.
+
+        self.assertEqual(decoded, 1)  # Assert that frames are decoded one at a time.
+        self.assertEqual(len(frames), 3)  # Assert that only frames from the last two seconds are kept.
+        self.assertEqual(frames[0].shape, frame.shape)  # Assert that frames are decoded to their original size.
+        self.assertEqual(buffer.size, 0)  # Assert that draining empties the buffer.
+
+    def test_memory_limit_is_respected(self):  # Define a test method for size-based eviction.
+        noise = np.random.randint(0, 255, (120, 160, 3), dtype=np.uint8)  # Create a frame that compresses badly.
+        buffer = PreEventBuffer(seconds=60.0, max_bytes=100000)  # Allow at most 100 kB.
+        for index in range(50):  # Push many frames within the time window.
+            buffer.push(noise, now=index * 0.05)
+
+        self.assertLessEqual(buffer.size, 100000)  # Assert that the memory limit holds.
+        self.assertLess(len(buffer.frames), 50)  # Assert that the oldest frames were evicted.
+
+
+class TestLiveStream(unittest.TestCase):  # Define a test case class for the shared live frame.
+
+    @patch("cv2.imencode", wraps=__import__("cv2").imencode)  # Count the JPEG encodes.
+    def test_frame_is_encoded_once_for_all_viewers(self, mock_imencode):  # Define a test method for shared encoding.
+        stream = LiveStream()  # Create a live stream.
+        stream.publish(np.zeros((48, 64, 3), dtype=np.uint8))  # Publish a frame.
+
+        first = stream.wait(0, timeout=1)  # The first viewer fetches it.
+        second = stream.wait(0, timeout=1)  # A second viewer fetches it too.
+
+        self.assertEqual(first, second)  # Assert that both viewers got the same frame.
+        self.assertTrue(first[1].startswith(b"\xff\xd8"))  # Assert that it is a JPEG.
+        self.assertEqual(mock_imencode.call_count, 1)  # Assert that it was encoded only once.
+
+    def test_slow_viewer_skips_to_latest_frame(self):  # Define a test method for per-viewer frame dropping.
+        stream = LiveStream()  # Create a live stream.
+        for value in range(5):  # Publish five frames while nobody reads.
+            stream.publish(np.full((48, 64, 3), value * 50, dtype=np.uint8))
+
+        sequence, jpeg = stream.wait(1, timeout=1)  # A viewer that has seen frame 1 asks for more.
+
+        self.assertEqual(sequence, 5)  # Assert that it jumps straight to the newest frame.
+        self.assertEqual(stream.wait(sequence, timeout=0.01), (5, None))  # Assert that waiting times out without new frames.
+
+
+class TestTrackStore(unittest.TestCase):  # Define a test case class for the columnar track store.
+
+    def setUp(self):  # Define the setup method to fill a track store.
+        self.store = TrackStore(chunk_size=4)  # Use tiny chunks to exercise growth.
+        for frame_index in range(5):  # Track two objects over five frames.
+            self.store.append(
+                frame_index,
+                self.store.started + frame_index * 0.5,  # Two frames per second.
+                np.array([1, 2]),
+                np.array([0, 2]),
+                np.array([[frame_index, 0, 10, 10], [50, 50, 60, 60]], dtype=np.float32),
+            )
+
+    def test_arrays_grow_in_chunks(self):  # Define a test method for chunked growth.
+        self.assertEqual(len(self.store), 10)  # Assert that every box was stored.
+        self.assertEqual(len(self.store.columns["tracker_id"]), 12)  # Assert that capacity grew by whole chunks.
+        self.assertEqual(self.store.arrays()["frame_index"].tolist(), [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])  # Assert that rows are in order.
+
+    def test_summary_and_save(self):  # Define a test method for the gallery summary and binary file.
+        summary = self.store.summary({0: "person", 2: "car"}, datetime.datetime(2024, 1, 1, 12, 0, 0))  # Summarise the objects.
+
+        self.assertEqual(summary[1]["class_name"], "person")  # Assert that class names are resolved.
+        self.assertEqual(summary[1]["frames"], 5)  # Assert that frames are counted.
+        self.assertEqual(summary[1]["movement_direction"], "right")  # Assert that the moving object goes right.
+        self.assertEqual(summary[2]["movement_direction"], "stationary")  # Assert that the parked object is stationary.
+        self.assertEqual(summary[1]["last_seen"], "2024-01-01 12:00:02")  # Assert that the last sighting is two seconds in.
+
+        with tempfile.TemporaryDirectory() as directory:  # Save into a temporary directory.
+            path = os.path.join(directory, "tracks.npz")
+            self.store.save(path)  # Save the track store.
+            with np.load(path) as saved:  # Load it back.
+                self.assertEqual(saved["xyxy"].dtype, np.float32)  # Assert that boxes are stored as float32.
+                self.assertEqual(saved["timestamp"][-1], 2.0)  # Assert that timestamps are relative to the start.
+
+    def test_motion_is_computed_per_tracker(self):  # Define a test method for the vectorized motion columns.
+        arrays = self.store.arrays()  # Get the stored columns.
+        moving = arrays["tracker_id"] == 1  # Select the rows of the moving object.
+
+        np.testing.assert_allclose(arrays["displacement"][moving][1:], [[0.5, 0]] * 4)  # Assert that its centre moved half a pixel per frame.
+        np.testing.assert_allclose(arrays["velocity"][moving][1:], [[1, 0]] * 4)  # Assert that it moved one pixel per second.
+        self.assertEqual(arrays["direction"][moving].tolist(), [0, 1, 1, 1, 1])  # Assert that it moved right after its first sighting.
+        self.assertFalse(arrays["displacement"][~moving].any())  # Assert that the parked object did not move.
+
+    def test_motion_survives_missed_frames(self):  # Define a test method for objects that disappear briefly.
+        store = TrackStore()  # Create an empty track store.
+        store.append(0, 0.0, np.array([3]), np.array([0]), np.array([[0, 0, 10, 10]]))  # See object 3.
+        store.append(1, 1.0, np.array([4]), np.array([0]), np.array([[0, 0, 10, 10]]))  # See only object 4.
+        store.append(2, 2.0, np.array([4, 3]), np.array([0, 0]), np.array([[0, 0, 10, 10], [0, 20, 10, 30]]))  # See both again.
+
+        np.testing.assert_allclose(store.arrays()["velocity"][-1], [0, 10])  # Assert that object 3 is compared with its last sighting.
+
+
+class TestFrameSkipScheduler(unittest.TestCase):  # Define a test case class for the adaptive frame-skip scheduler.
+
+    def tracked(self, tracker_ids, xyxy):  # Define a helper building tracked detections.
+        return sv.Detections(  # Create detections with the given boxes and tracker IDs.
+            xyxy=np.array(xyxy, dtype=np.float32),
+            class_id=np.zeros(len(tracker_ids), dtype=int),
+            tracker_id=np.array(tracker_ids, dtype=int),
+        )
+
+    def test_skip_interval_follows_inference_time(self):  # Define a test method for choosing k.
+        scheduler = FrameSkipScheduler(target_fps=20)  # Aim for 20 frames per second.
+        scheduler.record_inference_time(0.12)  # Report a 120 ms inference.
+        self.assertEqual(scheduler.skip_interval, 3)  # Assert that every third frame is detected.
+        scheduler.record_inference_time(10.0)  # Report an extremely slow inference.
+        self.assertEqual(scheduler.skip_interval, scheduler.max_skip)  # Assert that k is capped.
+
+    def test_carry_forward_moves_boxes_linearly(self):  # Define a test method for box interpolation.
+        scheduler = FrameSkipScheduler(target_fps=20)  # Create a scheduler.
+        scheduler.skip_interval = 3  # Detect every third frame.
+        scheduler.update(self.tracked([7], [[0, 0, 10, 10]]))  # Store the first detection.
+        self.assertFalse(scheduler.should_infer())  # Skip one frame.
+        self.assertFalse(scheduler.should_infer())  # Skip another frame.
+        self.assertTrue(scheduler.should_infer())  # Assert that the third frame is detected.
+        scheduler.update(self.tracked([7], [[6, 0, 16, 10]]))  # The object moved 6 pixels in 3 frames.
+        self.assertFalse(scheduler.should_infer())  # Skip the next frame.
+
+        predicted = scheduler.carry_forward()  # Predict the skipped frame.
+
+        np.testing.assert_allclose(predicted.xyxy, [[8, 0, 18, 10]])  # Assert that the box moved 2 pixels.
+        self.assertEqual(predicted.tracker_id.tolist(), [7])  # Assert that the tracker ID is kept.
+
+
+class TestMultiCameraSurveillanceSystem(unittest.TestCase):  # Define a test case class for the multi-camera engine.
+
+    @patch.dict(  # Patch the os.environ dictionary to provide fake environment variables.
+        os.environ,
+        {"TELEGRAM_BOT_TOKEN": "fake_token", "TELEGRAM_CHAT_ID": "fake_chat_id"},
+    )
+    @patch("cv2.VideoCapture")  # Patch the cv2.VideoCapture class to mock the cameras.
+    def setUp(self, mock_video_capture):  # Define the setup method to initialize the test environment.
+        video_directory = tempfile.mkdtemp()  # Record into a temporary directory.
+        self.addCleanup(shutil.rmtree, video_directory)  # Remove the recordings after the test.
+        options = {"video_directory": video_directory, "incident_index": MagicMock()}  # Keep out of the real directory and gallery index.
+        self.engine = MultiCameraSurveillanceSystem([0, "rtsp://camera/stream"], camera_options=[options, options])  # Create an engine for two cameras.
+
+    def test_systems_share_one_model(self):  # Define a test method for model sharing.
+        first, second = self.engine.systems  # Get the per-camera systems.
+        self.assertIs(first.model, second.model)  # Assert that both cameras share the same model.
+        self.assertIsNot(first.tracker, second.tracker)  # Assert that every camera has its own tracker.
+        self.assertNotEqual(first.camera_name, second.camera_name)  # Assert that recordings are named per camera.
+
+    def test_process_batch_runs_one_model_call(self):  # Define a test method for batched inference.
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)  # Create a dummy frame.
+        self.engine.model = MagicMock(return_value=["result0", "result1"])  # Mock the shared model.
+        for system in self.engine.systems:  # Mock the per-camera stages.
+            system.merge_results = MagicMock(return_value=sv.Detections.empty())
+            system.track = MagicMock(return_value=sv.Detections.empty())
+            system.handle_detections = MagicMock(return_value=frame)
+
+        processed = self.engine.process_batch([(system, frame) for system in self.engine.systems])  # Process one frame per camera.
+
+        self.engine.model.assert_called_once()  # Assert that the model was called once for both cameras.
+        self.assertEqual(len(processed), 2)  # Assert that every camera got a processed frame.
+        self.engine.systems[0].merge_results.assert_called_once_with(["result0"], [(0, 0)], frame.shape)  # Assert that results go to the right camera.
+        self.engine.systems[1].merge_results.assert_called_once_with(["result1"], [(0, 0)], frame.shape)
 
 if __name__ == "__main__":  # Check if the script is being run directly.
     unittest.main()  # Run the unit tests.
\ No newline at end of file
@@ -0,0 +1,123 @@
+import unittest  # Import the unittest module for creating and running tests.
+import json  # Import the json module for the fake API responses.
+import threading  # Import threading for running the stand-in server.
+import queue  # Import queue for a small alert queue.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Import the HTTP server for the stand-in API.
+import numpy as np  # Import numpy for creating dummy frames.
+import cv2  # Import OpenCV for decoding the uploaded photo.
+from notifier import NotificationDispatcher  # Import the NotificationDispatcher class from the notifier module.
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):  # Define a stand-in for the Telegram Bot API.
+    protocol_version = "HTTP/1.1"  # Keep connections alive like the real API.
+
+    def do_POST(self):  # Handle an API call.
+        body = self.rfile.read(int(self.headers["Content-Length"]))  # Read the request body.
+        self.server.requests.append((self.path, self.client_address, body))  # Record the call.
+        status, payload = self.server.responses.pop(0) if self.server.responses else (200, {"ok": True})  # Pick the scripted response.
+        data = json.dumps(payload).encode("utf-8")  # Encode the response.
+        self.send_response(status)  # Send the status line.
+        self.send_header("Content-Type", "application/json")  # Send the content type.
+        self.send_header("Content-Length", str(len(data)))  # Allow the connection to be reused.
+        self.end_headers()
+        self.wfile.write(data)  # Send the response body.
+
+    def log_message(self, *args):  # Keep the test output quiet.
+        pass
+
+
+class TestNotificationDispatcher(unittest.TestCase):  # Define a test case class for the notification dispatcher.
+
+    def setUp(self):  # Define the setup method to start the stand-in server.
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)  # Listen on a free port.
+        self.server.requests = []  # Calls received by the server.
+        self.server.responses = []  # Scripted responses, 200 once exhausted.
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()  # Serve in the background.
+        self.addCleanup(self.server.server_close)  # Close the socket after the test.
+        self.addCleanup(self.server.shutdown)  # Stop serving after the test.
+        self.dispatcher = NotificationDispatcher(  # Point a dispatcher at the stand-in server.
+            "token", "chat", host="127.0.0.1", port=self.server.server_address[1], secure=False, coalesce_window=0.2, backoff=0.01
+        )
+        self.addCleanup(self.dispatcher.close)  # Stop the dispatcher after the test.
+
+    def test_connection_is_reused(self):  # Define a test method for the keep-alive connection.
+        self.dispatcher.send_message("first")  # Send a message.
+        self.dispatcher.send_message("second")  # Send another one.
+
+        paths = [path for path, _, _ in self.server.requests]  # The API methods that were called.
+        clients = {client for _, client, _ in self.server.requests}  # The client sockets that were used.
+        self.assertEqual(paths, ["/bottoken/sendMessage"] * 2)  # Assert that both messages were sent.
+        self.assertEqual(len(clients), 1)  # Assert that both used the same connection.
+
+    def test_rate_limit_and_server_errors_are_retried(self):  # Define a test method for retries.
+        self.server.responses = [  # Rate-limit the first call and fail the second.
+            (429, {"ok": False, "parameters": {"retry_after": 0.01}}),
+            (502, {"ok": False}),
+        ]
+
+        response = self.dispatcher.send_message("alert")  # Send a message.
+
+        self.assertTrue(response["ok"])  # Assert that the third attempt succeeded.
+        self.assertEqual(len(self.server.requests), 3)  # Assert that the message was sent three times.
+
+    def test_client_errors_are_not_retried(self):  # Define a test method for permanent failures.
+        self.server.responses = [(400, {"ok": False})]  # Reject the call.
+
+        with self.assertRaises(ValueError):  # Assert that the failure is reported.
+            self.dispatcher.send_message("alert")
+        self.assertEqual(len(self.server.requests), 1)  # Assert that it was not retried.
+
+    def test_burst_is_coalesced(self):  # Define a test method for coalescing.
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)  # Create a dummy frame.
+        for index in range(3):  # Raise three alerts in quick succession.
+            self.dispatcher.notify(f"alert {index}", frame)
+
+        self.dispatcher.close()  # Wait for the queued alerts to be sent.
+
+        paths = [path for path, _, _ in self.server.requests]  # The API methods that were called.
+        self.assertEqual(paths, ["/bottoken/sendMessage", "/bottoken/sendPhoto"])  # Assert a single message and photo.
+        text = json.loads(self.server.requests[0][2])["text"]  # The coalesced message.
+        self.assertIn("3 alerts", text)  # Assert that the burst is summarised.
+        self.assertIn("alert 2", text)  # Assert that every alert is included.
+        self.assertIn(b"\xff\xd8", self.server.requests[1][2])  # Assert that the photo is a JPEG.
+
+    def test_photo_is_resized_and_uploaded_from_memory(self):  # Define a test method for the in-memory upload.
+        self.dispatcher.photo_max_width = 320  # Scale alert images down to 320 pixels.
+        self.dispatcher.photo_quality = 50  # Use a low JPEG quality.
+        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)  # Create a noisy frame.
+
+        self.dispatcher.send_photo(frame, "alert.jpg")  # Upload it.
+
+        path, _, body = self.server.requests[0]  # The upload received by the server.
+        start = body.index(b"\r\n\r\n", body.index(b'filename="alert.jpg"')) + 4  # Start of the photo part.
+        end = body.rindex(b"\r\n--")  # End of the photo part.
+        photo = cv2.imdecode(np.frombuffer(body[start:end], dtype=np.uint8), cv2.IMREAD_COLOR)  # Decode the photo.
+        self.assertEqual(path, "/bottoken/sendPhoto")  # Assert that the photo API was called.
+        self.assertEqual(photo.shape, (240, 320, 3))  # Assert that the photo was scaled down.
+        self.assertEqual(bytes(self.dispatcher.encode_photo(frame)), body[start:end])  # Assert that the JPEG was sent unchanged.
+
+    def test_full_queue_drops_oldest_alert(self):  # Define a test method for the bounded queue.
+        dispatcher = NotificationDispatcher("token", "chat", queue_size=2)  # Create a small queue.
+        dispatcher.thread = threading.current_thread()  # Pretend the thread runs so that nothing is sent.
+        for index in range(3):  # Queue one alert too many.
+            dispatcher.notify(f"alert {index}")
+
+        self.assertEqual(dispatcher.dropped, 1)  # Assert that one alert was dropped.
+        self.assertEqual(dispatcher.queue.get_nowait()[0], "alert 1")  # Assert that the oldest one was dropped.
+
+
+    def test_close_is_not_lost_when_the_queue_is_full(self):  # Define a test method for shutting down under load.
+        self.dispatcher.queue = queue.Queue(maxsize=2)  # Use a small queue.
+        for index in range(5):  # Keep the queue full while closing.
+            self.dispatcher.notify(f"alert {index}")
+        thread = self.dispatcher.thread  # The dispatcher thread.
+
+        self.dispatcher.close(timeout=5)  # Stop the dispatcher.
+
+        self.assertFalse(thread.is_alive())  # Assert that the thread stopped.
+        text = " ".join(json.loads(body)["text"] for _, _, body in self.server.requests)  # Every message sent.
+        self.assertIn("alert 4", text)  # Assert that the queued alerts were sent before stopping.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
@@ -0,0 +1,81 @@
+import unittest  # Import the unittest module for creating and running tests.
+import os  # Import the os module for the worker configuration.
+import sys  # Import sys for exiting a crashing worker.
+import time  # Import time for waiting on the worker processes.
+from unittest.mock import patch  # Import patch for setting environment variables.
+import numpy as np  # Import numpy for creating dummy frames.
+from framebus import FrameBus  # Import the FrameBus class for the stand-in worker.
+from supervisor import Supervisor  # Import the Supervisor class from the supervisor module.
+
+
+def serve_frames(name, cameras, cpus, bus_names, stop_event):  # Define a stand-in worker publishing one frame per camera.
+    buses = [FrameBus(bus_names[camera]) for camera in cameras]  # Attach to the frame buses.
+    for bus in buses:
+        bus.publish(np.full((48, 64, 3), os.getpid() % 256, dtype=np.uint8))  # Publish a frame.
+    stop_event.wait(30)  # Run until stopped.
+    for bus in buses:
+        bus.close()
+
+
+def crash(name, cameras, cpus, bus_names, stop_event):  # Define a stand-in worker that fails at once.
+    sys.exit(3)
+
+
+def wait_for(condition, timeout=20):  # Define a helper polling until a condition holds.
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.05)
+
+
+class TestSupervisor(unittest.TestCase):  # Define a test case class for the worker supervisor.
+
+    def test_cores_are_shared_out(self):  # Define a test method for CPU pinning.
+        supervisor = Supervisor({"a": {"cam0": "0"}, "b": {"cam1": "1"}, "c": {"cam2": "2"}}, cpus=[0, 1, 2, 3, 4, 5, 6])  # Three workers on seven cores.
+        self.addCleanup(supervisor.close)  # Free the frame buses after the test.
+
+        self.assertEqual([handle.cpus for handle in supervisor.workers.values()], [[0, 1], [2, 3], [4, 5]])  # Assert that each worker gets its own cores.
+
+    def test_workers_from_env(self):  # Define a test method for the worker configuration.
+        with patch.dict(os.environ, {"CAMERA_WORKERS": '{"gate": ["rtsp://gate"], "yard": ["0", "1"]}'}):  # Configure two workers.
+            supervisor = Supervisor.from_env(cpus=[])
+        self.addCleanup(supervisor.close)  # Free the frame buses after the test.
+
+        self.assertEqual(supervisor.workers["gate"].cameras, {"gate": "rtsp://gate"})  # Assert that a single camera is named after its worker.
+        self.assertEqual(supervisor.workers["yard"].cameras, {"yard_0": "0", "yard_1": "1"})  # Assert that grouped cameras are numbered.
+        self.assertIsNone(supervisor.workers["yard"].cpus)  # Assert that nothing is pinned without cores.
+
+    def test_start_and_stop(self):  # Define a test method for controlling a worker.
+        with patch.dict(os.environ, {"FRAME_BUS_RESOLUTION": "64x48"}):  # Use small frame buses.
+            supervisor = Supervisor({"gate": {"gate": "0"}, "yard": {"yard": "1"}}, target=serve_frames, cpus=[], poll_interval=0.05)  # Two stand-in workers.
+        self.addCleanup(supervisor.close)  # Stop everything after the test.
+
+        self.assertEqual(supervisor.start("gate"), ["gate"])  # Start one worker.
+        wait_for(lambda: supervisor.buses["gate"].latest_sequence() > 0)  # Wait for its first frame.
+
+        status = supervisor.status()  # Report on the workers.
+        self.assertEqual(status["gate"]["state"], "running")  # Assert that the started worker runs.
+        self.assertEqual(status["yard"]["state"], "stopped")  # Assert that the other one does not.
+        self.assertEqual(supervisor.buses["gate"].latest().frame[0, 0, 0], status["gate"]["pid"] % 256)  # Assert that its frame came through shared memory.
+        self.assertEqual(supervisor.stop("gate"), ["gate"])  # Stop the worker.
+        self.assertEqual(supervisor.status("gate")["gate"]["state"], "stopped")  # Assert that it stopped.
+        self.assertEqual(supervisor.status("gate")["gate"]["exitcode"], 0)  # Assert that it exited cleanly.
+        with self.assertRaises(KeyError):  # Assert that unknown workers are reported.
+            supervisor.start("garage")
+
+    def test_crashed_worker_is_restarted(self):  # Define a test method for crash recovery.
+        supervisor = Supervisor({"gate": {"gate": "0"}}, target=crash, cpus=[], restart_delay=0.05, poll_interval=0.05)  # A worker that keeps crashing.
+        self.addCleanup(supervisor.close)  # Stop everything after the test.
+
+        supervisor.start()  # Start it.
+        wait_for(lambda: supervisor.status()["gate"]["restarts"] >= 2)  # Wait for two restarts.
+
+        status = supervisor.status()["gate"]  # Report on the worker.
+        self.assertEqual(status["exitcode"], 3)  # Assert that the crash is reported.
+        self.assertNotEqual(status["state"], "stopped")  # Assert that it is still meant to run.
+        self.assertGreaterEqual(supervisor.workers["gate"].failures, 2)  # Assert that the restart delay backs off.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
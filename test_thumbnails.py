@@ -0,0 +1,69 @@
+import unittest  # Import the unittest module for creating and running tests.
+import os  # Import the os module for interacting with the operating system.
+import tempfile  # Import tempfile for throwaway recordings and caches.
+import shutil  # Import shutil for removing the temporary directory.
+from unittest.mock import patch  # Import patch for counting thumbnail generations.
+import cv2  # Import OpenCV for writing a test recording.
+import numpy as np  # Import numpy for creating dummy frames.
+from thumbnails import ThumbnailCache, thumbnail_source  # Import the thumbnail cache from the thumbnails module.
+
+
+class TestThumbnailCache(unittest.TestCase):  # Define a test case class for the thumbnail cache.
+
+    def setUp(self):  # Define the setup method to write a short recording.
+        self.directory = tempfile.mkdtemp()  # Create a temporary directory.
+        self.addCleanup(shutil.rmtree, self.directory)  # Remove it after the test.
+        self.video = os.path.join(self.directory, "output_test.webm")  # Path of the test recording.
+        writer = cv2.VideoWriter(self.video, cv2.VideoWriter_fourcc(*"VP80"), 10.0, (64, 48))  # Open a writer.
+        for value in range(30):  # Write three seconds of frames.
+            writer.write(np.full((48, 64, 3), value * 8, dtype=np.uint8))
+        writer.release()  # Finish the recording.
+        self.cache = ThumbnailCache(os.path.join(self.directory, "cache"), width=32, preview_width=16)  # Create an empty cache.
+
+    def test_thumbnails_are_generated_once(self):  # Define a test method for lazy generation.
+        with patch.object(self.cache, "generate", wraps=self.cache.generate) as mock_generate:  # Count generations.
+            poster, preview = self.cache.get("output_test.webm", self.video)  # Request the thumbnails.
+            again = self.cache.get("output_test.webm", self.video)  # Request them again.
+
+        self.assertEqual(cv2.imread(poster).shape, (24, 32, 3))  # Assert that the poster is a scaled JPEG.
+        capture = cv2.VideoCapture(preview)  # Open the preview.
+        frames = 0  # Count its frames.
+        while capture.read()[0]:
+            frames += 1
+        self.assertEqual(frames, 3)  # Assert that it has one frame per second of footage.
+        self.assertEqual(again, (poster, preview))  # Assert that the cached files are reused.
+        self.assertEqual(mock_generate.call_count, 1)  # Assert that the footage was decoded once.
+
+    def test_changed_footage_replaces_thumbnails(self):  # Define a test method for mtime keys.
+        old_poster, _ = self.cache.get("output_test.webm", self.video)  # Create thumbnails.
+        stat = os.stat(self.video)  # Read the recording's timestamps.
+        os.utime(self.video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # Pretend it was rewritten.
+
+        new_poster, _ = self.cache.get("output_test.webm", self.video)  # Request the thumbnails again.
+
+        self.assertNotEqual(new_poster, old_poster)  # Assert that the key changed.
+        self.assertFalse(os.path.exists(old_poster))  # Assert that the stale thumbnails were removed.
+        self.assertEqual(len(os.listdir(self.cache.directory)), 2)  # Assert that only the new poster and preview remain.
+
+    def test_least_recently_used_files_are_evicted(self):  # Define a test method for size-based eviction.
+        first, _ = self.cache.get("first.webm", self.video)  # Cache one recording.
+        os.utime(first, (0, 0))  # Make it the least recently used.
+        self.cache.max_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache.directory))  # Allow only one recording.
+
+        second, _ = self.cache.get("second.webm", self.video)  # Cache another recording.
+
+        self.assertFalse(os.path.exists(first))  # Assert that the oldest poster was evicted.
+        self.assertTrue(os.path.exists(second))  # Assert that the new poster is kept.
+
+    def test_missing_footage(self):  # Define a test method for recordings without footage.
+        self.assertEqual(self.cache.get("missing.webm", os.path.join(self.directory, "missing.webm")), (None, None))  # Assert that nothing is generated.
+
+    def test_segment_incidents_use_their_segment(self):  # Define a test method for segment-mode incidents.
+        metadata = {"segments": [{"file": "segment_1.webm", "start": 2.0, "end": 5.0}]}  # Point into a segment.
+
+        self.assertEqual(thumbnail_source("videos", "incident_1", metadata), (os.path.join("videos", "segment_1.webm"), 2.0, 5.0))  # Assert the segment span.
+        self.assertEqual(thumbnail_source("videos", "output_1.webm", {}), (os.path.join("videos", "output_1.webm"), 0.0, None))  # Assert the whole video otherwise.
+
+
+if __name__ == "__main__":  # Check if the script is being run directly.
+    unittest.main()  # Run the unit tests.
@@ -0,0 +1,169 @@
+import os  # Import os for file paths and environment variables
+import glob  # Import glob for finding the cached files of a recording
+import threading  # Import threading to generate one recording at a time
+import cv2  # Import OpenCV for decoding recordings and encoding thumbnails
+
+# Default location of the thumbnail cache, next to the application
+CACHE_DIRECTORY = os.getenv(
+    "THUMBNAIL_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnails"),
+)
+
+
+def thumbnail_source(video_directory, file_name, metadata=None):
+    """
+    Finds the footage of a recording. Segment-mode incidents have no video of
+    their own and point into their first segment instead.
+
+    Returns:
+    - (path, start, end) (tuple): The video file and the incident's span in it
+      in seconds (end is None for the whole file).
+    """
+    segments = (metadata or {}).get("segments")
+    if segments:
+        segment = segments[0]
+        return (
+            os.path.join(video_directory, segment["file"]),
+            segment.get("start", 0.0),
+            segment.get("end"),
+        )
+    return os.path.join(video_directory, file_name), 0.0, None
+
+
+class ThumbnailCache:
+    """
+    On-disk cache of a poster JPEG and a small animated WebM preview per
+    recording, so that the gallery does not have to load every video.
+
+    Entries are keyed by file name and the modification time of the footage, so
+    a rewritten recording gets new thumbnails. The least recently used entries
+    are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory=CACHE_DIRECTORY,
+        max_bytes=None,
+        width=320,
+        preview_width=160,
+        preview_frames=8,
+        preview_interval=1.0,
+        quality=80,
+    ):
+        self.directory = directory  # Where the thumbnails are written
+        self.max_bytes = max_bytes or int(
+            float(os.getenv("THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+        )  # Upper bound on the cache size
+        self.width = width  # Poster width in pixels
+        self.preview_width = preview_width  # Preview width in pixels
+        self.preview_frames = preview_frames  # Frames in the animated preview
+        self.preview_interval = preview_interval  # Seconds of footage between preview frames
+        self.quality = quality  # JPEG quality of the posters
+        self.lock = threading.Lock()  # Concurrent requests generate a recording once
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, file_name, source):
+        """
+        Returns:
+        - (poster, preview) (tuple): The cache paths for the current footage.
+        """
+        key = f"{file_name}.{os.stat(source).st_mtime_ns}"
+        return (
+            os.path.join(self.directory, f"{key}.poster.jpg"),
+            os.path.join(self.directory, f"{key}.preview.webm"),
+        )
+
+    def get(self, file_name, source, start=0.0, end=None):
+        """
+        Returns the thumbnails of a recording, generating them on the first request.
+
+        Parameters:
+        - file_name (str): The recording's file name, used as the cache key.
+        - source (str): The video file holding the footage.
+        - start (float): Where the recording starts in the video, in seconds.
+        - end (float): Where it ends, or None for the end of the video.
+
+        Returns:
+        - (poster, preview) (tuple): The cached files, or (None, None) if the
+          footage cannot be decoded.
+        """
+        try:
+            poster, preview = self.paths(file_name, source)
+        except OSError:
+            return None, None  # The footage does not exist
+        with self.lock:
+            if os.path.exists(poster) and os.path.exists(preview):
+                for path in (poster, preview):
+                    os.utime(path)  # Mark as recently used
+            else:
+                self.remove(file_name)  # Thumbnails of older footage
+                if not self.generate(source, start, end, poster, preview):
+                    return None, None
+                self.evict()
+        return poster, preview
+
+    def generate(self, source, start, end, poster, preview):
+        """
+        Decodes the footage once and writes the poster (its first frame) and the
+        preview (one frame per preview_interval, at most preview_frames).
+        """
+        capture = cv2.VideoCapture(source)
+        if start:
+            capture.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        frames = []
+        next_time = start  # Time of the next preview frame
+        while len(frames) < self.preview_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            position = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if end is not None and position > end:
+                break
+            if position + 1e-6 >= next_time:
+                frames.append(frame)
+                next_time = position + self.preview_interval
+        capture.release()
+        if not frames:
+            return False
+
+        height, width = frames[0].shape[:2]
+        image = cv2.resize(frames[0], (self.width, round(height * self.width / width)))
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        temporary = f"{poster}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(encoded.tobytes())
+        os.replace(temporary, poster)  # Never serve a half-written file
+
+        size = (self.preview_width, round(height * self.preview_width / width) // 2 * 2)
+        temporary = f"{preview}.tmp.webm"  # The extension selects the container
+        writer = cv2.VideoWriter(temporary, cv2.VideoWriter_fourcc(*"VP80"), 2.0, size)
+        for frame in frames:
+            writer.write(cv2.resize(frame, size))
+        writer.release()
+        if not os.path.exists(temporary):
+            os.remove(poster)
+            return False
+        os.replace(temporary, preview)
+        return True
+
+    def remove(self, file_name):
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(file_name)}.*")):
+            os.remove(path)
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits in max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size